@@ -0,0 +1,37 @@
+import pytest
+
+from bob.bio.video.synthetic import write_synthetic_video
+
+# name: (size, number of frames, GOP size)
+VIDEOS = {
+    "qvga-50f-gop12": ((320, 240), 50, 12),
+    "qvga-50f-gop1": ((320, 240), 50, 1),
+    "vga-250f-gop50": ((640, 480), 250, 50),
+}
+
+
+@pytest.fixture(scope="session")
+def video_directory(tmp_path_factory):
+    return tmp_path_factory.mktemp("synthetic_videos")
+
+
+@pytest.fixture(scope="session", params=sorted(VIDEOS))
+def video_path(request, video_directory):
+    """The path of a synthetic video, generated once per session."""
+    size, n_frames, gop_size = VIDEOS[request.param]
+    path = video_directory / f"{request.param}.mp4"
+    if not path.exists():
+        write_synthetic_video(
+            str(path), n_frames=n_frames, size=size, gop_size=gop_size
+        )
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def small_video_path(video_directory):
+    """The path of the smallest synthetic video, for benchmarks that do not
+    depend on the video."""
+    path = video_directory / "small.mp4"
+    if not path.exists():
+        write_synthetic_video(str(path), n_frames=20, size=(160, 120))
+    return str(path)
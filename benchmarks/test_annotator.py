@@ -0,0 +1,51 @@
+import pytest
+
+import bob.bio.base
+import bob.bio.video
+
+from bob.bio.video.annotator import FailSafeVideo, Wrapper
+from bob.bio.video.synthetic import synthetic_frames
+
+pytest.importorskip("pytest_benchmark")
+
+
+class StubDetector(bob.bio.base.annotator.Annotator):
+    """Detects a fixed face, failing on every ``fail_every``-th frame."""
+
+    def __init__(self, fail_every=0, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_every = fail_every
+        self.calls = 0
+
+    def transform(self, images):
+        annotations = []
+        for _ in images:
+            self.calls += 1
+            if self.fail_every and self.calls % self.fail_every == 0:
+                annotations.append(None)
+            else:
+                annotations.append(
+                    {"topleft": (10, 10), "bottomright": (90, 90)}
+                )
+        return annotations
+
+
+def _video(n_frames=100):
+    frames = list(synthetic_frames(n_frames, size=(160, 120)))
+    return bob.bio.video.VideoLikeContainer(frames, list(range(n_frames)))
+
+
+def test_wrapper(benchmark):
+    video = _video()
+    annotator = Wrapper(StubDetector(fail_every=5), normalize=True)
+    annotations = benchmark(annotator.annotate, video)
+    assert len(annotations) == len(video)
+
+
+def test_fail_safe_video(benchmark):
+    video = _video()
+    annotator = FailSafeVideo(
+        [StubDetector(fail_every=3), StubDetector()], max_age=2
+    )
+    annotations = benchmark(annotator.annotate, video)
+    assert len(annotations) == len(video)
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import bob.bio.video
+
+pytest.importorskip("pytest_benchmark")
+
+
+def _container(ragged):
+    rng = np.random.default_rng(0)
+    if ragged:
+        # frames of different shapes are saved with the pickle fallback
+        frames = [
+            rng.random((i % 3 + 1, 128), dtype=np.float32) for i in range(200)
+        ]
+    else:
+        frames = rng.random((200, 512), dtype=np.float32)
+    return bob.bio.video.VideoLikeContainer(frames, list(range(200)))
+
+
+@pytest.mark.parametrize("ragged", [False, True], ids=["hdf5", "pickle"])
+def test_save(benchmark, tmp_path, ragged):
+    container = _container(ragged)
+    path = str(tmp_path / "container.h5")
+    benchmark(container.save, path)
+
+
+@pytest.mark.parametrize("ragged", [False, True], ids=["hdf5", "pickle"])
+def test_load(benchmark, tmp_path, ragged):
+    container = _container(ragged)
+    path = str(tmp_path / "container.h5")
+    container.save(path)
+    loaded = benchmark(bob.bio.video.VideoLikeContainer.load, path)
+    assert len(loaded) == len(container)
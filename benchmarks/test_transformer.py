@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from sklearn.base import BaseEstimator, TransformerMixin
+
+import bob.bio.video
+
+from bob.bio.video.transformer import VideoWrapper
+
+pytest.importorskip("pytest_benchmark")
+
+
+class MeanEstimator(TransformerMixin, BaseEstimator):
+    """A cheap stand-in for a feature extractor, so that the benchmarks
+    measure the overhead of the wrapper."""
+
+    def transform(self, frames):
+        return [
+            np.asarray(frame, dtype=float).mean(axis=(-2, -1))
+            for frame in frames
+        ]
+
+    def _more_tags(self):
+        return {"requires_fit": False}
+
+
+def _videos(n_videos=10, n_frames=50, failure_rate=0.0):
+    rng = np.random.default_rng(0)
+    videos = []
+    for _ in range(n_videos):
+        frames = [
+            None
+            if rng.random() < failure_rate
+            else rng.integers(0, 256, size=(3, 64, 64), dtype=np.uint8)
+            for _ in range(n_frames)
+        ]
+        videos.append(
+            bob.bio.video.VideoLikeContainer(frames, list(range(n_frames)))
+        )
+    return videos
+
+
+@pytest.mark.parametrize("failure_rate", [0.0, 0.2])
+def test_video_wrapper_transform(benchmark, failure_rate):
+    videos = _videos(failure_rate=failure_rate)
+    wrapper = VideoWrapper(MeanEstimator())
+    outputs = benchmark(wrapper.transform, videos)
+    assert len(outputs) == len(videos)
+
+
+def test_video_wrapper_transform_video_as_array(benchmark, video_path):
+    videos = [
+        bob.bio.video.VideoAsArray(video_path, max_number_of_frames=10)
+        for _ in range(3)
+    ]
+    wrapper = VideoWrapper(MeanEstimator())
+    outputs = benchmark(wrapper.transform, videos)
+    assert len(outputs) == len(videos)
@@ -0,0 +1,76 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import bob.bio.video
+
+from bob.bio.video.utils import _video_metadata
+
+pytest.importorskip("pytest_benchmark")
+
+
+def test_construction(benchmark, video_path):
+    bob.bio.video.VideoAsArray(video_path)
+    benchmark(bob.bio.video.VideoAsArray, video_path)
+
+
+def test_construction_cold(benchmark, video_path):
+    # without the cached metadata of the video
+    benchmark.pedantic(
+        bob.bio.video.VideoAsArray,
+        args=(video_path,),
+        setup=_video_metadata.cache_clear,
+        rounds=5,
+    )
+
+
+def test_int_indexing(benchmark, video_path):
+    # random access across GOPs: reading the same frame again would only copy
+    # the last frame cached by the pooled reader
+    video = bob.bio.video.VideoAsArray(video_path, selection_style="all")
+    positions = np.random.default_rng(0).permutation(len(video))
+    indices = itertools.cycle(int(i) for i in positions)
+    frame = benchmark.pedantic(
+        video.__getitem__,
+        setup=lambda: ((next(indices),), {}),
+        rounds=min(len(video), 50),
+    )
+    assert frame.shape == video.shape[1:]
+
+
+def test_slice_indexing(benchmark, video_path):
+    video = bob.bio.video.VideoAsArray(video_path, max_number_of_frames=20)
+    frames = benchmark(video.__getitem__, (slice(None),) * video.ndim)
+    assert len(frames) == 20
+
+
+def test_iteration(benchmark, video_path):
+    video = bob.bio.video.VideoAsArray(video_path, max_number_of_frames=20)
+    count = benchmark(lambda: sum(1 for _ in video))
+    assert count == 20
+
+
+@pytest.mark.parametrize("style", ["first", "spread", "step", "all"])
+def test_select_frames(benchmark, style):
+    indices = benchmark(
+        bob.bio.video.select_frames,
+        100000,
+        max_number_of_frames=1000,
+        selection_style=style,
+    )
+    assert len(indices) > 0
+
+
+@pytest.mark.parametrize("style", ["distinct", "quality"])
+def test_select_frames_content_aware(benchmark, style):
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size=(1000, 64, 64), dtype=np.uint8)
+    indices = benchmark(
+        bob.bio.video.select_frames,
+        len(frames),
+        max_number_of_frames=100,
+        selection_style=style,
+        frames=frames,
+    )
+    assert len(indices) > 0
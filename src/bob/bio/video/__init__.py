@@ -1,12 +1,31 @@
 # isort: skip_file
 from .utils import (  # noqa: F401
     select_frames,
+    low_resolution_frames,
+    frame_quality,
+    keyframe_indices,
+    video_metadata,
+    decode_options,
     VideoAsArray,
     VideoLikeContainer,
+    DenseVideoLikeContainer,
+    ReaderPool,
+    BufferPool,
     video_wrap_skpipeline,
 )
 from . import annotator  # noqa: F401
 from . import transformer  # noqa: F401
+from . import algorithm  # noqa: F401
+from . import index  # noqa: F401
+from . import planner  # noqa: F401
+from . import shared  # noqa: F401
+from . import staged  # noqa: F401
+from . import transcode  # noqa: F401
+from . import metadata  # noqa: F401
+from . import partition  # noqa: F401
+from . import synthetic  # noqa: F401
+from . import loadtest  # noqa: F401
+from . import instrumentation  # noqa: F401
 
 
 # gets sphinx autodoc done right - don't remove it
@@ -31,6 +50,9 @@ def __appropriate__(*args):
 __appropriate__(
     VideoAsArray,
     VideoLikeContainer,
+    DenseVideoLikeContainer,
+    ReaderPool,
+    BufferPool,
 )
 # gets sphinx autodoc done right - don't remove it
 __all__ = [_ for _ in dir() if not _.startswith("_")]
@@ -0,0 +1,419 @@
+import logging
+
+import numpy as np
+
+from sklearn.pipeline import Pipeline
+
+from bob.bio.base import selected_indices
+from bob.bio.base.pipelines import BioAlgorithm
+from bob.pipelines import (
+    Sample,
+    SampleWrapper,
+    is_instance_nested,
+    is_pipeline_wrapped,
+    wrap,
+)
+
+from .transformer import _l2_normalize
+from .utils import VideoLikeContainer
+
+logger = logging.getLogger(__name__)
+
+
+def stack_frames(features):
+    """Stacks the valid frames of several videos into one matrix.
+
+    Parameters
+    ----------
+    features : list
+        A list of :any:`bob.bio.video.VideoLikeContainer` (or of arrays of
+        shape (N, ...) or (...)). Frames that are ``None`` are skipped.
+
+    Returns
+    -------
+    numpy.ndarray
+        A float32 matrix of shape (number of valid frames, feature size).
+    """
+    frames = []
+    for video in features:
+        if video is None:
+            continue
+        if not hasattr(video, "indices"):
+            video = np.asarray(video)
+            if video.ndim < 2:
+                video = video[None]
+        frames.extend(np.ravel(frame) for frame in video if frame is not None)
+    if not frames:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(np.stack(frames), dtype=np.float32)
+
+
+def _blocks(n_rows, n_cols, memory_limit):
+    """Yields the (row, column) slices of blocks which fit in memory_limit
+    bytes as float32 scores."""
+    max_items = max(1, memory_limit // 4)
+    col_step = max(1, min(n_cols, max_items))
+    row_step = max(1, min(n_rows, max_items // col_step))
+    for r in range(0, n_rows, row_step):
+        for c in range(0, n_cols, col_step):
+            yield slice(r, r + row_step), slice(c, c + col_step)
+
+
+def score_blocks(a, b, metric, memory_limit):
+    """Yields the blocks of the score matrix between the rows of ``a`` and
+    ``b``.
+
+    Parameters
+    ----------
+    a, b : numpy.ndarray
+        float32 matrices of shape (N, D) and (M, D). For the ``cosine`` metric,
+        the rows must be L2-normalized already.
+    metric : str
+        ``cosine`` (cosine similarity) or ``euclidean`` (negated euclidean
+        distance).
+    memory_limit : int
+        The maximum size, in bytes, of one block of scores.
+
+    Yields
+    ------
+    rows : slice
+        The rows of ``a`` in this block.
+    cols : slice
+        The rows of ``b`` in this block.
+    block : numpy.ndarray
+        The scores of this block.
+    """
+    if metric == "euclidean":
+        a_sq = np.einsum("ij,ij->i", a, a)
+        b_sq = np.einsum("ij,ij->i", b, b)
+    for rows, cols in _blocks(len(a), len(b), memory_limit):
+        block = a[rows] @ b[cols].T
+        if metric == "euclidean":
+            block *= -2
+            block += a_sq[rows, None]
+            block += b_sq[None, cols]
+            np.maximum(block, 0, out=block)
+            block = -np.sqrt(block, out=block)
+        yield rows, cols, block
+
+
+class FrameScoring(BioAlgorithm):
+    """Compares videos using the scores of all pairs of their frames.
+
+    The valid frames of each template are stacked into one matrix and the score
+    matrix between two templates is computed with blocked matrix products so
+    that at most ``memory_limit`` bytes of scores exist at any time. The
+    scores of each block are reduced right away.
+
+    Parameters
+    ----------
+    metric : str
+        ``cosine`` (cosine similarity) or ``euclidean`` (negated euclidean
+        distance).
+    reduction : str
+        How the frame scores are reduced into one score: ``max``, ``mean``,
+        ``top_k_mean`` (mean of the ``top_k`` highest scores) or ``median``.
+    top_k : int
+        Only used when ``reduction`` is ``top_k_mean``.
+    memory_limit : int
+        The maximum size, in bytes, of one block of scores.
+    """
+
+    metrics = ("cosine", "euclidean")
+    reductions = ("max", "mean", "top_k_mean", "median")
+
+    def __init__(
+        self,
+        metric="cosine",
+        reduction="max",
+        top_k=5,
+        memory_limit=64 * 2**20,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        if metric not in self.metrics:
+            raise ValueError(
+                f"Invalid metric: {metric}. Choose from {self.metrics}"
+            )
+        if reduction not in self.reductions:
+            raise ValueError(
+                f"Invalid reduction: {reduction}. Choose from {self.reductions}"
+            )
+        self.metric = metric
+        self.reduction = reduction
+        self.top_k = top_k
+        self.memory_limit = memory_limit
+
+    def create_templates(self, list_of_feature_sets, enroll):
+        """Stacks the valid frames of each feature set into a matrix."""
+        templates = [
+            stack_frames(features) for features in list_of_feature_sets
+        ]
+        if self.metric == "cosine":
+            templates = [_l2_normalize(t) for t in templates]
+        return templates
+
+    def compare(self, enroll_templates, probe_templates):
+        """Computes the reduced frame scores of all enroll and probe pairs."""
+        return np.array(
+            [
+                [self.score(enroll, probe) for probe in probe_templates]
+                for enroll in enroll_templates
+            ],
+            dtype=float,
+        )
+
+    def _score_blocks(self, enroll, probe):
+        """Yields the blocks of the score matrix between two templates."""
+        for _, _, block in score_blocks(
+            enroll, probe, self.metric, self.memory_limit
+        ):
+            yield block
+
+    def score(self, enroll, probe):
+        """Reduces the score matrix of two templates into one score.
+
+        Returns ``nan`` if any of the templates has no valid frames.
+        """
+        if len(enroll) == 0 or len(probe) == 0:
+            return np.nan
+
+        if self.reduction == "median":
+            return self._median(enroll, probe)
+
+        total, count = 0.0, 0
+        best = None
+        for block in self._score_blocks(enroll, probe):
+            if self.reduction == "max":
+                block_max = block.max()
+                best = block_max if best is None else max(best, block_max)
+            elif self.reduction == "mean":
+                total += float(block.sum(dtype=np.float64))
+                count += block.size
+            else:
+                values = block.ravel()
+                if best is not None:
+                    values = np.concatenate([best, values])
+                if len(values) > self.top_k:
+                    values = np.partition(values, -self.top_k)[-self.top_k :]
+                best = values
+
+        if self.reduction == "mean":
+            return total / count
+        if self.reduction == "top_k_mean":
+            return float(np.mean(best))
+        return float(best)
+
+    def _median(self, enroll, probe, bins=4096):
+        """Computes the exact median in two passes over the blocks: a histogram
+        locates the median and the second pass only keeps the scores of the
+        bins around it."""
+        low, high = np.inf, -np.inf
+        for block in self._score_blocks(enroll, probe):
+            low, high = min(low, block.min()), max(high, block.max())
+        if low == high:
+            return float(low)
+
+        edges = np.linspace(low, high, bins + 1)
+        histogram = np.zeros(bins, dtype=np.int64)
+        for block in self._score_blocks(enroll, probe):
+            histogram += np.histogram(block, edges)[0]
+
+        # the (1-based) ranks of the middle elements
+        size = histogram.sum()
+        ranks = ((size + 1) // 2, size // 2 + 1)
+        cumulative = np.cumsum(histogram)
+        first, last = np.searchsorted(cumulative, ranks)
+        lo, hi = edges[first], edges[last + 1]
+        below = cumulative[first - 1] if first > 0 else 0
+
+        kept = []
+        for block in self._score_blocks(enroll, probe):
+            if last + 1 == bins:
+                mask = (block >= lo) & (block <= hi)
+            else:
+                mask = (block >= lo) & (block < hi)
+            kept.append(block[mask])
+        kept = np.sort(np.concatenate(kept))
+        return float(
+            (kept[ranks[0] - below - 1] + kept[ranks[1] - below - 1]) / 2
+        )
+
+
+def progressive_order(count, initial_frames):
+    """Orders the frame positions of a video from coarse to fine.
+
+    The first ``initial_frames`` positions are spread over the whole video, the
+    next ones fill the gaps between them, and so on until all positions are
+    listed.
+
+    Parameters
+    ----------
+    count : int
+        The number of frames of the video.
+    initial_frames : int
+        The number of frames of the first (coarsest) level.
+
+    Returns
+    -------
+    list
+        All positions from 0 to ``count - 1`` in coarse to fine order.
+    """
+    order, seen = [], set()
+    level = max(1, initial_frames)
+    while len(order) < count:
+        for position in selected_indices(count, min(level, count)):
+            if position not in seen:
+                seen.add(position)
+                order.append(position)
+        level *= 2
+    return order
+
+
+class ProgressiveVerification:
+    """Verifies videos using as few frames as needed.
+
+    The probe video is processed in rounds. The first round takes
+    ``initial_frames`` frames spread over the video, sends them through
+    ``transformer`` and scores them against the enrollment template. More
+    frames are added (``growth`` times more each round) only while the score is
+    within ``band`` of ``threshold``, i.e. while the decision is uncertain.
+
+    Parameters
+    ----------
+    transformer : ``sklearn.base.BaseEstimator``
+        Transforms samples of videos into samples of
+        :any:`bob.bio.video.VideoLikeContainer` features, for example a
+        pipeline wrapped with :any:`bob.bio.video.video_wrap_skpipeline`. The
+        annotations of the videos are given as the ``annotations`` attribute
+        of the samples. A :any:`bob.bio.video.transformer.VideoWrapper` which
+        is not sample wrapped is wrapped here and receives the annotations.
+    algorithm : :any:`FrameScoring`
+        The algorithm to create templates and score them, by default
+        ``FrameScoring(reduction="mean")``.
+    threshold : float
+        The decision threshold of the scores.
+    band : float
+        Scores within ``threshold - band`` and ``threshold + band`` are
+        considered uncertain.
+    initial_frames : int
+        The number of frames of the first round (at least 1).
+    growth : float
+        The factor (greater than 1) by which the number of frames grows in
+        each round.
+    """
+
+    def __init__(
+        self,
+        transformer,
+        algorithm=None,
+        threshold=0.0,
+        band=0.1,
+        initial_frames=4,
+        growth=2,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        if initial_frames < 1:
+            raise ValueError(
+                f"Invalid initial_frames: {initial_frames}. It must be at "
+                "least 1"
+            )
+        if growth <= 1:
+            raise ValueError(
+                f"Invalid growth: {growth}. It must be greater than 1"
+            )
+        self.transformer = transformer
+        self.algorithm = algorithm or FrameScoring(reduction="mean")
+        self.threshold = threshold
+        self.band = band
+        self.initial_frames = initial_frames
+        self.growth = growth
+
+    def _sample_transformer(self, annotations):
+        """Returns the transformer wrapped to take samples."""
+        transformer = self.transformer
+        if isinstance(transformer, Pipeline):
+            if all(is_pipeline_wrapped(transformer, SampleWrapper)):
+                return transformer
+            if annotations is not None:
+                raise ValueError(
+                    "Annotations cannot be given to a sklearn pipeline whose "
+                    "steps are not sample wrapped: wrap the steps that take "
+                    "annotations with bob.pipelines.wrap(['sample'], ..., "
+                    "transform_extra_arguments=(('annotations', "
+                    "'annotations'),)) and the pipeline with "
+                    "bob.bio.video.video_wrap_skpipeline."
+                )
+            return wrap(["sample"], transformer)
+        if is_instance_nested(transformer, "estimator", SampleWrapper):
+            return transformer
+        extra_arguments = None
+        if annotations is not None:
+            extra_arguments = (("annotations", "annotations"),)
+        return wrap(
+            ["sample"], transformer, transform_extra_arguments=extra_arguments
+        )
+
+    def _transform(self, video, positions, annotations):
+        """Loads only the frames at ``positions`` and transforms them."""
+        frames = VideoLikeContainer(
+            [video[i] for i in positions],
+            [video.indices[i] for i in positions],
+        )
+        sample = Sample(frames, annotations=annotations)
+        transformer = self._sample_transformer(annotations)
+        return transformer.transform([sample])[0].data
+
+    def enroll(self, videos, annotations=None):
+        """Creates an enrollment template from all frames of ``videos``."""
+        annotations = annotations or [None] * len(videos)
+        features = [
+            self._transform(video, range(len(video)), annot)
+            for video, annot in zip(videos, annotations)
+        ]
+        return self.algorithm.create_templates([features], enroll=True)[0]
+
+    def verify(self, template, video, annotations=None):
+        """Scores a probe video against an enrollment template.
+
+        Parameters
+        ----------
+        template
+            An enrollment template created by
+            :any:`ProgressiveVerification.enroll`.
+        video : :any:`bob.bio.video.VideoAsArray` or :any:`bob.bio.video.VideoLikeContainer`
+            The probe video. Frames are only loaded when they are needed.
+        annotations : dict, optional
+            The annotations of the probe video (frame index to annotations).
+
+        Returns
+        -------
+        score : float
+            The score of the probe against the template.
+        n_frames : int
+            The number of frames that were used to compute the score.
+        """
+        order = progressive_order(len(video), self.initial_frames)
+        data, indices = [], []
+        score, used, size = np.nan, 0, self.initial_frames
+        while used < len(order):
+            positions = sorted(order[used:size])
+            features = self._transform(video, positions, annotations)
+            data.extend(features)
+            indices.extend(features.indices)
+            used = min(size, len(order))
+            # each round adds at least one frame
+            size = max(int(size * self.growth), size + 1)
+
+            probe = self.algorithm.create_templates(
+                [[VideoLikeContainer(data, indices)]], enroll=False
+            )[0]
+            score = self.algorithm.score(template, probe)
+            if abs(score - self.threshold) > self.band:
+                break
+
+        logger.debug(
+            "Progressive verification used %d of %d frames", used, len(video)
+        )
+        return score, used
@@ -4,7 +4,7 @@ import logging
 import bob.bio.base
 import bob.bio.face
 
-from . import utils
+from . import instrumentation, utils
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +52,15 @@ def normalize_annotations(annotations, validator, max_age=-1):
         yield k, current
 
 
+def _record_annotations(start, annotations):
+    instrumentation.record(
+        "annotate",
+        start,
+        frames=len(annotations),
+        failed_frames=sum(not a for a in annotations.values()),
+    )
+
+
 class Base(bob.bio.base.annotator.Annotator):
     """The base class for video annotators."""
 
@@ -169,6 +178,7 @@ class FailSafeVideo(Base):
 
     def annotate(self, frames):
         """See :any:`Base.annotate`"""
+        start = instrumentation.start()
         video_annotations = collections.OrderedDict()
         current = None
         age = 0
@@ -189,6 +199,8 @@ class FailSafeVideo(Base):
                     logger.debug("Annotator `%s' failed.", annotator)
 
             video_annotations[i] = current
+        if start is not None:
+            _record_annotations(start, video_annotations)
         return video_annotations
 
 
@@ -243,6 +255,7 @@ class Wrapper(Base):
 
     def annotate(self, frames):
         """See :any:`Base.annotate`"""
+        start = instrumentation.start()
         annotations = collections.OrderedDict()
         for i, frame in self.frame_ids_and_frames(frames):
             logger.debug("Annotating frame %s", i)
@@ -251,4 +264,6 @@ class Wrapper(Base):
             annotations = collections.OrderedDict(
                 normalize_annotations(annotations, self.validator, self.max_age)
             )
+        if start is not None:
+            _record_annotations(start, annotations)
         return annotations
@@ -1,6 +1,6 @@
 # isort: skip_file
 from .youtube import YoutubeDatabase
-from .database import VideoBioFile
+from .database import VideoBioFile, sample_path, video_files
 
 
 # gets sphinx autodoc done right - don't remove it
@@ -19,5 +19,5 @@ def __appropriate__(*args):
         obj.__module__ = __name__
 
 
-__appropriate__(YoutubeDatabase, VideoBioFile)
+__appropriate__(YoutubeDatabase, VideoBioFile, sample_path, video_files)
 __all__ = [_ for _ in dir() if not _.startswith("_")]
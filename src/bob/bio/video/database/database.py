@@ -1,7 +1,17 @@
+import functools
+import logging
+import os
+
+from bob.bio.base.database import FileSampleLoader
 from bob.bio.base.database.file import BioFile
 
 from ..utils import VideoAsArray
 
+logger = logging.getLogger(__name__)
+
+# extensions of databases which store the frames of videos as images
+IMAGE_EXTENSIONS = (".bmp", ".jpeg", ".jpg", ".pgm", ".png", ".ppm", ".tif")
+
 
 class VideoBioFile(BioFile):
     def __init__(
@@ -17,6 +27,12 @@ class VideoBioFile(BioFile):
         selection_style=None,
         max_number_of_frames=None,
         step_size=None,
+        difference_threshold=None,
+        size=None,
+        grayscale=False,
+        crop=None,
+        layout="CHW",
+        transcoded_directory=None,
         **kwargs,
     ):
         """
@@ -37,6 +53,12 @@ class VideoBioFile(BioFile):
         self.selection_style = selection_style or "all"
         self.max_number_of_frames = max_number_of_frames
         self.step_size = step_size
+        self.difference_threshold = difference_threshold
+        self.size = size
+        self.grayscale = grayscale
+        self.crop = crop
+        self.layout = layout
+        self.transcoded_directory = transcoded_directory
 
     def load(self):
         path = self.make_path(self.original_directory, self.original_extension)
@@ -45,4 +67,120 @@ class VideoBioFile(BioFile):
             selection_style=self.selection_style,
             max_number_of_frames=self.max_number_of_frames,
             step_size=self.step_size,
+            difference_threshold=self.difference_threshold,
+            size=self.size,
+            grayscale=self.grayscale,
+            crop=self.crop,
+            layout=self.layout,
+            transcoded_directory=self.transcoded_directory,
+        )
+
+
+def _file_sample_loader(transformer):
+    """Returns the FileSampleLoader of a (nested) pipeline or None."""
+    if isinstance(transformer, FileSampleLoader):
+        return transformer
+    for _, step in getattr(transformer, "steps", []):
+        loader = _file_sample_loader(step)
+        if loader is not None:
+            return loader
+    return None
+
+
+def sample_path(sample, database=None):
+    """Returns the path of the file of a sample without loading the sample.
+
+    Parameters
+    ----------
+    sample
+        A sample, usually a :any:`bob.pipelines.DelayedSample` of a
+        :any:`bob.bio.base.database.CSVDatabase`.
+    database : optional
+        The database of the sample. Its ``FileSampleLoader`` (or its
+        ``original_directory`` and ``original_extension`` or ``extension``) is
+        used to find the file of samples which only have a ``path``.
+
+    Returns
+    -------
+    str or None
+        The path of the file or None if it cannot be found without loading the
+        sample.
+    """
+    # samples of a FileSampleLoader load themselves from their file
+    load = getattr(sample, "_load", None)
+    if isinstance(load, functools.partial) and len(load.args) == 1:
+        path = load.args[0]
+        if isinstance(path, (str, os.PathLike)):
+            return os.path.normpath(path)
+
+    path = getattr(sample, "path", None)
+    if database is None or not isinstance(path, str):
+        return None
+    loader = _file_sample_loader(getattr(database, "transformer", None))
+    if loader is not None:
+        directory, extension = (
+            loader.dataset_original_directory,
+            loader.extension,
+        )
+    else:
+        directory = getattr(database, "original_directory", None)
+        extension = getattr(
+            database,
+            "original_extension",
+            getattr(database, "extension", None),
+        )
+        if directory is None or extension is None:
+            return None
+    return os.path.normpath(os.path.join(directory, f"./{path}{extension}"))
+
+
+def video_files(database, groups=None):
+    """Lists the paths of the video files of a database.
+
+    The samples are not loaded, their paths are found with
+    :any:`sample_path`. Only the samples whose path cannot be found are
+    loaded, in which case their data must be :any:`bob.bio.video.VideoAsArray`.
+
+    Databases which store the frames of videos as images (e.g. the YouTube
+    Faces database, see :any:`YoutubeDatabase`) are not supported, their
+    frames are skipped.
+
+    Parameters
+    ----------
+    database
+        A database of :any:`VideoBioFile` objects (with an ``objects`` method)
+        or a database of samples (with an ``all_samples`` method).
+    groups : list, optional
+        The groups of the database to list, by default all groups.
+
+    Returns
+    -------
+    list
+        The unique paths of the video files, sorted.
+    """
+    paths = set()
+    if hasattr(database, "objects"):
+        for f in database.objects(groups=groups):
+            directory = f.original_directory or database.original_directory
+            extension = f.original_extension or database.original_extension
+            paths.add(f.make_path(directory, extension))
+    else:
+        for sample in database.all_samples(groups):
+            path = sample_path(sample, database)
+            if path is None:
+                data = sample.data
+                if not isinstance(data, VideoAsArray):
+                    logger.warning("The data of %s is not a video file", sample)
+                    continue
+                path = data.source_path
+            paths.add(path)
+
+    images = {p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS)}
+    if images:
+        logger.warning(
+            "Skipped %d image files of %s: databases which store the frames "
+            "of videos as images are not supported",
+            len(images),
+            database,
         )
+    return sorted(paths - images)
@@ -0,0 +1,218 @@
+import logging
+import pickle
+
+import h5py
+import numpy as np
+
+from .algorithm import score_blocks, stack_frames
+from .transformer import TemporalPooling, _l2_normalize
+
+logger = logging.getLogger(__name__)
+
+
+class IdentificationIndex:
+    """An in-memory index to search the identity of probe videos in a gallery.
+
+    All gallery frames (or one pooled template per video when ``pooling`` is
+    given) are packed into one contiguous float32 matrix together with a map from
+    each row to its subject. A search scores the probe frames against all rows
+    with a few matrix products, keeps the best score of each subject and returns
+    the ``k`` best subjects.
+
+    Parameters
+    ----------
+    metric : str
+        ``cosine`` (cosine similarity) or ``euclidean`` (negated euclidean
+        distance).
+    pooling : str or None
+        If given, one of the methods of
+        :any:`bob.bio.video.transformer.TemporalPooling` used to represent each
+        gallery and probe video by a single template.
+    memory_limit : int
+        The maximum size, in bytes, of one block of scores during a search.
+    """
+
+    def __init__(
+        self, metric="cosine", pooling=None, memory_limit=64 * 2**20
+    ):
+        if metric not in ("cosine", "euclidean"):
+            raise ValueError(f"Invalid metric: {metric}")
+        self.metric = metric
+        self.pooling = pooling
+        self.memory_limit = memory_limit
+        self.subjects = []
+        self._subject_ids = {}
+        self._features = np.zeros((0, 0), dtype=np.float32)
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return (
+            f"IdentificationIndex: {len(self.subjects)} subjects, {len(self)} "
+            f"rows, metric={self.metric!r}, pooling={self.pooling!r}"
+        )
+
+    @property
+    def features(self):
+        """The gallery matrix (one row per frame or template)."""
+        return self._features[: self._size]
+
+    @property
+    def rows(self):
+        """The subject index (into ``subjects``) of each row of ``features``."""
+        return self._rows[: self._size]
+
+    def _matrix(self, video):
+        """Converts a video into the rows that represent it."""
+        if self.pooling is not None:
+            video = TemporalPooling(self.pooling).transform([video])
+        matrix = stack_frames(video)
+        if self.metric == "cosine" and len(matrix):
+            matrix = _l2_normalize(matrix)
+        return matrix
+
+    def _reserve(self, n_rows, n_columns):
+        """Grows the buffers (by doubling) to hold ``n_rows`` more rows."""
+        if self._size == 0 and self._features.shape[1] != n_columns:
+            self._features = np.zeros((0, n_columns), dtype=np.float32)
+        if self._features.shape[1] != n_columns:
+            raise ValueError(
+                f"Features of size {n_columns} cannot be added to an index of "
+                f"size {self._features.shape[1]}"
+            )
+        needed = self._size + n_rows
+        if needed <= len(self._features):
+            return
+        capacity = max(needed, 2 * len(self._features))
+        features = np.empty((capacity, n_columns), dtype=np.float32)
+        features[: self._size] = self.features
+        rows = np.empty(capacity, dtype=np.int64)
+        rows[: self._size] = self.rows
+        self._features, self._rows = features, rows
+
+    def add(self, videos, subjects):
+        """Inserts gallery videos into the index.
+
+        Parameters
+        ----------
+        videos : list
+            A list of :any:`bob.bio.video.VideoLikeContainer` features.
+        subjects : list
+            The subject id of each video.
+        """
+        for video, subject in zip(videos, subjects):
+            matrix = self._matrix(video)
+            if len(matrix) == 0:
+                logger.warning("No valid frames to index for %s", subject)
+                continue
+            if subject not in self._subject_ids:
+                self._subject_ids[subject] = len(self.subjects)
+                self.subjects.append(subject)
+            self._reserve(*matrix.shape)
+            self._features[self._size : self._size + len(matrix)] = matrix
+            self._rows[
+                self._size : self._size + len(matrix)
+            ] = self._subject_ids[subject]
+            self._size += len(matrix)
+        return self
+
+    def _row_scores(self, probe):
+        """The best score of the probe frames against each gallery row."""
+        gallery = self.features
+        best = np.full(len(gallery), -np.inf, dtype=np.float32)
+        for _, cols, block in score_blocks(
+            probe, gallery, self.metric, self.memory_limit
+        ):
+            np.maximum(best[cols], block.max(axis=0), out=best[cols])
+        return best
+
+    def search(self, video, k=5):
+        """Returns the ``k`` best matching subjects of a probe video.
+
+        Parameters
+        ----------
+        video : :any:`bob.bio.video.VideoLikeContainer`
+            The features of the probe video.
+        k : int
+            The number of subjects to return.
+
+        Returns
+        -------
+        list
+            A list of ``(subject, score)`` tuples sorted by decreasing score.
+            Empty if the probe has no valid frames or the index is empty.
+        """
+        probe = self._matrix(video)
+        if len(probe) == 0 or len(self) == 0:
+            return []
+
+        subject_scores = np.full(len(self.subjects), -np.inf, dtype=np.float32)
+        np.maximum.at(subject_scores, self.rows, self._row_scores(probe))
+
+        k = min(k, len(subject_scores))
+        best = np.argpartition(-subject_scores, k - 1)[:k]
+        best = best[np.argsort(-subject_scores[best], kind="stable")]
+        return [(self.subjects[i], float(subject_scores[i])) for i in best]
+
+    def save(self, file):
+        """Saves the index in an hdf5 file (or a pickle file if the subject ids
+        cannot be stored in hdf5, i.e. if they are not all strings or all
+        numbers, e.g. tuples)."""
+        subjects = self.subjects
+        if subjects and all(isinstance(s, str) for s in subjects):
+            # numpy unicode arrays are not supported by hdf5
+            subjects = np.array(subjects, dtype=h5py.string_dtype())
+        state = {
+            "features": self.features,
+            "rows": self.rows,
+            "subjects": subjects,
+        }
+        try:
+            with h5py.File(file, mode="w") as f:
+                for key, value in state.items():
+                    f[key] = value
+                f.attrs["metric"] = self.metric
+                f.attrs["pooling"] = self.pooling or ""
+                f.attrs["memory_limit"] = self.memory_limit
+        # revert to saving data in pickles when the dtype is not supported by hdf5
+        except TypeError:
+            state["subjects"] = self.subjects
+            state["metric"] = self.metric
+            state["pooling"] = self.pooling
+            state["memory_limit"] = self.memory_limit
+            with open(file, "wb") as f:
+                pickle.dump(state, f)
+
+    @classmethod
+    def load(cls, file):
+        """Loads an index saved with :any:`IdentificationIndex.save`."""
+        try:
+            with h5py.File(file, mode="r") as f:
+                state = {key: f[key][()] for key in f}
+                state.update(f.attrs)
+                state["pooling"] = state["pooling"] or None
+                # h5py returns strings as bytes
+                state["subjects"] = [
+                    s.decode() if isinstance(s, bytes) else s
+                    for s in state["subjects"].tolist()
+                ]
+        except OSError:
+            with open(file, "rb") as f:
+                state = pickle.load(f)
+
+        self = cls(
+            metric=state["metric"],
+            pooling=state["pooling"],
+            memory_limit=int(state["memory_limit"]),
+        )
+        self.subjects = list(state["subjects"])
+        self._subject_ids = {s: i for i, s in enumerate(self.subjects)}
+        self._features = np.ascontiguousarray(
+            state["features"], dtype=np.float32
+        )
+        self._rows = np.asarray(state["rows"], dtype=np.int64)
+        self._size = len(self._rows)
+        return self
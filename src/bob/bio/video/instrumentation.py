@@ -0,0 +1,193 @@
+"""Records the time spent and the amount of data processed in each stage of
+video processing.
+
+Instrumentation is off by default. The instrumented functions
+(:any:`bob.bio.video.VideoAsArray` indexing,
+:any:`bob.bio.video.transformer.VideoWrapper` transform, the annotators of
+:any:`bob.bio.video.annotator` and saving and loading
+:any:`bob.bio.video.VideoLikeContainer`) only check whether a callback is
+registered, which costs a few nanoseconds, until one is added with
+:any:`add_callback` or :any:`collect_metrics`.
+
+The stages are:
+
+* ``decode``: reading frames from a video file.
+* ``transform``: running an estimator on the frames of videos.
+* ``annotate``: annotating the frames of a video.
+* ``save`` and ``load``: writing and reading checkpoints of videos.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# the registered callbacks, instrumentation is off while it is empty
+_callbacks = []
+
+# the names of the counters of the stages
+COUNTERS = ("frames", "bytes", "cache_hits", "failed_frames")
+
+
+def add_callback(callback):
+    """Registers a function called at the end of every instrumented call.
+
+    Parameters
+    ----------
+    callback : callable
+        Called as ``callback(stage, seconds, counters)`` where ``stage`` is the
+        name of the stage, ``seconds`` the duration of the call and
+        ``counters`` a dictionary with some of the counters of
+        :any:`COUNTERS`. It is called from the thread that made the call.
+    """
+    _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    """Unregisters a function registered with :any:`add_callback`."""
+    _callbacks.remove(callback)
+
+
+def start():
+    """Returns the start time of an instrumented call, or None if
+    instrumentation is off."""
+    return time.perf_counter() if _callbacks else None
+
+
+def record(stage, start, **counters):
+    """Calls the callbacks at the end of an instrumented call.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage.
+    start : float
+        The value returned by :any:`start`.
+    **counters
+        The counters of the call (see :any:`COUNTERS`).
+    """
+    seconds = time.perf_counter() - start
+    for callback in list(_callbacks):
+        try:
+            callback(stage, seconds, counters)
+        except Exception:
+            logger.exception("Instrumentation callback %s failed", callback)
+
+
+class MetricsCollector:
+    """A callback (see :any:`add_callback`) that adds up the number of calls,
+    the durations and the counters of each stage.
+
+    The metrics can be exported in json (:any:`MetricsCollector.to_json`) or in
+    the Prometheus text format (:any:`MetricsCollector.to_prometheus`), e.g. for
+    the textfile collector of the Prometheus node exporter.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def __call__(self, stage, seconds, counters):
+        with self._lock:
+            metrics = self.stages.get(stage)
+            if metrics is None:
+                metrics = self.stages[stage] = {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "max_seconds": 0.0,
+                }
+            metrics["calls"] += 1
+            metrics["seconds"] += seconds
+            metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+            for name, value in counters.items():
+                if value is not None:
+                    metrics[name] = metrics.get(name, 0) + value
+
+    def snapshot(self):
+        """Returns a copy of the metrics of each stage."""
+        with self._lock:
+            return {stage: dict(m) for stage, m in self.stages.items()}
+
+    def reset(self):
+        """Drops all metrics."""
+        with self._lock:
+            self.stages = {}
+
+    def to_json(self, path=None):
+        """Returns the metrics in json and writes them to ``path`` if given."""
+        text = json.dumps(self.snapshot(), indent=2, sort_keys=True)
+        if path is not None:
+            _write_atomic(path, text + "\n")
+        return text
+
+    def to_prometheus(self, path=None, prefix="bob_bio_video"):
+        """Returns the metrics in the Prometheus text format and writes them
+        to ``path`` if given.
+
+        Each metric is labeled with its ``stage``: ``<prefix>_calls_total``,
+        ``<prefix>_seconds_total``, ``<prefix>_max_seconds`` and
+        ``<prefix>_<counter>_total`` for each counter.
+        """
+        snapshot = self.snapshot()
+        names = sorted({name for m in snapshot.values() for name in m})
+        lines = []
+        for name in names:
+            if name == "max_seconds":
+                metric, kind = f"{prefix}_{name}", "gauge"
+            else:
+                metric, kind = f"{prefix}_{name}_total", "counter"
+            lines.append(f"# HELP {metric} The {name} of each stage.")
+            lines.append(f"# TYPE {metric} {kind}")
+            for stage in sorted(snapshot):
+                if name in snapshot[stage]:
+                    value = snapshot[stage][name]
+                    lines.append(f'{metric}{{stage="{stage}"}} {value}')
+        text = "\n".join(lines) + "\n"
+        if path is not None:
+            _write_atomic(path, text)
+        return text
+
+
+def _write_atomic(path, text):
+    # the exporters must never read a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def collect_metrics(collector=None):
+    """Turns instrumentation on inside a ``with`` block.
+
+    Parameters
+    ----------
+    collector : :any:`MetricsCollector`, optional
+        The collector of the metrics, by default a new one.
+
+    Yields
+    ------
+    :any:`MetricsCollector`
+        The collector.
+    """
+    collector = collector or MetricsCollector()
+    add_callback(collector)
+    try:
+        yield collector
+    finally:
+        remove_callback(collector)
+
+
+def file_size(file):
+    """Returns the size of a file given by path, or None."""
+    if isinstance(file, (str, os.PathLike)):
+        try:
+            return os.path.getsize(file)
+        except OSError:
+            return None
+    return None
@@ -0,0 +1,326 @@
+"""Measures the throughput of video pipelines on synthetic databases."""
+
+import logging
+import math
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline, make_pipeline
+
+from bob.pipelines import Sample, wrap
+
+from .staged import decode_video
+from .synthetic import write_synthetic_video
+from .transformer import VideoWrapper
+from .utils import VideoAsArray, video_wrap_skpipeline
+
+logger = logging.getLogger(__name__)
+
+DURATION_DISTRIBUTIONS = ("uniform", "lognormal")
+
+
+def synthetic_database(
+    directory,
+    n_videos=20,
+    min_duration=2.0,
+    max_duration=10.0,
+    distribution="uniform",
+    fps=25,
+    size=(320, 240),
+    gop_size=12,
+    seed=0,
+):
+    """Writes a database of synthetic videos of random durations.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the videos. Videos that already exist are reused.
+    n_videos : int
+        The number of videos.
+    min_duration, max_duration : float
+        The range of the durations of the videos, in seconds.
+    distribution : str
+        ``uniform`` or ``lognormal``. The log-normal durations are centered on
+        the geometric mean of the range (and clipped to it), so that most videos
+        are short and a few are long like in most real databases.
+    fps, size, gop_size
+        See :any:`bob.bio.video.synthetic.write_synthetic_video`.
+    seed : int
+        The seed of the durations and of the frames.
+
+    Returns
+    -------
+    list
+        The paths of the videos.
+    """
+    if distribution not in DURATION_DISTRIBUTIONS:
+        raise ValueError(
+            f"Invalid distribution: {distribution}. "
+            f"Choose from {DURATION_DISTRIBUTIONS}"
+        )
+    rng = np.random.default_rng(seed)
+    if distribution == "uniform":
+        durations = rng.uniform(min_duration, max_duration, n_videos)
+    else:
+        median = math.sqrt(min_duration * max_duration)
+        durations = rng.lognormal(math.log(median), 0.5, n_videos)
+        durations = np.clip(durations, min_duration, max_duration)
+
+    paths = []
+    width, height = size
+    for i, duration in enumerate(durations):
+        n_frames = max(1, int(round(duration * fps)))
+        path = os.path.join(
+            directory, f"video{i:05d}-{n_frames}f-{width}x{height}.mp4"
+        )
+        if not os.path.exists(path):
+            write_synthetic_video(
+                path,
+                n_frames=n_frames,
+                size=size,
+                fps=fps,
+                gop_size=gop_size,
+                seed=seed + i,
+            )
+        paths.append(path)
+    return paths
+
+
+class StubCropper(TransformerMixin, BaseEstimator):
+    """A stand-in for a face cropper: crops the center of the frames."""
+
+    def __init__(self, size=(112, 112), **kwargs):
+        super().__init__(**kwargs)
+        self.size = size
+
+    def transform(self, frames):
+        width, height = self.size
+        cropped = []
+        for frame in frames:
+            frame = np.asarray(frame)
+            top = max(0, (frame.shape[-2] - height) // 2)
+            left = max(0, (frame.shape[-1] - width) // 2)
+            cropped.append(
+                frame[..., top : top + height, left : left + width].astype(
+                    np.float32
+                )
+            )
+        return cropped
+
+    def _more_tags(self):
+        return {"requires_fit": False, "stateless": True}
+
+    def fit(self, X, y=None):
+        return self
+
+
+class StubExtractor(TransformerMixin, BaseEstimator):
+    """A stand-in for a feature extractor: projects the frames on random
+    directions. ``seconds_per_frame`` adds a fixed compute time per frame to
+    simulate a heavier model."""
+
+    def __init__(self, n_features=128, seconds_per_frame=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.n_features = n_features
+        self.seconds_per_frame = seconds_per_frame
+
+    def transform(self, frames):
+        rng = np.random.default_rng(0)
+        projection = rng.standard_normal(
+            (self.n_features, 64), dtype=np.float32
+        )
+        features = []
+        for frame in frames:
+            frame = np.asarray(frame, dtype=np.float32).ravel()
+            # pool the frame into 64 bins before projecting it
+            bins = np.array_split(frame, 64)
+            pooled = np.array([b.mean() for b in bins], dtype=np.float32)
+            features.append(projection @ pooled)
+            if self.seconds_per_frame:
+                time.sleep(self.seconds_per_frame)
+        return features
+
+    def _more_tags(self):
+        return {"requires_fit": False, "stateless": True}
+
+    def fit(self, X, y=None):
+        return self
+
+
+def stub_pipeline(seconds_per_frame=0.0):
+    """A pipeline of stub estimators wrapped with
+    :any:`bob.bio.video.video_wrap_skpipeline`."""
+    return video_wrap_skpipeline(
+        make_pipeline(
+            wrap(["sample"], StubCropper()),
+            wrap(
+                ["sample"], StubExtractor(seconds_per_frame=seconds_per_frame)
+            ),
+        )
+    )
+
+
+def _video_pipeline(pipeline):
+    """Returns the (video wrapped) sklearn pipeline of ``pipeline``."""
+    pipeline = getattr(pipeline, "transformer", pipeline)
+    if not isinstance(pipeline, Pipeline):
+        raise ValueError(f"{pipeline} is not a sklearn pipeline")
+    wrapped = any(
+        isinstance(getattr(estimator, "estimator", estimator), VideoWrapper)
+        for _, estimator in pipeline.steps
+    )
+    if not wrapped:
+        pipeline = video_wrap_skpipeline(pipeline)
+    return pipeline
+
+
+# the pipeline of each worker process
+_worker = {}
+
+
+def _init_worker(pipeline):
+    _worker["pipeline"] = pipeline
+
+
+def _worker_pid():
+    # keeps the worker busy for a moment so that the other workers take the
+    # other calls
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _warm_up(executor, n_workers, attempts=10):
+    """Starts all workers of an executor (and runs their initializer) so that
+    the process startup is not timed."""
+    pids = set()
+    for _ in range(attempts):
+        futures = [executor.submit(_worker_pid) for _ in range(n_workers)]
+        pids.update(future.result() for future in futures)
+        if len(pids) >= n_workers:
+            return
+    logger.warning("Only %d of %d workers started", len(pids), n_workers)
+
+
+def _run_video(path, video_options):
+    """Runs the pipeline of the worker on a video and returns the number of
+    frames and the latency of each stage."""
+    latencies = {}
+    start = time.perf_counter()
+    video = decode_video(VideoAsArray(path, **video_options))
+    latencies["decode"] = time.perf_counter() - start
+    sample = Sample(video, key=path)
+    for name, step in _worker["pipeline"].steps:
+        start = time.perf_counter()
+        (sample,) = step.transform([sample])
+        latencies[name] = time.perf_counter() - start
+    return len(video), latencies
+
+
+def _percentiles(values):
+    values = np.asarray(values, dtype=float)
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def run_load_test(
+    paths,
+    pipeline=None,
+    workers=(1, 2, 4),
+    video_options=None,
+):
+    """Runs a pipeline on videos with several numbers of workers and reports
+    its throughput.
+
+    Each worker is a process that runs the whole pipeline on one video at a
+    time, like the workers of a dask cluster. The workers are started before
+    the run is timed.
+
+    Parameters
+    ----------
+    paths : list
+        The paths of the videos, e.g. from :any:`synthetic_database`.
+    pipeline : object, optional
+        A :any:`bob.bio.base.pipelines.PipelineSimple` (only its transformer is
+        run) or a sklearn pipeline of sample-wrapped estimators. It is wrapped
+        with :any:`bob.bio.video.video_wrap_skpipeline` if it is not already.
+        By default, :any:`stub_pipeline`.
+    workers : tuple
+        The numbers of workers to run the pipeline with.
+    video_options : dict, optional
+        Keyword arguments of :any:`bob.bio.video.VideoAsArray`, by default all
+        frames are selected.
+
+    Returns
+    -------
+    dict
+        A report with, for each number of workers, the ``frames_per_second``,
+        ``videos_per_second``, the ``scaling_efficiency`` (the speed-up over
+        the smallest number of workers divided by the increase in workers) and
+        the latency percentiles (in seconds) of each stage of the pipeline.
+
+    Raises
+    ------
+    ValueError
+        If there are no videos.
+    """
+    if not paths:
+        raise ValueError("There are no videos to run the load test on")
+    pipeline = _video_pipeline(pipeline or stub_pipeline())
+    video_options = video_options or {"selection_style": "all"}
+    report = {
+        "videos": len(paths),
+        "video_options": video_options,
+        "stages": ["decode"] + [name for name, _ in pipeline.steps],
+        "runs": [],
+    }
+    base = None
+    for n_workers in sorted(set(workers)):
+        logger.info("Running %d videos with %d workers", len(paths), n_workers)
+        with ProcessPoolExecutor(
+            n_workers, initializer=_init_worker, initargs=(pipeline,)
+        ) as executor:
+            _warm_up(executor, n_workers)
+            start = time.perf_counter()
+            results = list(
+                executor.map(_run_video, paths, [video_options] * len(paths))
+            )
+            elapsed = time.perf_counter() - start
+
+        counts = [count for count, _ in results]
+        report.setdefault("frames_per_video", _percentiles(counts))
+        n_frames = sum(counts)
+        run = {
+            "workers": n_workers,
+            "elapsed_seconds": elapsed,
+            "frames": n_frames,
+            "frames_per_second": n_frames / elapsed,
+            "videos_per_second": len(paths) / elapsed,
+        }
+        if base is None:
+            base = run
+        run["scaling_efficiency"] = (
+            run["frames_per_second"] / base["frames_per_second"]
+        ) / (n_workers / base["workers"])
+        run["latency_seconds"] = {
+            stage: _percentiles([latencies[stage] for _, latencies in results])
+            for stage in report["stages"]
+        }
+        logger.info(
+            "%d workers: %.1f frames/s, efficiency %.2f",
+            n_workers,
+            run["frames_per_second"],
+            run["scaling_efficiency"],
+        )
+        report["runs"].append(run)
+    return report
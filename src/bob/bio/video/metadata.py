@@ -0,0 +1,225 @@
+"""An index of the metadata of the videos of a database."""
+
+import json
+import logging
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+
+from clapper.rc import UserDefaults
+
+from .transcode import is_frame_store
+
+logger = logging.getLogger(__name__)
+rc = UserDefaults("bobrc.toml")
+
+METADATA_INDEX_VERSION = 1
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def scan_video(path):
+    """Probes the frame count, frame size, frame rate and keyframes of a video.
+
+    Returns
+    -------
+    dict
+        An entry of :any:`MetadataIndex`.
+    """
+    # imported here because bob.bio.video.utils uses this module
+    from .utils import _probe_keyframes, _video_metadata
+
+    mtime, file_size = _stat(path)
+    metadata = _video_metadata(path, mtime, file_size)
+    if is_frame_store(path):
+        keyframes = list(range(metadata["count"]))
+    else:
+        keyframes = _probe_keyframes(path, metadata["fps"])
+    return {
+        "mtime": mtime,
+        "file_size": file_size,
+        "count": metadata["count"],
+        "size": list(metadata["size"]),
+        "fps": metadata["fps"],
+        "keyframes": keyframes,
+    }
+
+
+class MetadataIndex:
+    """The metadata of many videos, saved in a single json file.
+
+    Each entry holds the number of frames (``count``), the frame ``size``
+    (width, height), the ``fps`` and the ``keyframes`` of a video together with
+    the modification time and size of the file when it was scanned. Entries of
+    files that changed since are ignored and are scanned again by
+    :any:`MetadataIndex.update`.
+
+    Once an index is used (see :any:`use_metadata_index`),
+    :any:`bob.bio.video.video_metadata` and
+    :any:`bob.bio.video.keyframe_indices` (and thus
+    :any:`bob.bio.video.VideoAsArray`) read the metadata of the indexed videos
+    from the index instead of probing the videos.
+
+    Parameters
+    ----------
+    entries : dict, optional
+        The entries, by absolute path of the videos.
+    """
+
+    def __init__(self, entries=None, **kwargs):
+        super().__init__(**kwargs)
+        self.entries = dict(entries or {})
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, path):
+        return self.get(path) is not None
+
+    def get(self, path, stat=None):
+        """Returns the entry of a video or None if the video is not indexed or
+        changed since it was indexed.
+
+        Parameters
+        ----------
+        path : str
+            Path to the video.
+        stat : tuple, optional
+            The modification time (ns) and size of the file, if already known.
+        """
+        entry = self.entries.get(os.path.abspath(path))
+        if entry is None:
+            return None
+        try:
+            stat = stat or _stat(path)
+        except OSError:
+            return None
+        if (entry["mtime"], entry["file_size"]) != tuple(stat):
+            return None
+        return entry
+
+    def outdated(self, paths):
+        """Returns the paths that are not indexed or changed since they were
+        indexed."""
+        return [path for path in paths if self.get(path) is None]
+
+    def update(self, paths, jobs=1, force=False):
+        """Scans the videos that are not indexed or changed since they were
+        indexed.
+
+        Parameters
+        ----------
+        paths : list
+            Paths to the videos.
+        jobs : int
+            The number of videos scanned in parallel (in separate processes).
+        force : bool
+            If True, all videos are scanned again.
+
+        Returns
+        -------
+        list
+            The paths of the scanned videos.
+        """
+        paths = list(paths) if force else self.outdated(paths)
+        if not paths:
+            return []
+        logger.info("Scanning %d videos with %d jobs", len(paths), jobs)
+        if jobs > 1:
+            with ProcessPoolExecutor(jobs) as executor:
+                entries = list(executor.map(scan_video, paths, chunksize=4))
+        else:
+            entries = [scan_video(path) for path in paths]
+        for path, entry in zip(paths, entries):
+            self.entries[os.path.abspath(path)] = entry
+        return paths
+
+    def frame_counts(self, paths):
+        """Returns the number of frames of the videos (None for videos that are
+        not indexed)."""
+        counts = []
+        for path in paths:
+            entry = self.get(path)
+            counts.append(None if entry is None else entry["count"])
+        return counts
+
+    def save(self, path):
+        """Saves the index in a json file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {"version": METADATA_INDEX_VERSION, "videos": self.entries}, f
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads an index saved by :any:`MetadataIndex.save`."""
+        with open(path) as f:
+            index = json.load(f)
+        if index.get("version") != METADATA_INDEX_VERSION:
+            raise ValueError(
+                f"Unsupported metadata index version in {path}: "
+                f"{index.get('version')}"
+            )
+        return cls(index["videos"])
+
+    def __repr__(self):
+        return f"MetadataIndex: {len(self)} videos"
+
+
+_active = {"index": None, "loaded": None}
+_active_lock = threading.Lock()
+
+
+def use_metadata_index(index):
+    """Sets the index used by :any:`bob.bio.video.video_metadata` and
+    :any:`bob.bio.video.keyframe_indices` in this process.
+
+    Parameters
+    ----------
+    index : :any:`MetadataIndex` or str or None
+        An index or the path of a saved index. If None, the index saved at the
+        ``bob.bio.video.metadata_index`` configuration is used (``bob config set
+        bob.bio.video.metadata_index PATH``), if any.
+    """
+    if isinstance(index, (str, os.PathLike)):
+        index = MetadataIndex.load(index)
+    with _active_lock:
+        _active["index"] = index
+        _active["loaded"] = None
+
+
+def active_metadata_index():
+    """Returns the index set by :any:`use_metadata_index` or the index saved at
+    the ``bob.bio.video.metadata_index`` configuration, or None."""
+    if _active["index"] is not None:
+        return _active["index"]
+    path = rc.get("bob.bio.video.metadata_index")
+    if not path:
+        return None
+    try:
+        key = (path,) + _stat(path)
+    except OSError:
+        logger.debug("The metadata index %s does not exist", path)
+        return None
+    with _active_lock:
+        # load the index again when its file changes
+        loaded = _active["loaded"]
+        if loaded is None or loaded[0] != key:
+            loaded = _active["loaded"] = (key, MetadataIndex.load(path))
+        return loaded[1]
+
+
+def indexed_metadata(path, stat=None):
+    """Returns the entry of a video in the active index or None."""
+    index = active_metadata_index()
+    if index is None:
+        return None
+    return index.get(path, stat)
@@ -0,0 +1,280 @@
+"""Balances the videos of a database between workers by their cost."""
+
+import functools
+import heapq
+import logging
+import math
+
+import numpy as np
+
+from bob.pipelines import ToDaskBag
+from bob.pipelines.wrappers import _frmt
+
+from .database import VideoBioFile, sample_path
+from .utils import (
+    CONTENT_AWARE_STYLES,
+    VideoAsArray,
+    VideoLikeContainer,
+    select_frames,
+    video_metadata,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_cost(
+    path,
+    max_number_of_frames=None,
+    selection_style=None,
+    step_size=None,
+    size=None,
+):
+    """Estimates the cost of processing a video without opening it.
+
+    The cost is the number of selected frames times the number of pixels of a
+    frame. The metadata of the video comes from
+    :any:`bob.bio.video.video_metadata` (and thus from the metadata index, see
+    :any:`bob.bio.video.metadata.MetadataIndex`, if the video is indexed).
+
+    Parameters
+    ----------
+    path : str
+        Path to the video.
+    max_number_of_frames, selection_style, step_size
+        The frame selection parameters, see :any:`bob.bio.video.select_frames`.
+        The content-aware styles are counted as selecting
+        ``max_number_of_frames`` frames.
+    size : tuple, optional
+        The (width, height) of the decoded frames, by default the size of the
+        video.
+
+    Returns
+    -------
+    int
+        The cost of the video.
+    """
+    metadata = video_metadata(path)
+    count = metadata["count"]
+    if selection_style in CONTENT_AWARE_STYLES:
+        n_frames = min(count, max_number_of_frames or 20)
+    else:
+        n_frames = len(
+            select_frames(
+                count,
+                max_number_of_frames=max_number_of_frames,
+                selection_style=selection_style,
+                step_size=step_size,
+            )
+        )
+    width, height = size or metadata["size"]
+    return n_frames * width * height
+
+
+def _selection_options(sample):
+    """Returns the frame selection options of a sample loaded with a
+    ``functools.partial`` of :any:`bob.bio.video.VideoAsArray`."""
+    # nested partials are flattened: the load function of the sample is a
+    # partial of VideoAsArray with the path and the options
+    load = getattr(sample, "_load", None)
+    if not isinstance(load, functools.partial):
+        return {}
+    cls = load.func
+    if not (isinstance(cls, type) and issubclass(cls, VideoAsArray)):
+        return {}
+    keywords = load.keywords
+    options = {
+        name: keywords[name]
+        for name in ("max_number_of_frames", "selection_style", "step_size")
+        if name in keywords
+    }
+    size, crop = keywords.get("size"), keywords.get("crop")
+    if size is None and crop is not None:
+        size = tuple(crop[2:])
+    options["size"] = size
+    return options
+
+
+def video_cost(item):
+    """Estimates the cost of processing a video.
+
+    Parameters
+    ----------
+    item
+        A :any:`bob.bio.video.VideoAsArray` or
+        :any:`bob.bio.video.VideoLikeContainer` (the number of frames times the
+        number of pixels of a frame), a
+        :any:`bob.bio.video.database.VideoBioFile` (estimated with
+        :any:`estimate_cost` without loading it), a sample (estimated with
+        :any:`estimate_cost` from the path of its file, see
+        :any:`bob.bio.video.database.sample_path`, or else the cost of its
+        ``data``, which loads delayed samples) or a sample set (the sum of the
+        costs of its samples). The cost of any other object is its size (1 for
+        non-array objects).
+
+    Returns
+    -------
+    int
+        The cost of the item.
+    """
+    if hasattr(item, "samples"):
+        return sum(video_cost(sample) for sample in item.samples)
+    if isinstance(item, VideoBioFile):
+        size = item.size
+        if size is None and item.crop is not None:
+            size = tuple(item.crop[2:])
+        return estimate_cost(
+            item.make_path(item.original_directory, item.original_extension),
+            max_number_of_frames=item.max_number_of_frames,
+            selection_style=item.selection_style,
+            step_size=item.step_size,
+            size=size,
+        )
+    if not isinstance(item, (VideoAsArray, VideoLikeContainer)):
+        # accessing the data of delayed samples loads them
+        path = sample_path(item)
+        if path is not None:
+            try:
+                return estimate_cost(path, **_selection_options(item))
+            except (OSError, ValueError):
+                logger.debug("Cannot estimate the cost of %s", path)
+        if hasattr(item, "data"):
+            item = item.data
+    if isinstance(item, VideoAsArray):
+        return int(np.prod(item.shape))
+    if isinstance(item, VideoLikeContainer):
+        return sum(int(np.size(frame)) for frame in item if frame is not None)
+    return max(1, int(np.size(item))) if hasattr(item, "shape") else 1
+
+
+def balanced_partitions(items, n_partitions, cost=video_cost):
+    """Splits items into partitions of (almost) equal total cost.
+
+    The items are assigned from the most to the least costly, each to the
+    partition with the lowest total cost so far (the longest processing time
+    first heuristic). The most costly partition costs at most 4/3 of the best
+    possible split.
+
+    Parameters
+    ----------
+    items : list
+        The items (e.g. samples of videos) to split.
+    n_partitions : int
+        The number of partitions, e.g. the number of workers. There are no empty
+        partitions so there may be fewer partitions if there are few items.
+    cost : callable
+        Returns the cost of an item, by default :any:`video_cost`.
+
+    Returns
+    -------
+    list
+        The partitions, each a list of items in their original order.
+    """
+    items = list(items)
+    n_partitions = max(1, min(int(n_partitions), len(items)))
+    if not items:
+        return []
+    costs = [cost(item) for item in items]
+    order = sorted(range(len(items)), key=lambda i: costs[i], reverse=True)
+    loads = [(0, p) for p in range(n_partitions)]
+    assigned = [[] for _ in range(n_partitions)]
+    for i in order:
+        load, p = heapq.heappop(loads)
+        assigned[p].append(i)
+        heapq.heappush(loads, (load + costs[i], p))
+    loads = sorted(loads, key=lambda x: x[1])
+    logger.debug(
+        "Partition costs: %s (total %d)",
+        [load for load, _ in loads],
+        sum(costs),
+    )
+    return [[items[i] for i in sorted(indices)] for indices in assigned]
+
+
+class BalancedToDaskBag(ToDaskBag):
+    """Transforms a list of videos (or samples of videos) into a
+    :any:`dask.bag.Bag` whose partitions have (almost) equal total cost (see
+    :any:`balanced_partitions`).
+
+    It can replace ``bob.pipelines.ToDaskBag``, the first step of the pipelines
+    wrapped with dask, see :any:`balance_dask_pipeline`.
+
+    Parameters
+    ----------
+    npartitions : int, optional
+        The number of partitions.
+    partition_size : int, optional
+        The average number of items per partition, used when ``npartitions``
+        is not given. If both are None, there are at most 100 partitions like
+        in :any:`dask.bag.from_sequence`.
+    cost : callable
+        Returns the cost of an item, by default :any:`video_cost`.
+    """
+
+    def __init__(
+        self, npartitions=None, partition_size=None, cost=video_cost, **kwargs
+    ):
+        super().__init__(
+            npartitions=npartitions, partition_size=partition_size, **kwargs
+        )
+        self.cost = cost
+
+    def transform(self, X):
+        import dask.bag
+
+        logger.debug(f"{_frmt(self)}.transform")
+        X = list(X)
+        npartitions = self.npartitions
+        if npartitions is None:
+            if self.partition_size is not None:
+                npartitions = math.ceil(len(X) / self.partition_size)
+            else:
+                npartitions = 100
+        partitions = balanced_partitions(X, npartitions, cost=self.cost)
+        if not partitions:
+            return dask.bag.from_sequence(X, npartitions=1)
+        # one dask partition per list of items, like dask.bag.from_sequence
+        name = "balanced-from_sequence-" + dask.base.tokenize(partitions)
+        graph = {(name, i): p for i, p in enumerate(partitions)}
+        return dask.bag.Bag(graph, name, len(partitions))
+
+
+def balance_dask_pipeline(pipeline, cost=video_cost):
+    """Makes a pipeline wrapped with dask split its input in partitions of
+    (almost) equal cost instead of equal size.
+
+    Parameters
+    ----------
+    pipeline : :any:`sklearn.pipeline.Pipeline` or :any:`bob.bio.base.pipelines.PipelineSimple`
+        A pipeline wrapped with ``bob.pipelines.wrap(["dask"], ...)`` (or
+        :any:`bob.bio.base.pipelines.dask_bio_pipeline`). It is modified in
+        place.
+    cost : callable
+        Returns the cost of an item, by default :any:`video_cost`.
+
+    Returns
+    -------
+    object
+        The pipeline.
+
+    Raises
+    ------
+    ValueError
+        If the pipeline does not start with ``bob.pipelines.ToDaskBag``.
+    """
+    transformer = getattr(pipeline, "transformer", pipeline)
+    steps = getattr(transformer, "steps", None)
+    if not steps or not isinstance(steps[0][1], ToDaskBag):
+        raise ValueError(
+            f"{pipeline} is not a pipeline wrapped with dask, it does not start "
+            "with ToDaskBag."
+        )
+    name, to_bag = steps[0]
+    steps[0] = (
+        name,
+        BalancedToDaskBag(
+            npartitions=to_bag.npartitions,
+            partition_size=to_bag.partition_size,
+            cost=cost,
+        ),
+    )
+    return pipeline
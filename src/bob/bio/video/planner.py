@@ -0,0 +1,142 @@
+import itertools
+import logging
+
+from bob.pipelines import Sample, SampleSet
+
+logger = logging.getLogger(__name__)
+
+
+class MultiProtocolPlan:
+    """Runs several protocols of databases while transforming each video once.
+
+    Protocols of the same database often share their videos (the ten folds of
+    :any:`bob.bio.video.database.YoutubeDatabase` for example). This plan
+    collects the union of the samples of all protocols and groups (samples are
+    identified by their ``key``), sends each unique sample through the
+    transformer of a pipeline (e.g. a pipeline wrapped with
+    :any:`bob.bio.video.video_wrap_skpipeline`) once, and then creates the
+    templates and scores of each protocol from these shared features.
+
+    The transformer is not trained per protocol: it must either be stateless
+    or be trained beforehand (see :any:`MultiProtocolPlan.run`).
+
+    Parameters
+    ----------
+    databases : dict
+        Maps the name of each protocol to its database (an instance of
+        ``bob.bio.base.pipelines.Database``).
+    groups : tuple
+        The groups to run for each protocol.
+    """
+
+    def __init__(self, databases, groups=("dev",), **kwargs):
+        super().__init__(**kwargs)
+        self.databases = databases
+        self.groups = tuple(groups)
+        self.sample_sets = {}
+        self.unique_samples = {}
+        self.n_samples = 0
+        for name, database in databases.items():
+            for group in self.groups:
+                references = database.references(group=group)
+                probes = database.probes(group=group)
+                self.sample_sets[(name, group)] = (references, probes)
+                for sample_set in itertools.chain(references, probes):
+                    for sample in sample_set.samples:
+                        self.unique_samples.setdefault(sample.key, sample)
+                        self.n_samples += 1
+        logger.info(
+            "%d protocols and groups use %d unique samples out of %d",
+            len(self.sample_sets),
+            len(self.unique_samples),
+            self.n_samples,
+        )
+
+    @classmethod
+    def from_protocols(cls, database_class, protocols, groups=("dev",), **kw):
+        """Creates a plan for several protocols of one database.
+
+        Parameters
+        ----------
+        database_class : type
+            The class of the database, e.g.
+            :any:`bob.bio.video.database.YoutubeDatabase`.
+        protocols : list
+            The names of the protocols.
+        groups : tuple
+            The groups to run for each protocol.
+        **kw
+            Other arguments given to ``database_class``.
+        """
+        databases = {p: database_class(protocol=p, **kw) for p in protocols}
+        return cls(databases, groups=groups)
+
+    def __repr__(self):
+        return (
+            f"MultiProtocolPlan: {list(self.databases)} {self.groups}, "
+            f"{len(self.unique_samples)} unique samples out of "
+            f"{self.n_samples}"
+        )
+
+    def transform(self, transformer):
+        """Transforms the unique samples.
+
+        Returns
+        -------
+        dict
+            Maps the key of each unique sample to its transformed sample.
+        """
+        samples = list(self.unique_samples.values())
+        features = transformer.transform(samples)
+        return {s.key: f for s, f in zip(samples, features)}
+
+    @staticmethod
+    def _fan_out(sample_sets, features):
+        """Replaces the samples of each sample set by their features."""
+        return [
+            SampleSet(
+                [Sample(features[s.key].data, parent=s) for s in sset.samples],
+                parent=sset,
+            )
+            for sset in sample_sets
+        ]
+
+    def run(
+        self, pipeline, score_all_vs_all=True, background_model_samples=None
+    ):
+        """Runs all protocols and groups with a pipeline.
+
+        Parameters
+        ----------
+        pipeline : ``bob.bio.base.pipelines.PipelineSimple``
+            The pipeline (its ``transformer`` and ``biometric_algorithm``).
+        score_all_vs_all : bool
+            Whether all probes are scored against all references.
+        background_model_samples : list, optional
+            If given, the transformer is trained once on these samples before
+            transforming.
+
+        Returns
+        -------
+        dict
+            Maps each ``(protocol, group)`` pair to its scores (the output of
+            ``BioAlgorithm.score_sample_templates``).
+        """
+        if background_model_samples:
+            pipeline.train_background_model(background_model_samples)
+        features = self.transform(pipeline.transformer)
+
+        algorithm = pipeline.biometric_algorithm
+        scores = {}
+        for (name, group), (references, probes) in self.sample_sets.items():
+            logger.info("Scoring protocol %s (%s)", name, group)
+            enroll_templates = algorithm.create_templates_from_samplesets(
+                self._fan_out(references, features), enroll=True
+            )
+            probe_templates = algorithm.create_templates_from_samplesets(
+                self._fan_out(probes, features), enroll=False
+            )
+            scores[(name, group)] = algorithm.score_sample_templates(
+                probe_templates, enroll_templates, score_all_vs_all
+            )
+        return scores
@@ -0,0 +1,221 @@
+"""Measures the throughput of a video pipeline on a synthetic database.
+"""
+import json
+import logging
+import sys
+import tempfile
+
+import click
+
+from clapper.click import (
+    ConfigCommand,
+    ResourceOption,
+    log_parameters,
+    verbosity_option,
+)
+
+from ..loadtest import (
+    DURATION_DISTRIBUTIONS,
+    run_load_test,
+    stub_pipeline,
+    synthetic_database,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@click.command(
+    entry_point_group="bob.bio.config",
+    cls=ConfigCommand,
+    epilog="""\b
+Examples:
+
+  $ bob bio video load-test -vv -n 50 -w 1 -w 2 -w 4 -w 8 -o report.json
+  $ bob bio video load-test -vv -p iresnet100 --size 640 480 -o report.json
+""",
+)
+@click.option(
+    "--pipeline",
+    "-p",
+    cls=ResourceOption,
+    entry_point_group="bob.bio.pipeline",
+    help="The pipeline to run (its transformer is run on the videos). By "
+    "default, a pipeline of stub estimators is used.",
+)
+@click.option(
+    "--n-videos",
+    "-n",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+    cls=ResourceOption,
+    help="The number of videos of the synthetic database.",
+)
+@click.option(
+    "--min-duration",
+    type=click.FLOAT,
+    default=2.0,
+    show_default=True,
+    cls=ResourceOption,
+    help="The duration of the shortest videos, in seconds.",
+)
+@click.option(
+    "--max-duration",
+    type=click.FLOAT,
+    default=10.0,
+    show_default=True,
+    cls=ResourceOption,
+    help="The duration of the longest videos, in seconds.",
+)
+@click.option(
+    "--distribution",
+    type=click.Choice(DURATION_DISTRIBUTIONS),
+    default="uniform",
+    show_default=True,
+    cls=ResourceOption,
+    help="The distribution of the durations of the videos.",
+)
+@click.option(
+    "--size",
+    type=click.INT,
+    nargs=2,
+    default=(320, 240),
+    show_default=True,
+    cls=ResourceOption,
+    help="The width and height of the videos.",
+)
+@click.option(
+    "--fps",
+    type=click.FLOAT,
+    default=25,
+    show_default=True,
+    cls=ResourceOption,
+    help="The frame rate of the videos.",
+)
+@click.option(
+    "--gop-size",
+    type=click.INT,
+    default=12,
+    show_default=True,
+    cls=ResourceOption,
+    help="The number of frames between two keyframes of the videos.",
+)
+@click.option(
+    "--max-number-of-frames",
+    type=click.INT,
+    default=None,
+    cls=ResourceOption,
+    help="The maximum number of frames selected in each video. [Default: all "
+    "frames]",
+)
+@click.option(
+    "--seconds-per-frame",
+    type=click.FLOAT,
+    default=0.0,
+    show_default=True,
+    cls=ResourceOption,
+    help="The extra time spent by the stub extractor on each frame.",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.INT,
+    multiple=True,
+    default=(1, 2, 4),
+    show_default=True,
+    cls=ResourceOption,
+    help="The number of worker processes. Can be given several times.",
+)
+@click.option(
+    "--database-dir",
+    "-d",
+    default=None,
+    cls=ResourceOption,
+    help="The directory of the synthetic database. Existing videos are reused. "
+    "[Default: a temporary directory]",
+)
+@click.option(
+    "--output",
+    "-o",
+    default="-",
+    show_default=True,
+    cls=ResourceOption,
+    help="The json file of the report (- for the standard output).",
+)
+@click.option(
+    "--seed",
+    type=click.INT,
+    default=0,
+    show_default=True,
+    cls=ResourceOption,
+    help="The seed of the synthetic database.",
+)
+@verbosity_option(logger=logger, expose_value=False)
+def load_test(
+    pipeline,
+    n_videos,
+    min_duration,
+    max_duration,
+    distribution,
+    size,
+    fps,
+    gop_size,
+    max_number_of_frames,
+    seconds_per_frame,
+    workers,
+    database_dir,
+    output,
+    seed,
+    **kwargs,
+):
+    """Measures the throughput of a video pipeline.
+
+    Builds a database of synthetic videos, runs the pipeline on it with each
+    number of workers and writes a json report with the frames and videos
+    processed per second, the latency percentiles of each stage of the pipeline
+    and the scaling efficiency of each number of workers.
+    """
+    log_parameters(logger)
+
+    if pipeline is None:
+        pipeline = stub_pipeline(seconds_per_frame=seconds_per_frame)
+    video_options = {"selection_style": "all"}
+    if max_number_of_frames is not None:
+        video_options = {
+            "selection_style": "spread",
+            "max_number_of_frames": max_number_of_frames,
+        }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = synthetic_database(
+            database_dir or tmp,
+            n_videos=n_videos,
+            min_duration=min_duration,
+            max_duration=max_duration,
+            distribution=distribution,
+            fps=fps,
+            size=tuple(size),
+            gop_size=gop_size,
+            seed=seed,
+        )
+        report = run_load_test(
+            paths, pipeline, workers=workers, video_options=video_options
+        )
+
+    report["database"] = {
+        "n_videos": n_videos,
+        "min_duration": min_duration,
+        "max_duration": max_duration,
+        "distribution": distribution,
+        "size": list(size),
+        "fps": fps,
+        "gop_size": gop_size,
+        "seed": seed,
+    }
+    if output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote the report to {output}.")
@@ -0,0 +1,93 @@
+"""Indexes the metadata of the videos of a database.
+"""
+import logging
+import os
+
+import click
+
+from clapper.click import (
+    ConfigCommand,
+    ResourceOption,
+    log_parameters,
+    verbosity_option,
+)
+
+from ..database import video_files
+from ..metadata import MetadataIndex
+
+logger = logging.getLogger(__name__)
+
+
+@click.command(
+    entry_point_group="bob.bio.config",
+    cls=ConfigCommand,
+    epilog="""\b
+Examples:
+
+  $ bob bio video index -vv -d my_database.py -o /scratch/index.json -j 8
+  $ bob config set bob.bio.video.metadata_index /scratch/index.json
+""",
+)
+@click.option(
+    "--database",
+    "-d",
+    required=True,
+    cls=ResourceOption,
+    entry_point_group="bob.bio.database",
+    help="Biometric Database whose videos are indexed.",
+)
+@click.option(
+    "--groups",
+    "-g",
+    multiple=True,
+    cls=ResourceOption,
+    help="Biometric Database group that will be indexed. Can be added "
+    "multiple times for different groups. [Default: All groups]",
+)
+@click.option(
+    "--output",
+    "-o",
+    required=True,
+    cls=ResourceOption,
+    help="The json file of the index. If it exists, only the videos that are "
+    "not in the index or changed since they were indexed are scanned.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.INT,
+    default=1,
+    show_default=True,
+    cls=ResourceOption,
+    help="The number of videos scanned in parallel.",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    cls=ResourceOption,
+    help="Scans all videos again.",
+)
+@verbosity_option(logger=logger, expose_value=False)
+def index(database, groups, output, jobs, force, **kwargs):
+    """Indexes the frame counts, frame sizes, frame rates and keyframes of the
+    videos of a database.
+
+    The index is used instead of probing the videos when the
+    ``bob.bio.video.metadata_index`` configuration points to ``output`` (see
+    :any:`bob.bio.video.metadata.use_metadata_index`). Several databases can
+    share one index. Databases which store the frames of videos as images (e.g.
+    YouTube Faces) are not supported (see
+    :any:`bob.bio.video.database.video_files`).
+    """
+    log_parameters(logger)
+
+    paths = video_files(database, list(groups) or None)
+    metadata = MetadataIndex()
+    if os.path.exists(output):
+        metadata = MetadataIndex.load(output)
+    scanned = metadata.update(paths, jobs=max(1, jobs), force=force)
+    metadata.save(output)
+    logger.info(
+        f"Scanned {len(scanned)} of {len(paths)} videos, {output} indexes "
+        f"{len(metadata)} videos."
+    )
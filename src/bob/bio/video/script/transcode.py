@@ -0,0 +1,106 @@
+"""Transcodes the videos of a database into formats that are cheap to seek.
+"""
+import logging
+
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+from clapper.click import (
+    ConfigCommand,
+    ResourceOption,
+    log_parameters,
+    verbosity_option,
+)
+
+from ..database import video_files
+from ..transcode import TRANSCODE_FORMATS, transcode_video
+
+logger = logging.getLogger(__name__)
+
+
+@click.command(
+    entry_point_group="bob.bio.config",
+    cls=ConfigCommand,
+    epilog="""\b
+Examples:
+
+  $ bob bio video transcode -vv -d my_database.py -o /scratch/transcoded -j 8
+  $ bob config set bob.bio.video.transcoded_directory /scratch/transcoded
+""",
+)
+@click.option(
+    "--database",
+    "-d",
+    required=True,
+    cls=ResourceOption,
+    entry_point_group="bob.bio.database",
+    help="Biometric Database whose videos are transcoded.",
+)
+@click.option(
+    "--groups",
+    "-g",
+    multiple=True,
+    cls=ResourceOption,
+    help="Biometric Database group that will be transcoded. Can be added "
+    "multiple times for different groups. [Default: All groups]",
+)
+@click.option(
+    "--output-dir",
+    "-o",
+    required=True,
+    cls=ResourceOption,
+    help="The directory of the transcoded videos. Set the "
+    "bob.bio.video.transcoded_directory configuration to this directory to use "
+    "the transcoded videos.",
+)
+@click.option(
+    "--format",
+    "-f",
+    "format_",
+    type=click.Choice(sorted(TRANSCODE_FORMATS)),
+    default="intra",
+    show_default=True,
+    cls=ResourceOption,
+    help="intra: lossless videos with only keyframes, hdf5: decoded frames "
+    "stored in hdf5 files (faster to read but larger).",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.INT,
+    default=1,
+    show_default=True,
+    cls=ResourceOption,
+    help="The number of videos transcoded in parallel.",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    cls=ResourceOption,
+    help="Transcodes the videos even if they have up-to-date copies.",
+)
+@verbosity_option(logger=logger, expose_value=False)
+def transcode(database, groups, output_dir, format_, jobs, force, **kwargs):
+    """Transcodes the videos of a database.
+
+    Reading frames in the middle of videos with sparse keyframes decodes many
+    frames that are thrown away. The transcoded copies are read instead of the
+    original videos by :any:`bob.bio.video.VideoAsArray` when the
+    ``bob.bio.video.transcoded_directory`` configuration points to
+    ``output_dir``. Databases which store the frames of videos as images (e.g.
+    YouTube Faces) are not supported (see
+    :any:`bob.bio.video.database.video_files`).
+    """
+    log_parameters(logger)
+
+    paths = video_files(database, list(groups) or None)
+    logger.info(f"Transcoding {len(paths)} videos into {output_dir}.")
+    with ProcessPoolExecutor(max(1, jobs)) as executor:
+        futures = [
+            executor.submit(transcode_video, path, output_dir, format_, force)
+            for path in paths
+        ]
+        for path, future in zip(paths, futures):
+            logger.debug(f"{path} -> {future.result()}")
+    logger.info("All videos transcoded.")
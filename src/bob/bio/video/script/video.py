@@ -0,0 +1,15 @@
+"""The main entry for bob.bio.video (click-based) scripts.
+"""
+import importlib.metadata
+
+import click
+
+from clapper.click import AliasedGroup
+from click_plugins import with_plugins
+
+
+@with_plugins(importlib.metadata.entry_points(group="bob.bio.video.cli"))
+@click.group(cls=AliasedGroup)
+def video():
+    """Video specific commands."""
+    pass
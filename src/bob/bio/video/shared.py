@@ -0,0 +1,327 @@
+"""Moves decoded videos between local processes through shared memory."""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from .utils import DenseVideoLikeContainer, VideoAsArray, VideoLikeContainer
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# the reference counts of the segments, shared by all local processes
+REFS_DIRECTORY = os.path.join(tempfile.gettempdir(), "bob.bio.video.shm")
+_refs_lock = threading.Lock()
+
+# the time (in seconds) a pickled shared array keeps its segment alive for the
+# process that unpickles it
+LEASE_SECONDS = 600.0
+
+# segments whose leases expired are looked for at most this often
+_SWEEP_INTERVAL = 60.0
+_last_sweep = [0.0]
+
+
+@contextlib.contextmanager
+def _locked_refs(name):
+    """Yields the references of a segment: a dictionary with the ``count`` of
+    shared arrays and the expiry ``leases`` of the pickled copies. The
+    references are kept in a file which is locked while they are updated."""
+    os.makedirs(REFS_DIRECTORY, exist_ok=True)
+    path = os.path.join(REFS_DIRECTORY, name)
+    with _refs_lock, open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        text = f.read()
+        refs = json.loads(text) if text else 0
+        if isinstance(refs, int):
+            # a count written by a previous version
+            refs = {"count": refs, "leases": {}}
+        yield refs
+        now = time.time()
+        refs["leases"] = {k: t for k, t in refs["leases"].items() if t > now}
+        f.seek(0)
+        f.truncate()
+        json.dump(refs, f)
+        f.flush()
+        if _unused(refs):
+            os.remove(path)
+
+
+def _unused(refs):
+    return refs["count"] <= 0 and not refs["leases"]
+
+
+def _update_refs(name, delta=0, lease=None, claim=None):
+    """Adds ``delta`` to the reference count of a segment, adds the ``lease``
+    of a pickled copy or turns the lease ``claim`` into a reference. Returns
+    the references."""
+    with _locked_refs(name) as refs:
+        refs["count"] += delta
+        if lease is not None:
+            refs["leases"][lease] = time.time() + LEASE_SECONDS
+        if claim is not None:
+            refs["leases"].pop(claim, None)
+    return refs
+
+
+# the reference counts decide when segments are unlinked, not the resource
+# trackers of the processes which created or opened them (which would unlink
+# the segments that a process sent to others when it exits)
+_TRACKED = sys.version_info < (3, 13) and shared_memory._USE_POSIX
+
+
+def _segment(**kwargs):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(track=False, **kwargs)
+    segment = shared_memory.SharedMemory(**kwargs)
+    if _TRACKED:
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def _open_segment(name):
+    return _segment(name=name)
+
+
+def _unlink(name, segment=None):
+    try:
+        segment = segment or _open_segment(name)
+        if _TRACKED:
+            # SharedMemory.unlink would unregister it from the resource tracker
+            shared_memory._posixshmem.shm_unlink(segment._name)
+        else:
+            segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _sweep():
+    """Unlinks the segments which are only kept alive by expired leases, i.e.
+    by pickled copies that were never unpickled."""
+    now = time.time()
+    if now - _last_sweep[0] < _SWEEP_INTERVAL:
+        return
+    _last_sweep[0] = now
+    try:
+        names = os.listdir(REFS_DIRECTORY)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if _unused(_update_refs(name)):
+            logger.debug("Unlinking %s whose pickled copies expired", name)
+            _unlink(name)
+
+
+def _release(segment):
+    """Drops one reference to a segment and unlinks it with the last one."""
+    try:
+        segment.close()
+    except BufferError:
+        # arrays of the segment are still alive: leave the mapping to them, it
+        # is unmapped when they are garbage collected
+        segment._buf = segment._mmap = None
+        segment.close()
+    if _unused(_update_refs(segment.name, -1)):
+        _unlink(segment.name, segment)
+
+
+def _attach(name, shape, dtype, lease):
+    # the unpickled copy takes over the reference of the lease of its pickle
+    segment = _open_segment(name)
+    _update_refs(name, 1, claim=lease)
+    return SharedArray(segment, shape, dtype)
+
+
+class SharedArray:
+    """A numpy array in a shared memory segment.
+
+    Pickling a shared array only pickles the name, shape and dtype of its
+    segment and unpickling it in another process maps the same memory, so
+    sending it to a local worker process does not copy the data.
+
+    The segment is reference counted across processes: every shared array
+    (the one created and every unpickled copy) holds one reference which is
+    dropped by :any:`SharedArray.release` or when the shared array is garbage
+    collected. Every pickle holds a lease on the segment which is taken over
+    by the copy unpickled from it, so the sender can drop its shared array
+    right after sending it (e.g. a worker process returning a shared video).
+    The segment is unlinked when its last reference is dropped and no lease
+    is pending. Leases of pickles that are never unpickled expire after
+    ``LEASE_SECONDS`` (10 minutes). Hashing a shared array with ``dask.base.tokenize``
+    or ``joblib.hash`` does not pickle it and takes no lease.
+    Arrays returned by :any:`SharedArray.array` stay valid until they are
+    garbage collected.
+
+    Use :any:`SharedArray.empty` or :any:`SharedArray.from_array` to create
+    shared arrays.
+    """
+
+    def __init__(self, segment, shape, dtype, **kwargs):
+        super().__init__(**kwargs)
+        self.name = segment.name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._segment = segment
+        self._finalizer = weakref.finalize(self, _release, segment)
+
+    @classmethod
+    def empty(cls, shape, dtype=np.uint8):
+        """Creates an uninitialized shared array."""
+        shape = tuple(shape)
+        size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        _sweep()
+        segment = _segment(create=True, size=size)
+        _update_refs(segment.name, 1)
+        return cls(segment, shape, dtype)
+
+    @classmethod
+    def from_array(cls, array):
+        """Copies an array into a new shared array."""
+        array = np.asarray(array)
+        self = cls.empty(array.shape, array.dtype)
+        self.array[...] = array
+        return self
+
+    @property
+    def array(self):
+        """The shared data as a numpy array (without a copy)."""
+        if not self._finalizer.alive:
+            raise ValueError(f"The shared array {self.name} was released")
+        # frombuffer holds the buffer so the segment cannot be unmapped while
+        # the array is alive
+        count = int(np.prod(self.shape))
+        data = np.frombuffer(self._segment.buf, self.dtype, count=count)
+        return data.reshape(self.shape)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        return self.array[item]
+
+    def __array__(self, dtype=None, *args, **kwargs):
+        return np.asarray(self.array, dtype, *args, **kwargs)
+
+    def __repr__(self):
+        return f"SharedArray: {self.name!r} {self.dtype!r} {self.shape!r}"
+
+    def __reduce__(self):
+        # the lease keeps the segment alive until the copy is unpickled
+        lease = uuid.uuid4().hex
+        _update_refs(self.name, lease=lease)
+        return _attach, (self.name, self.shape, self.dtype.str, lease)
+
+    def __dask_tokenize__(self):
+        # the segment identifies the data, do not hash the data itself
+        return (type(self).__name__, self.name, self.shape, self.dtype.str)
+
+    def release(self):
+        """Drops the reference of this shared array (only once)."""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _hash_shared_array(hasher, obj):
+    # hashes the segment without pickling (and leasing) it
+    hasher.save(obj.__dask_tokenize__())
+
+
+try:
+    from joblib.hashing import Hasher
+
+    Hasher.dispatch[SharedArray] = _hash_shared_array
+except ImportError:  # pragma: no cover
+    pass
+
+
+def share_video(video):
+    """Moves the frames of a video into shared memory.
+
+    Parameters
+    ----------
+    video : :any:`bob.bio.video.VideoAsArray` or :any:`bob.bio.video.VideoLikeContainer`
+        The video. :any:`bob.bio.video.VideoAsArray` videos are decoded
+        straight into shared memory.
+
+    Returns
+    -------
+    :any:`bob.bio.video.VideoLikeContainer`
+        A container (a :any:`bob.bio.video.DenseVideoLikeContainer` if some
+        frames are ``None``) whose ``data`` is a :any:`SharedArray`. Videos
+        whose data are not arrays are returned unchanged.
+    """
+    if isinstance(getattr(video, "data", None), SharedArray):
+        return video
+    if isinstance(video, VideoAsArray):
+        data = SharedArray.empty(video.shape, video.dtype)
+        video.read_into(data.array)
+        return VideoLikeContainer(data, video.indices, layout=video.layout)
+
+    layout = getattr(video, "layout", None)
+    if getattr(video, "mask", None) is None:
+        data = video.data
+        if not isinstance(data, np.ndarray) or data.dtype == object:
+            try:
+                video = DenseVideoLikeContainer.from_container(video)
+            except (TypeError, ValueError):
+                logger.debug("Cannot share %s, it is not an array", video)
+                return video
+    if isinstance(video, DenseVideoLikeContainer):
+        return DenseVideoLikeContainer(
+            SharedArray.from_array(video.data),
+            video.indices,
+            video.mask,
+            layout=layout,
+        )
+    return VideoLikeContainer(
+        SharedArray.from_array(video.data), video.indices, layout=layout
+    )
+
+
+class ShareFrames(TransformerMixin, BaseEstimator):
+    """Moves the frames of videos into shared memory (see
+    :any:`share_video`) so that the next steps of a pipeline can run in other
+    local processes without copying the frames.
+    """
+
+    def transform(self, videos):
+        return [share_video(video) for video in videos]
+
+    def _more_tags(self):
+        return {"requires_fit": False, "stateless": True}
+
+    def fit(self, X, y=None, **fit_params):
+        """Does nothing"""
+        return self
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import VideoAsArray, VideoLikeContainer
+
+logger = logging.getLogger(__name__)
+
+# marks the end of the items of a queue
+_DONE = object()
+
+
+def decode_video(video):
+    """Loads a video (e.g. a :any:`bob.bio.video.database.VideoBioFile`) and
+    decodes all of its frames into a :any:`bob.bio.video.VideoLikeContainer`.
+    """
+    if hasattr(video, "load"):
+        video = video.load()
+    if isinstance(video, VideoAsArray):
+        frames = video[(slice(None),) * video.ndim]
+        return VideoLikeContainer(frames, video.indices, layout=video.layout)
+    return video
+
+
+class StagedRunner:
+    """Runs the decoding, annotation and feature extraction of videos
+    concurrently.
+
+    Each stage has its own pool of ``*_workers`` threads and the stages are
+    connected by queues of at most ``queue_size`` videos, so that decoding
+    (ffmpeg subprocesses and I/O), annotation and extraction of different
+    videos overlap while a slow stage makes the previous stages wait instead of
+    piling up decoded videos in memory. An asyncio event loop moves the videos
+    between the stages.
+
+    Parameters
+    ----------
+    extractor : object
+        Transforms a list of videos (given the ``annotations`` keyword argument
+        if ``annotator`` is given), e.g. a
+        :any:`bob.bio.video.transformer.VideoWrapper`.
+    annotator : :any:`bob.bio.video.annotator.Base`, optional
+        Annotates the decoded videos.
+    decode : callable
+        Loads and decodes one input, by default :any:`decode_video`.
+    decode_workers, annotate_workers, extract_workers : int
+        The number of videos processed at the same time by each stage.
+    queue_size : int
+        The maximum number of videos waiting between two stages.
+    """
+
+    def __init__(
+        self,
+        extractor,
+        annotator=None,
+        decode=decode_video,
+        decode_workers=2,
+        annotate_workers=1,
+        extract_workers=1,
+        queue_size=4,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.extractor = extractor
+        self.annotator = annotator
+        self.decode = decode
+        self.decode_workers = decode_workers
+        self.annotate_workers = annotate_workers
+        self.extract_workers = extract_workers
+        self.queue_size = queue_size
+        self.stats = {}
+
+    def _annotate(self, video):
+        return video, self.annotator.transform([video])[0]
+
+    def _extract(self, item):
+        if self.annotator is None:
+            return self.extractor.transform([item])[0]
+        video, annotations = item
+        return self.extractor.transform([video], annotations=[annotations])[0]
+
+    def _stages(self):
+        stages = [("decode", self.decode, self.decode_workers)]
+        if self.annotator is not None:
+            stages.append(("annotate", self._annotate, self.annotate_workers))
+        stages.append(("extract", self._extract, self.extract_workers))
+        return stages
+
+    async def _stage(self, name, function, workers, inputs, outputs):
+        """Runs ``function`` on the items of ``inputs`` with ``workers``
+        threads and puts the results in ``outputs``."""
+        loop = asyncio.get_running_loop()
+        stats = self.stats[name] = {"items": 0, "busy_seconds": 0.0}
+
+        async def worker(executor):
+            while True:
+                item = await inputs.get()
+                if item is _DONE:
+                    return
+                position, value = item
+                start = time.perf_counter()
+                value = await loop.run_in_executor(executor, function, value)
+                stats["busy_seconds"] += time.perf_counter() - start
+                stats["items"] += 1
+                await outputs.put((position, value))
+
+        with ThreadPoolExecutor(workers, thread_name_prefix=name) as executor:
+            await asyncio.gather(*(worker(executor) for _ in range(workers)))
+
+    async def arun(self, videos):
+        """Processes the videos and returns their features in the same order.
+
+        This is the coroutine version of :any:`StagedRunner.run`.
+        """
+        stages = self._stages()
+        queues = [asyncio.Queue(self.queue_size) for _ in stages]
+        results = asyncio.Queue()
+        outputs = queues[1:] + [results]
+        self.stats = {}
+
+        async def feed():
+            for item in enumerate(videos):
+                await queues[0].put(item)
+            for _ in range(stages[0][2]):
+                await queues[0].put(_DONE)
+
+        async def run_stage(i):
+            name, function, workers = stages[i]
+            await self._stage(name, function, workers, queues[i], outputs[i])
+            # tell the workers of the next stage that there is nothing more
+            if i + 1 < len(stages):
+                for _ in range(stages[i + 1][2]):
+                    await outputs[i].put(_DONE)
+
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(feed())]
+        tasks += [
+            asyncio.ensure_future(run_stage(i)) for i in range(len(stages))
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        features = [None] * results.qsize()
+        while not results.empty():
+            position, value = results.get_nowait()
+            features[position] = value
+        elapsed = time.perf_counter() - start
+        self.stats["elapsed_seconds"] = elapsed
+        logger.info(
+            "Processed %d videos in %.2fs: %s",
+            len(features),
+            elapsed,
+            self.stats,
+        )
+        return features
+
+    def run(self, videos):
+        """Processes the videos and returns their features in the same order.
+
+        Parameters
+        ----------
+        videos : list
+            The videos (or objects with a ``load`` method returning a video,
+            e.g. :any:`bob.bio.video.database.VideoBioFile`).
+
+        Returns
+        -------
+        list
+            The output of ``extractor`` for each video.
+        """
+        return asyncio.run(self.arun(videos))
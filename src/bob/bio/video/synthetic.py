@@ -0,0 +1,110 @@
+"""Generates synthetic videos for tests and benchmarks."""
+
+import logging
+import os
+
+import imageio
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def synthetic_frames(n_frames=50, size=(320, 240), seed=0):
+    """Yields the frames of a synthetic video.
+
+    Each frame is a smooth color gradient with a bright square moving across it
+    and some noise, so that consecutive frames differ and compress like camera
+    footage rather than like a still image.
+
+    Parameters
+    ----------
+    n_frames : int
+        The number of frames.
+    size : tuple
+        The (width, height) of the frames.
+    seed : int
+        The seed of the noise, the same seed yields the same frames.
+
+    Yields
+    ------
+    numpy.ndarray
+        The (height, width, 3) uint8 frames.
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    side = max(2, min(width, height) // 4)
+    for i in range(n_frames):
+        frame = np.empty((height, width, 3), dtype=np.float32)
+        frame[..., 0] = (x + 3 * i) % 256
+        frame[..., 1] = y
+        frame[..., 2] = (x + y) / 2
+        left = (i * 7) % max(1, width - side)
+        top = (i * 5) % max(1, height - side)
+        frame[top : top + side, left : left + side] = 255
+        frame += rng.normal(0, 4, frame.shape).astype(np.float32)
+        yield np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def write_synthetic_video(
+    path,
+    n_frames=50,
+    size=(320, 240),
+    fps=25,
+    gop_size=12,
+    codec="libx264",
+    seed=0,
+):
+    """Writes a synthetic video (see :any:`synthetic_frames`).
+
+    Parameters
+    ----------
+    path : str
+        The path of the video, its extension selects the container format.
+    n_frames : int
+        The number of frames.
+    size : tuple
+        The (width, height) of the frames. Must be even for ``libx264``.
+    fps : float
+        The frame rate.
+    gop_size : int
+        The number of frames between two keyframes. Seeking to a frame decodes
+        up to ``gop_size`` frames.
+    codec : str
+        The ffmpeg video encoder.
+    seed : int
+        The seed of the noise of the frames.
+
+    Returns
+    -------
+    str
+        ``path``
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    output_params = [
+        "-g",
+        str(gop_size),
+        "-keyint_min",
+        str(gop_size),
+        # no keyframes on scene changes so that the GOPs have a fixed size
+        "-sc_threshold",
+        "0",
+    ]
+    writer = imageio.get_writer(
+        path,
+        format="FFMPEG",
+        mode="I",
+        fps=fps,
+        codec=codec,
+        macro_block_size=1,
+        output_params=output_params,
+    )
+    try:
+        for frame in synthetic_frames(n_frames, size, seed):
+            writer.append_data(frame)
+    finally:
+        writer.close()
+    logger.debug("Wrote the synthetic video %s", path)
+    return path
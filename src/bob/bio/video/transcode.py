@@ -0,0 +1,202 @@
+import logging
+import os
+import subprocess
+
+import h5py
+import imageio
+import imageio_ffmpeg
+
+from clapper.rc import UserDefaults
+
+logger = logging.getLogger(__name__)
+rc = UserDefaults("bobrc.toml")
+
+#: The formats of transcoded videos and the extension of their files.
+TRANSCODE_FORMATS = {"intra": ".mkv", "hdf5": ".hdf5"}
+
+
+def is_frame_store(path):
+    """Whether ``path`` is an hdf5 frame store (see :any:`transcode_video`)."""
+    return str(path).endswith(TRANSCODE_FORMATS["hdf5"])
+
+
+class HDF5FrameReader:
+    """Reads the frames of an hdf5 frame store like an ``imageio`` reader.
+
+    Every frame is stored in its own (compressed) chunk of the ``frames``
+    dataset, so any frame is read without decoding the others.
+    """
+
+    def __init__(self, path, **kwargs):
+        if kwargs:
+            raise ValueError(
+                f"Frame stores do not support the reader options: {kwargs}"
+            )
+        super().__init__()
+        self.path = path
+        self._file = h5py.File(path, mode="r")
+        self._frames = self._file["frames"]
+
+    def count_frames(self):
+        return len(self._frames)
+
+    def get_meta_data(self):
+        height, width = self._frames.shape[1:3]
+        return {"size": (width, height), "fps": float(self._file.attrs["fps"])}
+
+    def get_data(self, index):
+        return self._frames[index]
+
+    def __iter__(self):
+        for index in range(len(self._frames)):
+            yield self.get_data(index)
+
+    def close(self):
+        self._file.close()
+
+
+def get_reader(path, **kwargs):
+    """Opens a reader of a video file or of an hdf5 frame store."""
+    if is_frame_store(path):
+        return HDF5FrameReader(path, **kwargs)
+    return imageio.get_reader(path, **kwargs)
+
+
+def transcoded_path(path, directory, format="intra"):
+    """The path of the transcoded copy of a video.
+
+    The copies mirror the absolute paths of the original videos inside
+    ``directory`` so that videos of all databases can share one directory.
+    """
+    absolute = os.path.splitdrive(os.path.abspath(path))[1].lstrip(os.sep)
+    return os.path.join(directory, absolute + TRANSCODE_FORMATS[format])
+
+
+def find_transcoded(path, directory=None, formats=("hdf5", "intra")):
+    """Returns the path of an up-to-date transcoded copy of a video.
+
+    Parameters
+    ----------
+    path : str
+        Path to the original video.
+    directory : str, optional
+        The directory of the transcoded copies, by default the
+        ``bob.bio.video.transcoded_directory`` configuration
+        (``bob config set bob.bio.video.transcoded_directory PATH``). An empty
+        string disables transcoded copies.
+    formats : tuple
+        The accepted formats, in order of preference.
+
+    Returns
+    -------
+    str or None
+        The path of the copy or None if there is no copy or if the original
+        video is newer than the copy.
+    """
+    if directory is None:
+        directory = rc.get("bob.bio.video.transcoded_directory")
+    if not directory:
+        return None
+    for format in formats:
+        copy = transcoded_path(path, directory, format)
+        if not os.path.exists(copy):
+            continue
+        if os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(
+            copy
+        ):
+            logger.debug("Ignoring %s which is older than %s", copy, path)
+            continue
+        return copy
+    return None
+
+
+def _write_frame_store(path, output):
+    reader = imageio.get_reader(path)
+    try:
+        with h5py.File(output, mode="w") as f:
+            f.attrs["fps"] = reader.get_meta_data()["fps"]
+            f.attrs["source"] = os.path.abspath(path)
+            frames = None
+            # write the frames one by one, the video may not fit in memory
+            for i, frame in enumerate(reader):
+                if frames is None:
+                    frames = f.create_dataset(
+                        "frames",
+                        shape=(0,) + frame.shape,
+                        maxshape=(None,) + frame.shape,
+                        chunks=(1,) + frame.shape,
+                        dtype=frame.dtype,
+                        compression="lzf",
+                    )
+                frames.resize(i + 1, axis=0)
+                frames[i] = frame
+    finally:
+        reader.close()
+
+
+def _write_intra(path, output):
+    command = [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-i",
+        path,
+        "-an",
+        # lossless and every frame is a keyframe
+        "-c:v",
+        "ffv1",
+        "-g",
+        "1",
+        "-f",
+        "matroska",
+        output,
+    ]
+    subprocess.run(command, capture_output=True, check=True)
+
+
+def transcode_video(path, directory, format="intra", force=False):
+    """Transcodes a video into a format where any frame is cheap to read.
+
+    Parameters
+    ----------
+    path : str
+        Path to the video.
+    directory : str
+        The directory of the transcoded copies, see :any:`transcoded_path`.
+    format : str
+        ``intra`` re-encodes the video losslessly (FFV1) with only keyframes,
+        so that seeking to a frame decodes only that frame. ``hdf5`` stores the
+        decoded frames in an hdf5 file with one lzf-compressed chunk per frame.
+    force : bool
+        If False, up-to-date copies are not transcoded again.
+
+    Returns
+    -------
+    str
+        The path of the transcoded copy.
+    """
+    if format not in TRANSCODE_FORMATS:
+        raise ValueError(
+            f"Invalid format: {format}. Choose from {tuple(TRANSCODE_FORMATS)}"
+        )
+    output = transcoded_path(path, directory, format)
+    if not force and find_transcoded(path, directory, (format,)) is not None:
+        logger.debug("%s is up to date", output)
+        return output
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    # write to a temporary file so that readers never see partial copies
+    tmp = f"{output}.{os.getpid()}.tmp"
+    try:
+        if format == "hdf5":
+            _write_frame_store(path, tmp)
+        else:
+            _write_intra(path, tmp)
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    logger.info("Transcoded %s into %s", path, output)
+    return output
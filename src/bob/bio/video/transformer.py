@@ -1,32 +1,379 @@
+import collections
+import hashlib
 import logging
+import os
+import pickle
+import threading
+
+import joblib
+import numpy as np
 
 from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.utils import check_random_state
+
+from bob.bio.base import selected_indices
+from bob.pipelines.wrappers import (
+    _check_n_input_output,
+    _frmt,
+    estimator_requires_fit,
+)
 
-from bob.pipelines.wrappers import _check_n_input_output, _frmt
+from . import instrumentation, utils
 
-from . import utils
+try:
+    import xxhash
+except ImportError:  # pragma: no cover
+    xxhash = None
 
 logger = logging.getLogger(__name__)
 
 
+def _valid_frames(video, as_array):
+    """Returns the valid (not None) frames of a video and the boolean validity
+    mask of all frames. If ``as_array`` is True, the valid frames are stacked in
+    one contiguous array."""
+    data = getattr(video, "data", None)
+    mask = getattr(video, "mask", None)
+    if mask is not None:
+        # masked dense containers keep their failed frames zero-filled
+        frames = video.valid_data
+        return (frames if as_array else list(frames)), mask
+    if hasattr(data, "__array__") and getattr(data, "dtype", object) != object:
+        # dense containers have no failed frames and are used without a copy
+        data = np.asarray(data)
+        valid = np.ones(len(data), dtype=bool)
+        return (np.ascontiguousarray(data) if as_array else list(data)), valid
+    if as_array and isinstance(video, utils.VideoAsArray):
+        # decoded videos have no failed frames, decode them in one pass
+        valid = np.ones(len(video), dtype=bool)
+        return video[(slice(None),) * video.ndim], valid
+
+    frames = list(video)
+    valid = np.fromiter(
+        (frame is not None for frame in frames), dtype=bool, count=len(frames)
+    )
+    frames = [frame for frame, ok in zip(frames, valid) if ok]
+    if as_array and frames:
+        frames = np.stack(frames)
+    return frames, valid
+
+
+def _fit_frames(video, positions, batch_size):
+    """Yields the frames of a video at ``positions``. Videos that are decoded
+    on the fly are read in batches of ``batch_size`` frames."""
+    if isinstance(video, utils.VideoAsArray):
+        for start in range(0, len(positions), batch_size):
+            batch = positions[start : start + batch_size]
+            out = np.empty((len(batch),) + video.shape[1:], dtype=video.dtype)
+            yield from video.read_into(out, batch)
+    else:
+        for position in positions:
+            yield video[position]
+
+
+def _estimator_fingerprint(estimator, strict=False):
+    """A hash of the type, the parameters and the fitted attributes (whose name
+    ends with ``_``) of an estimator and of its nested estimators.
+
+    State that estimators set up by themselves (e.g. a model loaded on first
+    use) is not part of it. Estimators whose parameters cannot be hashed are
+    identified by their repr, unless ``strict`` is True in which case a
+    ValueError is raised.
+    """
+    params = {}
+    if hasattr(estimator, "get_params"):
+        params = estimator.get_params(deep=True)
+    fitted = {}
+    for prefix, obj in [("", estimator)] + [
+        (f"{name}__", value)
+        for name, value in params.items()
+        if isinstance(value, BaseEstimator)
+    ]:
+        for name, value in getattr(obj, "__dict__", {}).items():
+            if name.endswith("_") and not name.startswith("_"):
+                fitted[prefix + name] = value
+    # nested estimators are identified by their parameters and fitted
+    # attributes, which are listed separately
+    params = {
+        name: (
+            type(value).__qualname__
+            if isinstance(value, BaseEstimator)
+            else value
+        )
+        for name, value in params.items()
+    }
+    cls = type(estimator)
+    try:
+        return joblib.hash(
+            (f"{cls.__module__}.{cls.__qualname__}", params, fitted)
+        )
+    except Exception as e:
+        if strict:
+            raise ValueError(
+                f"Cannot compute a fingerprint of {_frmt(estimator)}: its "
+                "parameters cannot be hashed. Give a cache_key to the "
+                "VideoWrapper to store its outputs in a cache directory."
+            ) from e
+        return joblib.hash(f"{cls!r} {estimator!r}")
+
+
+class FrameCache:
+    """A cache of the outputs of frame estimators, keyed by frame content.
+
+    The key of a frame is a fast hash (xxh3 if the ``xxhash`` package is
+    installed, blake2b otherwise) of the frame buffer, the estimator fingerprint
+    and the per-frame arguments (e.g. annotations) so that identical frames are
+    only transformed once. The most recently used outputs are kept in memory
+    and, if ``directory`` is given, every output is also stored in that
+    directory so that it can be reused by other processes and later runs.
+
+    Parameters
+    ----------
+    max_items : int
+        The maximum number of outputs kept in memory.
+    directory : str, optional
+        A directory where outputs are stored as pickle files. It is never
+        pruned; remove it to clear the cache.
+    """
+
+    def __init__(self, max_items=10000, directory=None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_items = max_items
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return (
+            f"FrameCache: {len(self)} items, hits={self.hits}, "
+            f"misses={self.misses}, directory={self.directory!r}"
+        )
+
+    @property
+    def dedup_ratio(self):
+        """The fraction of the frames whose output was reused."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """Returns the number of hits, misses and the dedup ratio."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "dedup_ratio": self.dedup_ratio,
+        }
+
+    @staticmethod
+    def key(fingerprint, frame, arguments=()):
+        """Computes the cache key of a frame.
+
+        Parameters
+        ----------
+        fingerprint : str
+            The fingerprint of the estimator.
+        frame : numpy.ndarray
+            The frame.
+        arguments : iterable
+            The per-frame arguments given to the estimator with the frame.
+        """
+        h = xxhash.xxh3_128() if xxhash else hashlib.blake2b(digest_size=16)
+        frame = np.ascontiguousarray(frame)
+        h.update(f"{fingerprint} {frame.dtype.str} {frame.shape}".encode())
+        h.update(frame.data)
+        for argument in arguments:
+            if isinstance(argument, dict):
+                argument = sorted(argument.items())
+            h.update(repr(argument).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.pkl")
+
+    def get(self, key):
+        """Returns ``(True, output)`` if ``key`` is cached and
+        ``(False, None)`` otherwise."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return True, self._items[key]
+        if self.directory is None:
+            return False, None
+        try:
+            with open(self._path(key), "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+        self._remember(key, value)
+        return True, value
+
+    def put(self, key, value):
+        """Caches the output of a frame."""
+        self._remember(key, value)
+        if self.directory is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write atomically since other processes may read the same key
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f)
+            os.replace(tmp, path)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def record(self, hits, misses):
+        """Adds to the hit and miss counters."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def clear(self):
+        """Removes the outputs kept in memory and resets the counters."""
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+
+def _n_failed_frames(video):
+    """The number of frames of a video whose data is None."""
+    mask = getattr(video, "mask", None)
+    if mask is not None:
+        return int(len(mask) - np.count_nonzero(mask))
+    if getattr(video.data, "dtype", object) != object:
+        return 0
+    return sum(frame is None for frame in video.data)
+
+
 class VideoWrapper(TransformerMixin, BaseEstimator):
     """Wrapper class to run image preprocessing algorithms on video data.
 
+    The frames of each video are given to the estimator as a list, except when
+    the estimator declares the ``bob_video_ndarray_input`` tag: then the valid
+    frames are given as one stacked ``(N, ...)`` array.
+
+    Trainable estimators are fitted on the frames of the training videos, which
+    are streamed so that they are never all in memory at once: estimators with
+    a ``partial_fit`` method receive them in chunks of ``fit_chunk_size``
+    frames, other estimators are fitted on a uniform random sample of at most
+    ``fit_max_frames`` frames which take at most ``fit_max_bytes`` bytes.
+
     **Parameters:**
 
     estimator : str or ``sklearn.base.BaseEstimator`` instance
       The transformer to be used to preprocess the frames.
+
+    fit_frames_per_video : int or None
+      If given, only this many frames (spread over the video) of each training
+      video are used for fitting.
+
+    fit_chunk_size : int
+      The number of frames given to each ``partial_fit`` call.
+
+    fit_max_frames : int
+      The maximum number of frames given to ``fit`` for estimators without
+      ``partial_fit``.
+
+    fit_max_bytes : int or None
+      The maximum total size (in bytes) of the frames given to ``fit`` for
+      estimators without ``partial_fit``. The sampled frames are copied, so
+      this bounds the memory used by the sample: the default (1 GiB) holds
+      about 170 RGB frames of 1920x1080 pixels or 3500 of 320x320 pixels.
+      If None, only ``fit_max_frames`` bounds the sample.
+
+    random_state : int or None
+      The seed of the random sample of frames used for ``fit``.
+
+    cache : :any:`FrameCache` or None
+      If given, the outputs of the estimator are memoized by frame content so
+      that duplicated frames (within and across videos) are transformed once.
+
+    cache_key : str or None
+      Identifies the estimator in the ``cache``. By default, a hash of the
+      parameters and the fitted attributes (whose name ends with ``_``) of the
+      estimator, computed at the first ``transform`` (and again after
+      ``fit``). Give a key (e.g. the name and version of a model) for
+      estimators whose parameters cannot be hashed or whose weights are not
+      fitted attributes, and change it when the weights change.
     """
 
     def __init__(
         self,
         estimator,
+        fit_frames_per_video=None,
+        fit_chunk_size=256,
+        fit_max_frames=10000,
+        fit_max_bytes=2**30,
+        random_state=None,
+        cache=None,
+        cache_key=None,
         **kwargs,
     ):
         super().__init__(**kwargs)
         self.estimator = estimator
+        self.fit_frames_per_video = fit_frames_per_video
+        self.fit_chunk_size = fit_chunk_size
+        self.fit_max_frames = fit_max_frames
+        self.fit_max_bytes = fit_max_bytes
+        self.random_state = random_state
+        self.cache = cache
+        self.cache_key = cache_key
+        self._fingerprint = None
+
+    def _cache_fingerprint(self):
+        """The fingerprint of the estimator in the cache, computed once."""
+        if self.cache_key is not None:
+            return joblib.hash(("cache_key", self.cache_key))
+        if self._fingerprint is None:
+            self._fingerprint = _estimator_fingerprint(
+                self.estimator, strict=self.cache.directory is not None
+            )
+        return self._fingerprint
 
     def transform(self, videos, **kwargs):
+        start = instrumentation.start()
+        if start is None:
+            return self._transform(videos, **kwargs)
+
+        hits = self.cache.hits if self.cache is not None else 0
+        transformed_videos = self._transform(videos, **kwargs)
+        instrumentation.record(
+            "transform",
+            start,
+            frames=sum(len(video) for video in transformed_videos),
+            failed_frames=sum(
+                _n_failed_frames(video) for video in transformed_videos
+            ),
+            cache_hits=(
+                self.cache.hits - hits if self.cache is not None else None
+            ),
+        )
+        return transformed_videos
+
+    def _transform(self, videos, **kwargs):
+        as_array = self.estimator._get_tags().get(
+            "bob_video_ndarray_input", False
+        )
+        fingerprint = None
+        if self.cache is not None:
+            fingerprint = self._cache_fingerprint()
         transformed_videos = []
         for i, video in enumerate(videos):
             if not hasattr(video, "indices"):
@@ -48,42 +395,288 @@ class VideoWrapper(TransformerMixin, BaseEstimator):
 
             # remove None's before calling and add them back in data later
             # Isolate invalid samples (when previous transformers returned None)
-            invalid_ids = [i for i, frame in enumerate(video) if frame is None]
-            valid_frames = [frame for frame in video if frame is not None]
+            valid_frames, valid = _valid_frames(video, as_array)
+            all_valid = valid.all()
 
             # remove invalid kw args as well
             for k, v in kw.items():
-                if v is None:
+                if v is None or all_valid:
                     continue
-                kw[k] = [vv for j, vv in enumerate(v) if j not in invalid_ids]
+                kw[k] = [vv for vv, ok in zip(v, valid) if ok]
 
             # Process only the valid samples
             output = None
-            if len(valid_frames) > 0:
-                output = self.estimator.transform(valid_frames, **kw)
-                _check_n_input_output(
-                    valid_frames, output, f"{_frmt(self.estimator)}.transform"
+            if len(valid_frames) > 0 and self.cache is not None:
+                output = self._cached_transform(
+                    valid_frames, kw, fingerprint, as_array
                 )
+            elif len(valid_frames) > 0:
+                output = self._transform_frames(valid_frames, kw)
 
             if output is None:
                 output = [None] * len(valid_frames)
 
+            layout = getattr(video, "layout", None)
+            if (
+                not all_valid
+                and isinstance(output, np.ndarray)
+                and output.dtype != object
+            ):
+                # keep array outputs dense, failed frames are masked out
+                full_output = np.zeros(
+                    (len(valid),) + output.shape[1:], dtype=output.dtype
+                )
+                full_output[valid] = output
+                data = utils.DenseVideoLikeContainer(
+                    full_output, video.indices, valid, layout=layout
+                )
+                transformed_videos.append(data)
+                continue
+
             # Rebuild the full batch of samples (include the previously failed)
-            if len(invalid_ids) > 0:
-                output = list(output)
-                for j in invalid_ids:
-                    output.insert(j, None)
+            if not all_valid:
+                full_output = [None] * len(valid)
+                for j, out in zip(np.flatnonzero(valid), output):
+                    full_output[j] = out
+                output = full_output
 
-            data = utils.VideoLikeContainer(output, video.indices)
+            data = utils.VideoLikeContainer(
+                output, video.indices, layout=layout
+            )
             transformed_videos.append(data)
         return transformed_videos
 
+    def _transform_frames(self, frames, kw):
+        output = self.estimator.transform(frames, **kw)
+        _check_n_input_output(
+            frames, output, f"{_frmt(self.estimator)}.transform"
+        )
+        return output
+
+    def _cached_transform(self, frames, kw, fingerprint, as_array):
+        """Transforms only the frames whose output is not in the cache. Frames
+        that are identical within the video are transformed once."""
+        output = [None] * len(frames)
+        missing = collections.OrderedDict()
+        for j, frame in enumerate(frames):
+            arguments = [None if v is None else v[j] for v in kw.values()]
+            key = self.cache.key(fingerprint, frame, arguments)
+            found, value = self.cache.get(key)
+            if found:
+                output[j] = value
+            else:
+                missing.setdefault(key, []).append(j)
+
+        if missing:
+            first = [positions[0] for positions in missing.values()]
+            if isinstance(frames, np.ndarray):
+                missing_frames = frames[first]
+            else:
+                missing_frames = [frames[j] for j in first]
+            missing_kw = {
+                k: None if v is None else [v[j] for j in first]
+                for k, v in kw.items()
+            }
+            computed = self._transform_frames(missing_frames, missing_kw)
+            for (key, positions), value in zip(missing.items(), computed):
+                if isinstance(value, np.ndarray):
+                    # do not keep the whole output array alive in the cache
+                    value = value.copy()
+                self.cache.put(key, value)
+                for j in positions:
+                    output[j] = value
+
+        self.cache.record(hits=len(frames) - len(missing), misses=len(missing))
+        logger.debug(
+            "%s: %d of %d frames were transformed, cache %s",
+            _frmt(self.estimator),
+            len(missing),
+            len(frames),
+            self.cache.stats(),
+        )
+        if as_array and all(isinstance(o, np.ndarray) for o in output):
+            try:
+                return np.stack(output)
+            except ValueError:
+                pass
+        return output
+
     def _more_tags(self):
         tags = self.estimator._get_tags()
+        # the wrapper itself takes lists of videos
+        tags.pop("bob_video_ndarray_input", None)
         tags["bob_features_save_fn"] = utils.VideoLikeContainer.save_function
         tags["bob_features_load_fn"] = utils.VideoLikeContainer.load
         return tags
 
+    def _training_frames(self, videos, y):
+        """Yields the valid training frames with the label of their video."""
+        for i, video in enumerate(videos):
+            if video is None:
+                continue
+            positions = list(range(len(video)))
+            if self.fit_frames_per_video is not None:
+                positions = selected_indices(
+                    len(video), self.fit_frames_per_video
+                )
+            label = None if y is None else y[i]
+            for frame in _fit_frames(video, positions, self.fit_chunk_size):
+                if frame is not None:
+                    yield frame, label
+
+    def _frames_input(self, frames):
+        if self.estimator._get_tags().get("bob_video_ndarray_input", False):
+            return np.stack(frames)
+        return frames
+
+    def _partial_fit(self, X, y, **fit_params):
+        """Calls ``partial_fit`` with chunks of frames."""
+        frames, labels = [], []
+        for frame, label in self._training_frames(X, y):
+            frames.append(frame)
+            labels.append(label)
+            if len(frames) == self.fit_chunk_size:
+                self.estimator.partial_fit(
+                    self._frames_input(frames),
+                    None if y is None else labels,
+                    **fit_params,
+                )
+                frames, labels = [], []
+        if frames:
+            self.estimator.partial_fit(
+                self._frames_input(frames),
+                None if y is None else labels,
+                **fit_params,
+            )
+
+    def _sample_fit(self, X, y, **fit_params):
+        """Calls ``fit`` with a reservoir sample of the frames."""
+        random_state = check_random_state(self.random_state)
+        frames, labels = [], []
+        capacity = self.fit_max_frames
+        for seen, (frame, label) in enumerate(self._training_frames(X, y)):
+            # copy the frame so the decoded batch it comes from can be freed
+            frame = np.array(frame)
+            if seen == 0 and self.fit_max_bytes is not None:
+                # all frames have the size of the first one (they are stacked)
+                capacity = min(
+                    capacity, max(1, self.fit_max_bytes // max(1, frame.nbytes))
+                )
+            if seen < capacity:
+                position = seen
+                frames.append(None)
+                labels.append(None)
+            else:
+                position = random_state.randint(seen + 1)
+                if position >= capacity:
+                    continue
+            frames[position] = frame
+            labels[position] = label
+        if not frames:
+            raise ValueError(f"No valid frames to fit {_frmt(self.estimator)}")
+        self.estimator.fit(
+            self._frames_input(frames),
+            None if y is None else labels,
+            **fit_params,
+        )
+
+    def fit(self, X, y=None, **fit_params):
+        """Fits the estimator on the frames of the videos in ``X``.
+
+        Does nothing if the estimator does not require fitting.
+
+        **Parameters:**
+
+        X : list
+          The training videos.
+
+        y : list or None
+          The label of each video, given to the estimator for each of its
+          frames.
+
+        fit_params
+          Passed to the ``partial_fit`` or ``fit`` method of the estimator.
+        """
+        if not estimator_requires_fit(self.estimator):
+            return self
+        # the fitted attributes are part of the fingerprint
+        self._fingerprint = None
+        if hasattr(self.estimator, "partial_fit"):
+            logger.debug(f"{_frmt(self.estimator)}.partial_fit")
+            self._partial_fit(X, y, **fit_params)
+        elif hasattr(self.estimator, "fit"):
+            logger.debug(f"{_frmt(self.estimator)}.fit")
+            self._sample_fit(X, y, **fit_params)
+        return self
+
+
+class TemporalPooling(TransformerMixin, BaseEstimator):
+    """Collapses the per-frame features of videos into a single template.
+
+    This transformer is meant to be placed after the estimators that were
+    wrapped with :any:`bob.bio.video.video_wrap_skpipeline`. It takes
+    :any:`bob.bio.video.VideoLikeContainer` features and returns one feature
+    array per video, so that comparing two videos costs one comparison instead
+    of one per pair of frames. Frames that failed (``None``) are ignored.
+
+    **Parameters:**
+
+    method : str
+      One of ``mean``, ``normalized_mean`` (the mean of L2-normalized features,
+      normalized again) or ``weighted_mean`` (the mean weighted by the quality of
+      each frame). The quality of the frames can be given with the ``weights``
+      argument of ``transform``, otherwise the L2 norm of the features is used.
+    """
+
+    methods = ("mean", "normalized_mean", "weighted_mean")
+
+    def __init__(self, method="mean", **kwargs):
+        super().__init__(**kwargs)
+        if method not in self.methods:
+            raise ValueError(
+                f"Invalid pooling method: {method}. Choose from {self.methods}"
+            )
+        self.method = method
+
+    def transform(self, videos, weights=None):
+        """Pools each video into one array. Returns ``None`` for videos where
+        all frames failed."""
+        if weights is None:
+            weights = [None] * len(videos)
+        return [self._pool(v, w) for v, w in zip(videos, weights)]
+
+    def _pool(self, video, weights):
+        valid = np.array([frame is not None for frame in video], dtype=bool)
+        if not valid.any():
+            return None
+        frames = np.stack([frame for frame in video if frame is not None])
+        # work on flat features and restore their shape at the end
+        features = frames.reshape(len(frames), -1).astype(float)
+
+        if self.method == "mean":
+            pooled = features.mean(axis=0)
+        elif self.method == "normalized_mean":
+            pooled = _l2_normalize(_l2_normalize(features).mean(axis=0))
+        else:
+            if weights is None:
+                weights = np.linalg.norm(features, axis=1)
+            else:
+                weights = np.asarray(weights, dtype=float)[valid]
+            if weights.sum() <= 0:
+                return None
+            pooled = weights @ features / weights.sum()
+
+        return pooled.reshape(frames.shape[1:])
+
+    def _more_tags(self):
+        return {"requires_fit": False, "stateless": True}
+
     def fit(self, X, y=None, **fit_params):
         """Does nothing"""
         return self
+
+
+def _l2_normalize(x):
+    """L2-normalizes the last axis of ``x``, leaving null vectors as is."""
+    norm = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norm == 0, 1, norm)
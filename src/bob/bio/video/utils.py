@@ -1,26 +1,40 @@
+import collections
+import contextlib
 import functools
 import importlib
 import logging
+import os
 import pickle
+import re
+import subprocess
+import threading
 import unittest
 
 import h5py
 import imageio
+import imageio_ffmpeg
 import numpy as np
 
 from bob.bio.base import selected_indices
 from bob.io.image import to_bob
 from bob.pipelines import wrap
 
-from .transformer import VideoWrapper
+from . import instrumentation
+from .metadata import indexed_metadata
+from .transcode import find_transcoded, get_reader, is_frame_store
+from .transformer import TemporalPooling, VideoWrapper
 
 logger = logging.getLogger(__name__)
 
 
-def video_wrap_skpipeline(sk_pipeline):
+def video_wrap_skpipeline(sk_pipeline, pooling=None):
     """
     This function takes a `sklearn.Pipeline` and wraps each estimator inside of it with
     :any:`bob.bio.video.transformer.VideoWrapper`
+
+    If ``pooling`` is given (one of the methods of
+    :any:`bob.bio.video.transformer.TemporalPooling`), a pooling step is appended
+    to the pipeline so that each video is represented by a single template.
     """
 
     for i, name, estimator in sk_pipeline._iter():
@@ -45,11 +59,120 @@ def video_wrap_skpipeline(sk_pipeline):
 
         sk_pipeline.steps[i] = (name, transformer)
 
+    if pooling is not None:
+        sk_pipeline.steps.append(
+            ("temporalpooling", wrap(["sample"], TemporalPooling(pooling)))
+        )
+
     return sk_pipeline
 
 
+# styles of select_frames that need the (low resolution) content of the frames
+CONTENT_AWARE_STYLES = ("distinct", "quality")
+
+
+def low_resolution_frames(path, size=(64, 64)):
+    """Decodes a cheap, low resolution and grayscale version of a video.
+
+    The frames are downscaled by ffmpeg while decoding, so this is much faster
+    than loading the full resolution video. The output is meant to be used by
+    the content-aware selection styles of :any:`select_frames`.
+
+    Parameters
+    ----------
+    path : str
+        Path to the video file
+    size : tuple, optional
+        The (width, height) of the decoded frames, by default (64, 64)
+
+    Returns
+    -------
+    numpy.ndarray
+        The frames as a float32 array of shape (N, height, width) with
+        intensities in the [0, 255] range.
+    """
+    reader = imageio.get_reader(path, size=size)
+    try:
+        frames = np.asarray([frame for frame in reader], dtype=np.float32)
+    finally:
+        reader.close()
+    # ITU-R BT.601 luma
+    return frames @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _distinct_indices(frames, max_number_of_frames, difference_threshold):
+    """Keeps the frames that differ from the last kept frame by at least
+    ``difference_threshold`` (mean absolute intensity difference)."""
+    indices = []
+    last = None
+    for i, frame in enumerate(frames):
+        if len(indices) >= max_number_of_frames:
+            break
+        if (
+            last is not None
+            and np.abs(frame - last).mean() < difference_threshold
+        ):
+            continue
+        indices.append(i)
+        last = frame
+    return indices
+
+
+def frame_quality(frames):
+    """Computes a cheap quality score for each frame of a video.
+
+    The score combines the sharpness (variance of the Laplacian), the contrast
+    (standard deviation of the intensities) and the exposure (distance of the
+    mean intensity to mid-gray) of the frames. All measures are computed at once
+    on the whole stack of frames.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        Grayscale frames of shape (N, height, width) with intensities in the
+        [0, 255] range, usually the output of :any:`low_resolution_frames`.
+
+    Returns
+    -------
+    numpy.ndarray
+        The quality of each frame, in the [0, 1] range. Higher is better.
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    laplacian = (
+        4 * frames[:, 1:-1, 1:-1]
+        - frames[:, :-2, 1:-1]
+        - frames[:, 2:, 1:-1]
+        - frames[:, 1:-1, :-2]
+        - frames[:, 1:-1, 2:]
+    )
+    sharpness = laplacian.var(axis=(1, 2))
+    contrast = frames.std(axis=(1, 2))
+    exposure = 1 - np.abs(frames.mean(axis=(1, 2)) - 127.5) / 127.5
+
+    def _normalize(x):
+        top = x.max(initial=0)
+        return x / top if top > 0 else x
+
+    return _normalize(sharpness) * _normalize(contrast) * exposure
+
+
+def _best_quality_indices(frames, max_number_of_frames):
+    """Keeps the ``max_number_of_frames`` frames with the highest
+    :any:`frame_quality`, in temporal order."""
+    scores = frame_quality(frames)
+    if max_number_of_frames >= len(scores):
+        return list(range(len(scores)))
+    best = np.argpartition(-scores, max_number_of_frames - 1)
+    return sorted(best[:max_number_of_frames].tolist())
+
+
 def select_frames(
-    count, max_number_of_frames=None, selection_style=None, step_size=None
+    count,
+    max_number_of_frames=None,
+    selection_style=None,
+    step_size=None,
+    frames=None,
+    difference_threshold=None,
 ):
     """Returns indices of the frames to be selected given the parameters.
 
@@ -62,6 +185,11 @@ def select_frames(
       ``step_size/2`` **Think twice if you want to have that when giving FrameContainer
       data!**
     * all : All frames are selected unconditionally.
+    * distinct : Temporal redundancy elimination. Starting from the first frame,
+      frames are dropped if their mean absolute difference to the last kept
+      frame is below ``difference_threshold``. Requires ``frames``.
+    * quality : The ``max_number_of_frames`` frames with the highest
+      :any:`frame_quality` are selected. Requires ``frames``.
 
     Parameters
     ----------
@@ -71,19 +199,28 @@ def select_frames(
         The maximum number of frames to be selected. Ignored when selection_style is
         "all".
     selection_style : str
-        One of (``first``, ``spread``, ``step``, ``all``). See above.
+        One of (``first``, ``spread``, ``step``, ``all``, ``distinct``,
+        ``quality``). See above.
     step_size : int
         Only useful when ``selection_style`` is ``step``.
+    frames : numpy.ndarray
+        The frames of the video, usually the output of
+        :any:`low_resolution_frames`. Only needed by the content-aware styles.
+    difference_threshold : float
+        Only useful when ``selection_style`` is ``distinct``. The mean absolute
+        intensity difference (in the [0, 255] range) below which a frame is
+        considered redundant, by default 1.0
 
     Returns
     -------
-    range
-        A range of frames to be selected.
+    range or list
+        The indices of the frames to be selected.
 
     Raises
     ------
     ValueError
-        If ``selection_style`` is not one of the supported ones.
+        If ``selection_style`` is not one of the supported ones or if ``frames``
+        is missing for a content-aware style.
     """
     # default values
     if max_number_of_frames is None:
@@ -92,6 +229,14 @@ def select_frames(
         selection_style = "spread"
     if step_size is None:
         step_size = 10
+    if difference_threshold is None:
+        difference_threshold = 1.0
+
+    if selection_style in CONTENT_AWARE_STYLES and frames is None:
+        raise ValueError(
+            f"The `{selection_style}' selection style requires the frames of "
+            "the video."
+        )
 
     if selection_style == "first":
         # get the first frames (limited by all frames)
@@ -103,12 +248,347 @@ def select_frames(
         indices = range(step_size // 2, count, step_size)[:max_number_of_frames]
     elif selection_style == "all":
         indices = range(0, count)
+    elif selection_style == "distinct":
+        indices = _distinct_indices(
+            frames[:count], max_number_of_frames, difference_threshold
+        )
+    elif selection_style == "quality":
+        indices = _best_quality_indices(frames[:count], max_number_of_frames)
     else:
         raise ValueError(f"Invalid selection style: {selection_style}")
 
     return indices
 
 
+@functools.lru_cache(maxsize=4096)
+def _video_metadata(path, mtime, file_size):
+    reader = get_reader(path)
+    try:
+        meta = reader.get_meta_data()
+        return {
+            "count": reader.count_frames(),
+            "size": tuple(meta["size"]),
+            "fps": meta["fps"],
+        }
+    finally:
+        reader.close()
+
+
+def video_metadata(path):
+    """Returns the number of frames, frame size and frame rate of a video.
+
+    The metadata is cached (per process) as long as the file does not change,
+    so creating several :any:`VideoAsArray` of the same video only probes the
+    video once. Videos of the active metadata index (see
+    :any:`bob.bio.video.metadata.use_metadata_index`) are not probed at all.
+
+    Parameters
+    ----------
+    path : str
+        Path to the video file
+
+    Returns
+    -------
+    dict
+        With the keys ``count`` (number of frames), ``size`` (width, height)
+        and ``fps``.
+    """
+    stat = os.stat(path)
+    entry = indexed_metadata(path, (stat.st_mtime_ns, stat.st_size))
+    if entry is not None:
+        return {
+            "count": entry["count"],
+            "size": tuple(entry["size"]),
+            "fps": entry["fps"],
+        }
+    return dict(_video_metadata(path, stat.st_mtime_ns, stat.st_size))
+
+
+def keyframe_indices(path, fps=None):
+    """Returns the indices of the keyframes of a video.
+
+    Only the keyframes are decoded (``-skip_frame nokey``) so this is much
+    faster than reading the video. Seeking to a keyframe and decoding from there
+    is the cheapest way to access any frame of a video. The keyframes of the
+    videos of the active metadata index are not decoded at all.
+
+    Parameters
+    ----------
+    path : str
+        Path to the video file
+    fps : float, optional
+        The frame rate of the video. Read from the video if not given.
+
+    Returns
+    -------
+    list
+        The sorted frame indices of the keyframes. Always starts with 0.
+    """
+    if is_frame_store(path):
+        # every frame of a frame store is read independently
+        return list(range(video_metadata(path)["count"]))
+    entry = indexed_metadata(path)
+    if entry is not None:
+        return list(entry["keyframes"])
+    if fps is None:
+        fps = video_metadata(path)["fps"]
+    return _probe_keyframes(path, fps)
+
+
+def _probe_keyframes(path, fps):
+    command = [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-hide_banner",
+        "-nostats",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        path,
+        "-vf",
+        "showinfo",
+        "-an",
+        "-f",
+        "null",
+        "-",
+    ]
+    output = subprocess.run(
+        command, capture_output=True, text=True, check=True
+    ).stderr
+    times = re.findall(r"pts_time:\s*(-?[0-9.]+)", output)
+    indices = {0} | {max(0, round(float(t) * fps)) for t in times}
+    return sorted(indices)
+
+
+class ReaderPool:
+    """A thread-safe pool of video readers.
+
+    A reader holds the state of an ffmpeg decoder, so it must not be used by two
+    threads at the same time. Readers are checked out exclusively for each
+    request with :any:`ReaderPool.reader` and returned to the pool afterwards,
+    so that the next request on the same video can reuse the decoder (and its
+    position in the video) instead of launching a new ffmpeg process.
+
+    At most ``max_readers`` readers are open at any time. When the limit is
+    reached, the least recently used idle reader is closed; if all readers are
+    in use, the request waits until one is returned.
+
+    Parameters
+    ----------
+    max_readers : int, optional
+        The maximum number of open readers, by default twice the number of CPUs.
+    """
+
+    def __init__(self, max_readers=None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_readers = max_readers or 2 * (os.cpu_count() or 1)
+        self._available = threading.Condition()
+        # idle readers by key, the least recently used first
+        self._idle = collections.OrderedDict()
+        self._open = 0
+
+    def __len__(self):
+        """The number of open readers."""
+        with self._available:
+            return self._open
+
+    def _checkout(self, key):
+        with self._available:
+            while True:
+                if self._idle.get(key):
+                    self._idle.move_to_end(key)
+                    return self._idle[key].pop()
+                if self._open < self.max_readers:
+                    self._open += 1
+                    return None
+                idle_key = next((k for k, v in self._idle.items() if v), None)
+                if idle_key is not None:
+                    # replace the least recently used idle reader
+                    self._idle[idle_key].pop(0).close()
+                    return None
+                self._available.wait()
+
+    def _checkin(self, key, reader):
+        with self._available:
+            self._idle.setdefault(key, []).append(reader)
+            self._idle.move_to_end(key)
+            self._available.notify()
+
+    def _discard(self, reader):
+        if reader is not None:
+            reader.close()
+        with self._available:
+            self._open -= 1
+            self._available.notify()
+
+    @contextlib.contextmanager
+    def reader(self, path, **kwargs):
+        """Checks out a reader of ``path`` for the duration of a ``with`` block.
+
+        Parameters
+        ----------
+        path : str
+            Path to the video file
+        **kwargs
+            Extra arguments of ``imageio.get_reader``. Readers are only reused
+            for requests with the same arguments.
+        """
+        key = (path, repr(sorted(kwargs.items())))
+        reader = self._checkout(key)
+        try:
+            if reader is None:
+                reader = get_reader(path, **kwargs)
+            yield reader
+        except BaseException:
+            # the decoder may be in an unknown state, do not reuse it
+            self._discard(reader)
+            raise
+        self._checkin(key, reader)
+
+    def clear(self):
+        """Closes all idle readers."""
+        with self._available:
+            for readers in self._idle.values():
+                for reader in readers:
+                    reader.close()
+                    self._open -= 1
+            self._idle.clear()
+            self._available.notify_all()
+
+    def _reset(self):
+        # readers inherited through fork belong to the parent's ffmpeg processes
+        self._available = threading.Condition()
+        self._idle = collections.OrderedDict()
+        self._open = 0
+
+
+#: The reader pool used by :any:`VideoAsArray` in this process.
+READER_POOL = ReaderPool()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=READER_POOL._reset)
+
+
+class BufferPool:
+    """A thread-safe pool of reusable contiguous arrays.
+
+    Chunked consumers of videos (see :any:`VideoAsArray.read_into`) can take a
+    buffer from the pool for each chunk and give it back when they are done
+    with it, instead of allocating a new large array for every chunk.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        The maximum total size of the idle buffers kept in the pool, by default
+        1 GiB. Buffers given back beyond this size are dropped.
+    """
+
+    def __init__(self, max_bytes=2**30, **kwargs):
+        super().__init__(**kwargs)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._idle = collections.defaultdict(list)
+        self._bytes = 0
+
+    @property
+    def nbytes(self):
+        """The total size of the idle buffers."""
+        return self._bytes
+
+    def get(self, shape, dtype=np.uint8):
+        """Returns a C-contiguous array of ``shape`` and ``dtype``, reused from
+        the pool if possible. Its content is undefined."""
+        key = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            if self._idle[key]:
+                array = self._idle[key].pop()
+                self._bytes -= array.nbytes
+                return array
+        return np.empty(shape, dtype=dtype)
+
+    def put(self, array):
+        """Gives a buffer back to the pool."""
+        key = (array.shape, array.dtype)
+        with self._lock:
+            if self._bytes + array.nbytes <= self.max_bytes:
+                self._idle[key].append(array)
+                self._bytes += array.nbytes
+
+    @contextlib.contextmanager
+    def buffer(self, shape, dtype=np.uint8):
+        """Checks out a buffer for the duration of a ``with`` block."""
+        array = self.get(shape, dtype)
+        try:
+            yield array
+        finally:
+            self.put(array)
+
+    def clear(self):
+        """Drops all idle buffers."""
+        with self._lock:
+            self._idle.clear()
+            self._bytes = 0
+
+
+def decode_options(size=None, grayscale=False, crop=None):
+    """Returns the reader arguments that make ffmpeg crop, resize and convert
+    the frames to grayscale while decoding.
+
+    Parameters
+    ----------
+    size : tuple, optional
+        The (width, height) of the decoded frames.
+    grayscale : bool, optional
+        If True, the frames are converted to grayscale (luma).
+    crop : tuple, optional
+        The (x, y, width, height) region of the source frames to decode. The
+        crop is applied before resizing.
+
+    Returns
+    -------
+    dict
+        Keyword arguments of ``imageio.get_reader``.
+    """
+    filters = []
+    if crop is not None:
+        x, y, width, height = crop
+        filters.append(f"crop={width}:{height}:{x}:{y}")
+    if size is not None:
+        filters.append("scale={}:{}".format(*size))
+    if grayscale:
+        filters.append("format=gray")
+    if not filters:
+        return {}
+    return {"output_params": ["-vf", ",".join(filters)]}
+
+
+# the supported memory layouts of color frames
+LAYOUTS = ("CHW", "HWC")
+
+
+def _convert_frame(frame, grayscale, layout):
+    """Converts a decoded (height, width, 3) frame to the requested layout."""
+    # ffmpeg sends gray frames as rgb24 with three identical channels
+    if grayscale:
+        return frame[..., 0]
+    if layout == "HWC":
+        return frame
+    return to_bob(frame)
+
+
+def _read_video_chunk(
+    path, frame_numbers, transform, options, grayscale, layout
+):
+    """Reads the given (sorted) frames of a video. The reader seeks once to the
+    first frame and decodes sequentially from there."""
+    with READER_POOL.reader(path, **options) as reader:
+        frames = np.stack(
+            [
+                _convert_frame(reader.get_data(i), grayscale, layout)
+                for i in frame_numbers
+            ]
+        )
+    return transform(frames)
+
+
 def no_transform(x):
     return x
 
@@ -136,7 +616,8 @@ def is_library_available(library):
 
 class VideoAsArray:
     """A memory efficient class to load only select video frames.
-    It also supports efficient conversion to dask arrays.
+    It also supports efficient conversion to dask arrays, see
+    :any:`VideoAsArray.to_dask`.
     """
 
     def __init__(
@@ -146,6 +627,12 @@ class VideoAsArray:
         max_number_of_frames=None,
         step_size=None,
         transform=None,
+        difference_threshold=None,
+        size=None,
+        grayscale=False,
+        crop=None,
+        layout="CHW",
+        transcoded_directory=None,
         **kwargs,
     ):
         """init
@@ -164,41 +651,104 @@ class VideoAsArray:
             A function that transforms the loaded video. This function should
             not change the video shape or its dtype. For example, you may flip
             the frames horizontally using this function, by default None
+        difference_threshold : float, optional
+            See :any:`select_frames`, by default None
+        size : tuple, optional
+            The (width, height) of the loaded frames. The frames are resized by
+            ffmpeg while decoding, by default None
+        grayscale : bool, optional
+            If True, the frames are converted to grayscale by ffmpeg while
+            decoding and the video has the shape (N, height, width), by
+            default False
+        crop : tuple, optional
+            The (x, y, width, height) region of the source frames to load,
+            cropped by ffmpeg before resizing, by default None
+        layout : str, optional
+            The memory layout of color frames: ``CHW`` (the bob convention) or
+            ``HWC`` (the native layout of the decoder, e.g. for OpenCV-based
+            estimators). ``HWC`` frames are neither transposed nor copied after
+            decoding, by default "CHW"
+        transcoded_directory : str, optional
+            The directory of the transcoded copies of the videos (see
+            :any:`bob.bio.video.transcode.transcode_video`). If an up-to-date
+            copy of ``path`` exists, the frames are read from it instead. By
+            default, the ``bob.bio.video.transcoded_directory`` configuration
+            is used; an empty string disables transcoded copies.
         """
         super().__init__(**kwargs)
-        self.path = path
-        self.reader = imageio.get_reader(path)
+        if layout not in LAYOUTS:
+            raise ValueError(f"Invalid layout: {layout}. Choose from {LAYOUTS}")
+        # frame stores hold the decoded frames and do not support the decode
+        # options
+        formats = (
+            ("intra",) if (size or grayscale or crop) else ("hdf5", "intra")
+        )
+        transcoded = find_transcoded(path, transcoded_directory, formats)
+        self.source_path = path
+        self.path = transcoded or path
         self.dtype = np.uint8
-        shape = (self.reader.count_frames(), 3) + self.reader.get_meta_data()[
-            "size"
-        ][::-1]
+        self.size = size
+        self.grayscale = grayscale
+        self.crop = crop
+        self.layout = layout
+        metadata = video_metadata(self.path)
+        frame_size = metadata["size"]
+        if crop is not None:
+            frame_size = tuple(crop[2:])
+        if size is not None:
+            frame_size = tuple(size)
+        if grayscale:
+            frame_shape = frame_size[::-1]
+        elif layout == "HWC":
+            frame_shape = frame_size[::-1] + (3,)
+        else:
+            frame_shape = (3,) + frame_size[::-1]
+        shape = (metadata["count"],) + frame_shape
         self.ndim = len(shape)
         self.selection_style = selection_style
 
+        # content-aware styles look at a cheap low resolution decode of the
+        # video so that only the kept frames are decoded in full resolution
+        frames = None
+        if selection_style in CONTENT_AWARE_STYLES:
+            frames = low_resolution_frames(
+                path if is_frame_store(self.path) else self.path
+            )
+
         indices = select_frames(
-            count=self.reader.count_frames(),
+            count=metadata["count"],
             max_number_of_frames=max_number_of_frames,
             selection_style=selection_style,
             step_size=step_size,
+            frames=frames,
+            difference_threshold=difference_threshold,
         )
 
         self.indices = indices
         self.shape = (len(indices),) + shape[1:]
         self.transform = transform or no_transform
 
-    def __getstate__(self):
-        d = self.__dict__.copy()
-        d.pop("reader")
-        return d
-
-    def __setstate__(self, state):
-        self.__dict__.update(state)
-        self.reader = imageio.get_reader(self.path)
-
     def __len__(self):
         return self.shape[0]
 
+    def _reader(self):
+        """Checks out a reader (with the decode options) from the pool."""
+        options = decode_options(self.size, self.grayscale, self.crop)
+        return READER_POOL.reader(self.path, **options)
+
     def __getitem__(self, index):
+        start = instrumentation.start()
+        frames = self._getitem(index)
+        if start is not None:
+            instrumentation.record(
+                "decode",
+                start,
+                frames=1 if isinstance(index, int) else len(frames),
+                bytes=frames.nbytes,
+            )
+        return frames
+
+    def _getitem(self, index):
         # logger.debug("Getting frame %s from %s", index, self.path)
 
         # In this method, someone is requesting indices thinking this video has
@@ -211,11 +761,15 @@ class VideoAsArray:
         # If only one frame is requested, first translate the index to the real
         # frame number in the video file and load that
 
+        # Readers are checked out from READER_POOL (and opened on first use)
+        # for each request so that concurrent requests never share a decoder.
         if isinstance(index, int):
             idx = self.indices[index]
-            return self.transform(
-                np.asarray([to_bob(self.reader.get_data(idx))])
-            )[0]
+            with self._reader() as reader:
+                frame = _convert_frame(
+                    reader.get_data(idx), self.grayscale, self.layout
+                )
+            return self.transform(np.asarray([frame]))[0]
 
         if not (
             isinstance(index, tuple)
@@ -230,23 +784,22 @@ class VideoAsArray:
         if all(i == slice(0, 0) for i in index):
             return np.array([], dtype=self.dtype)
 
-        def _frames_generator():
-            # read the frames one by one and yield them
+        def _frames_generator(reader):
+            # read the frames one by one and yield them. The reader seeks to
+            # the first frame and skips the frames in between the others.
             real_frame_numbers = self.indices[index[0]]
-            for i, frame in enumerate(self.reader):
-                frame = to_bob(frame)
-                if i not in real_frame_numbers:
-                    continue
+            for i in real_frame_numbers:
+                frame = _convert_frame(
+                    reader.get_data(i), self.grayscale, self.layout
+                )
                 # make sure arrays are loaded in C order because we reshape them
-                # by C order later. Also, index into the frames here
+                # by C order later (a no-op for HWC frames which are already
+                # contiguous). Also, index into the frames here
                 frame = np.ascontiguousarray(frame)[index[1:]]
                 # return a tuple of flat array to match what is expected by
                 # field_dtype
                 yield (frame.ravel(),)
-                if i == real_frame_numbers[-1]:
-                    break
 
-        iterable = _frames_generator()
         # compute the final shape given self.shape and index
         # see https://stackoverflow.com/a/36188683/1286165
         shape = [
@@ -258,21 +811,167 @@ class VideoAsArray:
         # up loading the video
         field_dtype = [("", (self.dtype, (np.prod(shape[1:]),)))]
         total_number_of_frames = shape[0]
-        video = np.fromiter(iterable, field_dtype, total_number_of_frames)
+        with self._reader() as reader:
+            video = np.fromiter(
+                _frames_generator(reader), field_dtype, total_number_of_frames
+            )
         # view the array as self.dtype to remove the field_dtype
         video = np.reshape(video.view(self.dtype), shape, order="C")
 
         return self.transform(video)
 
+    def read_into(self, out, index=None):
+        """Decodes frames of the video straight into a caller-provided array.
+
+        Unlike ``video[index]``, no output array is allocated: each decoded
+        frame is converted to the layout of this video and written into its
+        place in ``out``. This allows chunked consumers to reuse their buffers,
+        see :any:`BufferPool`.
+
+        Parameters
+        ----------
+        out : numpy.ndarray
+            A C-contiguous array of dtype uint8. Its shape must be the shape of
+            one frame when ``index`` is an int, or ``(n,) + shape[1:]`` with
+            ``n`` at least the number of requested frames.
+        index : int or slice or list, optional
+            The (selected) frames to read, in the same positions as
+            ``video[index]``. All frames by default.
+
+        Returns
+        -------
+        numpy.ndarray
+            The part of ``out`` that was filled. ``transform`` is applied to it
+            and copied back into ``out`` if it returned a new array.
+
+        Raises
+        ------
+        ValueError
+            If ``out`` does not have the right shape, dtype or memory layout.
+        """
+        if isinstance(index, int):
+            frames = out[None]
+            positions = [range(len(self))[index]]
+        else:
+            frames = out
+            if index is None:
+                index = slice(None)
+            if isinstance(index, slice):
+                positions = range(len(self))[index]
+            else:
+                positions = [range(len(self))[i] for i in index]
+
+        if (
+            out.dtype != self.dtype
+            or not out.flags.c_contiguous
+            or frames.shape[1:] != self.shape[1:]
+            or len(frames) < len(positions)
+        ):
+            raise ValueError(
+                f"Cannot read {len(positions)} frames of shape {self.shape[1:]} "
+                f"into an array of shape {out.shape} and dtype {out.dtype}."
+            )
+
+        frames = frames[: len(positions)]
+        with self._reader() as reader:
+            for j, position in enumerate(positions):
+                frame = reader.get_data(self.indices[position])
+                np.copyto(
+                    frames[j],
+                    _convert_frame(frame, self.grayscale, self.layout),
+                )
+
+        transformed = self.transform(frames)
+        if transformed is not frames:
+            np.copyto(frames, transformed)
+        return frames[0] if isinstance(index, int) else frames
+
+    def to_dask(self, frames_per_chunk=1):
+        """Converts the video to a dask array with keyframe-aligned chunks.
+
+        Unlike ``dask.array.from_array``, which makes every chunk decode the
+        video from its start, each chunk here covers whole groups of pictures
+        (GOPs, the frames between two keyframes). Each task checks out its own
+        reader, seeks once to the first frame of its chunk and decodes only that
+        chunk, so the chunks can be loaded in parallel.
+
+        Parameters
+        ----------
+        frames_per_chunk : int, optional
+            The minimum number of (selected) frames in each chunk. Consecutive
+            GOPs are merged until this size is reached, by default 1
+
+        Returns
+        -------
+        dask.array.Array
+            The video as a dask array with the same shape as this object.
+        """
+        import dask
+        import dask.array as da
+
+        keyframes = keyframe_indices(self.path)
+        frame_numbers = np.asarray(self.indices)
+        gops = np.searchsorted(keyframes, frame_numbers, side="right")
+
+        # group the selected frames by GOP and merge small groups
+        chunks, current = [], []
+        for position, gop in enumerate(gops):
+            if (
+                current
+                and gop != gops[current[-1]]
+                and len(current) >= frames_per_chunk
+            ):
+                chunks.append(current)
+                current = []
+            current.append(position)
+        if current:
+            chunks.append(current)
+
+        read = dask.delayed(_read_video_chunk, pure=True)
+        arrays = [
+            da.from_delayed(
+                read(
+                    self.path,
+                    frame_numbers[chunk].tolist(),
+                    self.transform,
+                    decode_options(self.size, self.grayscale, self.crop),
+                    self.grayscale,
+                    self.layout,
+                ),
+                shape=(len(chunk),) + self.shape[1:],
+                dtype=self.dtype,
+            )
+            for chunk in chunks
+        ]
+        if not arrays:
+            return da.zeros(self.shape, dtype=self.dtype)
+        return da.concatenate(arrays, axis=0)
+
     def __repr__(self):
         return f"VideoAsArray: {self.path!r} {self.dtype!r} {self.ndim!r} {self.shape!r} {self.indices!r}"
 
 
 class VideoLikeContainer:
-    def __init__(self, data, indices, **kwargs):
+    """A container of per-frame data (frames, annotations, features, ...) of a
+    video together with the indices of the frames in the video.
+
+    Parameters
+    ----------
+    data : list or numpy.ndarray
+        The data of each frame. Failed frames may be ``None``.
+    indices : list
+        The index of each frame in the original video.
+    layout : str, optional
+        The memory layout of the frames if they are color images (``CHW`` or
+        ``HWC``, see :any:`VideoAsArray`), by default None (unknown or not
+        images).
+    """
+
+    def __init__(self, data, indices, layout=None, **kwargs):
         super().__init__(**kwargs)
         self.data = data
         self.indices = indices
+        self.layout = layout
 
     def __repr__(self) -> str:
         return f"VideoLikeContainer: {self.data!r} {self.indices!r}"
@@ -312,24 +1011,196 @@ class VideoLikeContainer:
 
     @staticmethod
     def save_function(other, file):
+        start = instrumentation.start()
+        VideoLikeContainer._save(other, file)
+        if start is not None:
+            instrumentation.record(
+                "save",
+                start,
+                frames=len(other.indices),
+                bytes=instrumentation.file_size(file),
+            )
+
+    @staticmethod
+    def _save(other, file):
         try:
             with h5py.File(file, mode="w") as f:
                 f["data"] = other.data
                 f["indices"] = other.indices
-        # revert to saving data in pickles when the dtype is not supported by hdf5
-        except TypeError:
+                if getattr(other, "mask", None) is not None:
+                    f["mask"] = other.mask
+                if other.layout is not None:
+                    f.attrs["layout"] = other.layout
+        # revert to saving data in pickles when the data is not supported by
+        # hdf5 (object dtypes or frames mixed with None)
+        except (TypeError, ValueError):
             with open(file, "wb") as f:
-                pickle.dump({"data": other.data, "indices": other.indices}, f)
+                pickle.dump(
+                    {
+                        "data": other.data,
+                        "indices": other.indices,
+                        "layout": other.layout,
+                        "mask": getattr(other, "mask", None),
+                    },
+                    f,
+                )
 
     @classmethod
     def load(cls, file):
+        start = instrumentation.start()
+        self = cls._load(file)
+        if start is not None:
+            instrumentation.record(
+                "load",
+                start,
+                frames=len(self.indices),
+                bytes=instrumentation.file_size(file),
+            )
+        return self
+
+    @classmethod
+    def _load(cls, file):
         try:
             # weak closing of the hdf5 file so we don't load all the data into
             # memory https://docs.h5py.org/en/stable/high/file.html#closing-files
             f = h5py.File(file, mode="r")
-            loaded = {"data": f["data"], "indices": list(f["indices"])}
+            loaded = {
+                "data": f["data"],
+                "indices": list(f["indices"]),
+                "layout": f.attrs.get("layout"),
+            }
+            if "mask" in f:
+                loaded["mask"] = f["mask"][()]
         except OSError:
             with open(file, "rb") as f:
                 loaded = pickle.load(f)
-        self = cls(**loaded)
-        return self
+        # containers saved with a validity mask are loaded as dense containers
+        mask = loaded.pop("mask", None)
+        if mask is not None:
+            return DenseVideoLikeContainer(mask=mask, **loaded)
+        if issubclass(cls, DenseVideoLikeContainer):
+            return cls.from_container(VideoLikeContainer(**loaded))
+        return cls(**loaded)
+
+
+class DenseVideoLikeContainer(VideoLikeContainer):
+    """A :any:`VideoLikeContainer` which stores all frames in one contiguous
+    array.
+
+    Failed frames are zero-filled in ``data`` and marked as invalid in
+    ``mask``. The container behaves like a :any:`VideoLikeContainer` (failed
+    frames are returned as ``None`` when indexing or iterating) but the data can
+    always be saved in hdf5.
+
+    As an array, the container is the view of its valid frames only (see
+    :any:`DenseVideoLikeContainer.valid_data`) so that failed frames never end
+    up in templates: ``numpy.asarray`` returns the valid frames (without a
+    copy if all frames are valid) and ``shape`` is their shape. ``len``,
+    indexing and iteration cover all frames, like in
+    :any:`VideoLikeContainer`.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        The data of each frame, of shape (N, ...).
+    indices : list or numpy.ndarray
+        The index of each frame in the original video.
+    mask : numpy.ndarray, optional
+        A boolean array of shape (N,) which is False for failed frames, by
+        default all frames are valid.
+    layout : str, optional
+        The memory layout of the frames, see :any:`VideoLikeContainer`.
+    """
+
+    def __init__(self, data, indices, mask=None, layout=None, **kwargs):
+        super().__init__(data=data, indices=indices, layout=layout, **kwargs)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        if mask is None:
+            mask = np.ones(len(data), dtype=bool)
+        self.mask = np.asarray(mask, dtype=bool)
+        if len(self.mask) != len(data) or len(self.indices) != len(data):
+            raise ValueError(
+                f"data ({len(data)}), indices ({len(self.indices)}) and mask "
+                f"({len(self.mask)}) must have the same length"
+            )
+
+    def __repr__(self) -> str:
+        return (
+            f"DenseVideoLikeContainer: {self.data!r} {self.indices!r} "
+            f"{self.mask!r}"
+        )
+
+    @property
+    def valid_data(self):
+        """The data of the valid frames only, of shape (number of valid
+        frames, ...). This is a view of ``data`` if all frames are valid."""
+        data = np.asarray(self.data)
+        if self.mask.all():
+            return data
+        return data[self.mask]
+
+    @property
+    def shape(self):
+        """The shape of the valid frames."""
+        shape = np.shape(self.data)
+        return (int(np.count_nonzero(self.mask)),) + tuple(shape[1:])
+
+    def __array__(self, dtype=None, *args, **kwargs):
+        return np.asarray(self.valid_data, dtype, *args, **kwargs)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            if item >= len(self) or item < -len(self):
+                raise IndexError(
+                    f"Index ({item}) out of range (0-{len(self)-1})"
+                )
+            return self.data[item] if self.mask[item] else None
+        return [self[i] for i in range(len(self))[item]]
+
+    def __eq__(self, o: object) -> bool:
+        if not isinstance(o, DenseVideoLikeContainer):
+            o = DenseVideoLikeContainer.from_container(o)
+        return (
+            np.array_equal(self.mask, o.mask)
+            and np.array_equal(self.indices, o.indices)
+            and np.array_equal(self.valid_data, o.valid_data)
+        )
+
+    @classmethod
+    def from_container(cls, container):
+        """Creates a dense container from a :any:`VideoLikeContainer`.
+
+        The data is not copied if it is already a (non-object) array.
+        """
+        layout = getattr(container, "layout", None)
+        data = getattr(container, "data", container)
+        if getattr(container, "mask", None) is not None:
+            return cls(data, container.indices, container.mask, layout)
+        if isinstance(data, np.ndarray) and data.dtype != object:
+            return cls(data, container.indices, layout=layout)
+
+        frames = list(data)
+        mask = np.fromiter(
+            (frame is not None for frame in frames),
+            dtype=bool,
+            count=len(frames),
+        )
+        valid = [np.asarray(frame) for frame in frames if frame is not None]
+        if valid:
+            valid = np.stack(valid)
+            dense = np.zeros((len(frames),) + valid.shape[1:], valid.dtype)
+            dense[mask] = valid
+        else:
+            dense = np.zeros(len(frames))
+        return cls(dense, container.indices, mask, layout)
+
+    def to_container(self):
+        """Converts this container into a :any:`VideoLikeContainer` whose data
+        is a list of frames (``None`` for failed frames)."""
+        if self.mask.all():
+            return VideoLikeContainer(
+                np.asarray(self.data), list(self.indices), layout=self.layout
+            )
+        return VideoLikeContainer(
+            list(self), list(self.indices), layout=self.layout
+        )
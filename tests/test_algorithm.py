@@ -0,0 +1,173 @@
+import numpy as np
+import pytest
+
+from scipy.spatial.distance import cdist
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import make_pipeline
+
+from bob.bio.base import selected_indices
+from bob.bio.video import VideoLikeContainer, video_wrap_skpipeline
+from bob.bio.video.algorithm import (
+    FrameScoring,
+    ProgressiveVerification,
+    progressive_order,
+    stack_frames,
+)
+from bob.bio.video.transformer import VideoWrapper
+from bob.pipelines import wrap
+
+
+def test_stack_frames():
+    video = VideoLikeContainer(
+        [np.ones((2, 2)), None, np.zeros((2, 2))], indices=[0, 1, 2]
+    )
+    stacked = stack_frames([video, None, np.full(4, 2.0)])
+    assert stacked.dtype == np.float32
+    np.testing.assert_equal(stacked, [[1] * 4, [0] * 4, [2] * 4])
+    assert stack_frames([None]).shape == (0, 0)
+
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+@pytest.mark.parametrize("reduction", ["max", "mean", "top_k_mean", "median"])
+def test_frame_scoring(metric, reduction):
+    rng = np.random.default_rng(0)
+    enroll = VideoLikeContainer(list(rng.normal(size=(37, 8))), range(37))
+    probe = VideoLikeContainer(
+        list(rng.normal(size=(29, 8))) + [None], range(30)
+    )
+
+    reference = -cdist(
+        np.asarray(enroll, dtype=float),
+        np.asarray(probe[:29], dtype=float),
+        metric,
+    )
+    if metric == "cosine":
+        reference += 1
+    reference = {
+        "max": reference.max(),
+        "mean": reference.mean(),
+        "top_k_mean": np.sort(reference.ravel())[-3:].mean(),
+        "median": np.median(reference),
+    }[reduction]
+
+    # a tiny memory limit forces many blocks
+    algorithm = FrameScoring(
+        metric=metric, reduction=reduction, top_k=3, memory_limit=4 * 50
+    )
+    enroll_templates = algorithm.create_templates([[enroll]], enroll=True)
+    probe_templates = algorithm.create_templates(
+        [[probe], [None]], enroll=False
+    )
+    scores = algorithm.compare(enroll_templates, probe_templates)
+    assert scores.shape == (1, 2), scores.shape
+    np.testing.assert_allclose(scores[0, 0], reference, rtol=1e-4, atol=1e-5)
+    assert np.isnan(scores[0, 1])
+
+
+class _FlattenEstimator(BaseEstimator, TransformerMixin):
+    def transform(self, frames, annotations=None):
+        self.n_frames_ = getattr(self, "n_frames_", 0) + len(frames)
+        self.annotations_ = annotations
+        return [np.ravel(f).astype(float) for f in frames]
+
+
+def test_progressive_order():
+    order = progressive_order(10, 3)
+    assert sorted(order) == list(range(10)), order
+    assert order[:3] == list(selected_indices(10, 3)), order
+
+
+def test_progressive_verification():
+    rng = np.random.default_rng(0)
+    identity = rng.normal(size=8)
+    estimator = _FlattenEstimator()
+    verifier = ProgressiveVerification(
+        VideoWrapper(estimator), threshold=0.5, band=0.1, initial_frames=4
+    )
+    template = verifier.enroll(
+        [VideoLikeContainer(identity + rng.normal(size=(5, 8)) * 0.1, range(5))]
+    )
+
+    # a clear genuine and a clear impostor only need the first round
+    for frames, genuine in [
+        (identity + rng.normal(size=(64, 8)) * 0.1, True),
+        (-identity + rng.normal(size=(64, 8)) * 0.1, False),
+    ]:
+        estimator.n_frames_ = 0
+        score, n_frames = verifier.verify(
+            template, VideoLikeContainer(frames, range(64))
+        )
+        assert n_frames == 4, n_frames
+        assert estimator.n_frames_ == 4, estimator.n_frames_
+        assert (score > 0.5) == genuine, score
+
+    # an uncertain probe uses all frames
+    video = VideoLikeContainer(rng.normal(size=(20, 8)) * 0.01, range(20))
+    verifier.threshold = 0.0
+    verifier.band = 10
+    score, n_frames = verifier.verify(template, video)
+    assert n_frames == 20, n_frames
+    reference = verifier.algorithm.score(
+        template,
+        verifier.algorithm.create_templates([[video]], enroll=False)[0],
+    )
+    np.testing.assert_allclose(score, reference, rtol=1e-5)
+
+
+def test_progressive_verification_pipeline():
+    rng = np.random.default_rng(0)
+    identity = rng.normal(size=8)
+    estimator = _FlattenEstimator()
+    pipeline = video_wrap_skpipeline(
+        make_pipeline(
+            wrap(
+                ["sample"],
+                estimator,
+                transform_extra_arguments=(("annotations", "annotations"),),
+            )
+        )
+    )
+    verifier = ProgressiveVerification(pipeline, threshold=0.5, band=0.1)
+    annotations = {i: {"frame": i} for i in range(8)}
+    template = verifier.enroll(
+        [
+            VideoLikeContainer(
+                identity + rng.normal(size=(8, 8)) * 0.1, range(8)
+            )
+        ],
+        annotations=[annotations],
+    )
+    assert estimator.annotations_ == list(annotations.values())
+
+    score, n_frames = verifier.verify(
+        template,
+        VideoLikeContainer(identity + rng.normal(size=(8, 8)) * 0.1, range(8)),
+        annotations=annotations,
+    )
+    assert n_frames == 4 and score > 0.5, (n_frames, score)
+    # only the annotations of the frames of the first round are used
+    assert estimator.annotations_ == [
+        annotations[i] for i in sorted(progressive_order(8, 4)[:4])
+    ]
+
+    # annotations are not silently dropped by pipelines that are not sample
+    # wrapped
+    verifier = ProgressiveVerification(make_pipeline(VideoWrapper(estimator)))
+    with pytest.raises(ValueError):
+        verifier.enroll(
+            [VideoLikeContainer(rng.normal(size=(2, 8)), range(2))],
+            annotations=[annotations],
+        )
+
+    for kwargs in ({"growth": 1}, {"growth": 0.5}, {"initial_frames": 0}):
+        with pytest.raises(ValueError):
+            ProgressiveVerification(pipeline, **kwargs)
+    # fractional growths add at least one frame per round
+    verifier = ProgressiveVerification(
+        pipeline, threshold=0.0, band=1e6, initial_frames=1, growth=1.2
+    )
+    template = verifier.enroll(
+        [VideoLikeContainer(rng.normal(size=(3, 8)), range(3))]
+    )
+    video = VideoLikeContainer(rng.normal(size=(8, 8)), range(8))
+    assert verifier.verify(template, video)[1] == 8
@@ -0,0 +1,52 @@
+import h5py
+import numpy as np
+import pytest
+
+from bob.bio.video import VideoLikeContainer
+from bob.bio.video.index import IdentificationIndex
+
+
+def _video(features):
+    return VideoLikeContainer(list(features), range(len(features)))
+
+
+@pytest.mark.parametrize("pooling", [None, "mean"])
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+def test_identification_index(tmp_path, metric, pooling):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 16)) * 10
+    gallery = [_video(c + rng.normal(size=(5, 16))) for c in centers]
+    subjects = [f"subject{i}" for i in range(20)]
+
+    index = IdentificationIndex(metric=metric, pooling=pooling)
+    # incremental insertion
+    index.add(gallery[:7], subjects[:7]).add(gallery[7:], subjects[7:])
+    index.add([_video([None])], ["failed"])
+    assert len(index.subjects) == 20
+    assert len(index) == (20 if pooling else 100)
+    assert index.features.flags.c_contiguous
+
+    probe = _video(list(centers[13] + rng.normal(size=(4, 16))) + [None])
+    results = index.search(probe, k=3)
+    assert len(results) == 3
+    assert results[0][0] == "subject13", results
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True), scores
+    assert index.search(_video([None])) == []
+
+    # tuple subject ids are not supported by hdf5 and are pickled instead
+    for subject_ids in (
+        subjects,
+        list(range(20)),
+        [("a", i) for i in range(20)],
+    ):
+        index = IdentificationIndex(metric=metric, pooling=pooling)
+        index.add(gallery, subject_ids)
+        path = tmp_path / "index"
+        index.save(path)
+        assert h5py.is_hdf5(path) == (not isinstance(subject_ids[0], tuple))
+        loaded = IdentificationIndex.load(path)
+        assert loaded.subjects == subject_ids
+        assert loaded.pooling == pooling
+        np.testing.assert_equal(loaded.features, index.features)
+        assert loaded.search(probe, k=3) == index.search(probe, k=3)
@@ -0,0 +1,85 @@
+import json
+import os
+
+import numpy as np
+
+from sklearn.base import BaseEstimator, TransformerMixin
+
+import bob.bio.base
+import bob.bio.video
+
+from bob.bio.video import instrumentation
+from bob.bio.video.annotator import FailSafeVideo, Wrapper
+from bob.bio.video.transformer import FrameCache, VideoWrapper
+from bob.io.base.testing_utils import datafile
+
+
+class SumEstimator(TransformerMixin, BaseEstimator):
+    def transform(self, frames):
+        return [np.sum(frame, keepdims=True) for frame in frames]
+
+
+class StubAnnotator(bob.bio.base.annotator.Annotator):
+    def transform(self, images):
+        return [
+            {"topleft": (0, 0), "bottomright": (64, 64)}
+            if img is not None and img.sum()
+            else None
+            for img in images
+        ]
+
+
+def test_instrumentation(tmp_path):
+    path = datafile("testvideo.avi", __name__)
+    video = bob.bio.video.VideoAsArray(path, max_number_of_frames=3)
+    container = bob.bio.video.VideoLikeContainer(
+        [np.ones((2, 2)), None, np.ones((2, 2)), np.zeros((2, 2))], [0, 1, 2, 3]
+    )
+    events = []
+    with instrumentation.collect_metrics() as collector:
+        instrumentation.add_callback(lambda *args: events.append(args))
+        instrumentation.add_callback(lambda *args: 1 / 0)
+        video[0]
+        video[:, :, :, :]
+        VideoWrapper(SumEstimator(), cache=FrameCache()).transform([container])
+        container.save(str(tmp_path / "ragged.h5"))
+        bob.bio.video.VideoLikeContainer.load(str(tmp_path / "ragged.h5"))
+        Wrapper(StubAnnotator(), validator=bool).annotate(container)
+        FailSafeVideo([StubAnnotator()], validator=bool).annotate(
+            container.data[2:]
+        )
+    instrumentation._callbacks.clear()
+
+    # instrumentation is off outside of collect_metrics
+    video[0]
+    assert collector.snapshot()["decode"]["calls"] == 2
+
+    metrics = collector.snapshot()
+    assert metrics["decode"]["frames"] == 4
+    assert metrics["decode"]["bytes"] == 4 * 3 * 480 * 640
+    assert metrics["decode"]["seconds"] >= metrics["decode"]["max_seconds"]
+    assert metrics["transform"]["frames"] == 4
+    assert metrics["transform"]["failed_frames"] == 1
+    # the two identical frames are transformed once
+    assert metrics["transform"]["cache_hits"] == 1
+    size = os.path.getsize(tmp_path / "ragged.h5")
+    assert metrics["save"] == {**metrics["save"], "frames": 4, "bytes": size}
+    assert metrics["load"]["bytes"] == size
+    assert metrics["annotate"]["calls"] == 2
+    assert metrics["annotate"]["frames"] == 6
+    # FailSafeVideo keeps the annotations of the previous frame
+    assert metrics["annotate"]["failed_frames"] == 2
+    assert len(events) == sum(m["calls"] for m in metrics.values())
+    stage, seconds, counters = events[0]
+    assert stage == "decode" and seconds > 0 and counters["frames"] == 1
+
+    assert json.loads(collector.to_json(tmp_path / "metrics.json")) == metrics
+    text = collector.to_prometheus(str(tmp_path / "metrics.prom"))
+    assert "# TYPE bob_bio_video_seconds_total counter" in text
+    assert 'bob_bio_video_frames_total{stage="decode"} 4' in text
+    assert 'bob_bio_video_cache_hits_total{stage="transform"} 1' in text
+    with open(tmp_path / "metrics.prom") as f:
+        assert f.read() == text
+
+    collector.reset()
+    assert collector.snapshot() == {}
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from click.testing import CliRunner
+
+import bob.bio.video
+
+from bob.bio.video.loadtest import run_load_test, synthetic_database
+from bob.bio.video.script.loadtest import load_test
+
+
+def test_synthetic_database(tmp_path):
+    paths = synthetic_database(
+        str(tmp_path),
+        n_videos=4,
+        min_duration=0.2,
+        max_duration=0.8,
+        distribution="lognormal",
+        fps=10,
+        size=(32, 24),
+    )
+    assert len(paths) == 4
+    for path in paths:
+        count = bob.bio.video.video_metadata(path)["count"]
+        assert 2 <= count <= 8
+        assert path.endswith(f"-{count}f-32x24.mp4")
+    # existing videos are reused
+    assert (
+        synthetic_database(
+            str(tmp_path), 4, 0.2, 0.8, "lognormal", 10, (32, 24)
+        )
+        == paths
+    )
+
+    with pytest.raises(ValueError):
+        synthetic_database(str(tmp_path), distribution="normal")
+
+
+def test_load_test_command(tmp_path):
+    output = str(tmp_path / "report.json")
+    result = CliRunner().invoke(
+        load_test,
+        [
+            "--n-videos",
+            "3",
+            "--min-duration",
+            "0.4",
+            "--max-duration",
+            "0.8",
+            "--size",
+            "64",
+            "48",
+            "--workers",
+            "1",
+            "--workers",
+            "2",
+            "--database-dir",
+            str(tmp_path / "videos"),
+            "--output",
+            output,
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    with open(output) as f:
+        report = json.load(f)
+
+    assert report["videos"] == 3 and report["database"]["size"] == [64, 48]
+    assert report["stages"][0] == "decode" and len(report["stages"]) == 3
+    assert [run["workers"] for run in report["runs"]] == [1, 2]
+    first, second = report["runs"]
+    assert first["scaling_efficiency"] == 1
+    assert first["frames"] == second["frames"] > 0
+    assert first["frames_per_second"] > 0 and second["videos_per_second"] > 0
+    for stage in report["stages"]:
+        latency = first["latency_seconds"][stage]
+        assert 0 <= latency["p50"] <= latency["p99"] <= latency["max"]
+
+    # there must be videos
+    result = CliRunner().invoke(
+        load_test,
+        ["--n-videos", "0", "--database-dir", str(tmp_path / "videos")],
+    )
+    assert result.exit_code == 2 and "--n-videos" in result.output
+    with pytest.raises(ValueError):
+        run_load_test([])
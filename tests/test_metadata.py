@@ -0,0 +1,67 @@
+import os
+import shutil
+
+from click.testing import CliRunner
+
+import bob.bio.video
+
+from bob.bio.video.metadata import (
+    MetadataIndex,
+    active_metadata_index,
+    use_metadata_index,
+)
+from bob.bio.video.script.metadata import index
+from bob.io.base.testing_utils import datafile
+from bob.pipelines import Sample
+
+
+class VideoDatabase:
+    def __init__(self, paths):
+        self.paths = paths
+
+    def all_samples(self, groups=None):
+        return [
+            Sample(bob.bio.video.VideoAsArray(path, transcoded_directory=""))
+            for path in self.paths
+        ]
+
+
+def test_metadata_index(tmp_path):
+    path = str(tmp_path / "video.avi")
+    shutil.copy(datafile("testvideo.avi", __name__), path)
+    output = str(tmp_path / "index.json")
+
+    result = CliRunner().invoke(
+        index,
+        ["--output", output, "--jobs", "2"],
+        default_map={"database": VideoDatabase([path])},
+    )
+    assert result.exit_code == 0, result.output
+    metadata = MetadataIndex.load(output)
+    entry = metadata.get(path)
+    assert entry["count"] == 83 and entry["size"] == [640, 480]
+    assert entry["keyframes"] == bob.bio.video.keyframe_indices(path)
+    assert metadata.frame_counts([path, "missing.avi"]) == [83, None]
+
+    # only videos that changed are scanned again
+    assert metadata.update([path]) == []
+    os.utime(path, (1, 1))
+    assert path not in metadata
+    assert metadata.update([path]) == [path]
+    assert metadata.update([path], force=True) == [path]
+
+    # the metadata of indexed videos is read from the index
+    metadata.get(path)["fps"] = 12.5
+    metadata.get(path)["keyframes"] = [0, 40]
+    try:
+        use_metadata_index(metadata)
+        assert active_metadata_index() is metadata
+        assert bob.bio.video.video_metadata(path)["fps"] == 12.5
+        assert bob.bio.video.keyframe_indices(path) == [0, 40]
+        video = bob.bio.video.VideoAsArray(
+            path, selection_style="all", transcoded_directory=""
+        )
+        assert video.shape == (83, 3, 480, 640)
+    finally:
+        use_metadata_index(None)
+    assert bob.bio.video.video_metadata(path)["fps"] == 25
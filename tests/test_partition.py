@@ -0,0 +1,119 @@
+import functools
+import os
+
+import numpy as np
+import pytest
+
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+import bob.bio.video
+
+from bob.bio.base.database import FileSampleLoader
+from bob.bio.video.database import VideoBioFile
+from bob.bio.video.partition import (
+    BalancedToDaskBag,
+    balance_dask_pipeline,
+    balanced_partitions,
+    estimate_cost,
+    video_cost,
+)
+from bob.io.base.testing_utils import datafile
+from bob.pipelines import Sample, SampleSet, wrap
+
+
+def _identity(x):
+    return x
+
+
+def test_balanced_partitions():
+    costs = [1, 30, 2, 7, 3, 8, 5, 4, 6, 10, 9]
+    partitions = balanced_partitions(costs, 3, cost=_identity)
+    assert sorted(sum(partitions, [])) == sorted(costs)
+    loads = [sum(p) for p in partitions]
+    # the longest video gets a partition for itself
+    assert max(loads) == 30 and [30] in partitions
+    # the items keep their order inside a partition
+    for partition in partitions:
+        positions = [costs.index(c) for c in partition]
+        assert positions == sorted(positions)
+
+    assert balanced_partitions([], 4) == []
+    assert len(balanced_partitions([1, 2], 4, cost=_identity)) == 2
+
+
+def test_video_cost():
+    path = datafile("testvideo.avi", __name__)
+    pixels = 640 * 480
+    assert estimate_cost(path, max_number_of_frames=5) == 5 * pixels
+    assert estimate_cost(path, selection_style="all") == 83 * pixels
+    assert estimate_cost(path, selection_style="quality") == 20 * pixels
+    assert estimate_cost(path, 5, size=(32, 24)) == 5 * 32 * 24
+
+    video = bob.bio.video.VideoAsArray(path, max_number_of_frames=5)
+    assert video_cost(video) == 5 * 3 * pixels
+    assert video_cost(Sample(video)) == 5 * 3 * pixels
+    assert video_cost(SampleSet([Sample(video)] * 2)) == 10 * 3 * pixels
+    container = bob.bio.video.VideoLikeContainer(
+        [np.ones((2, 3)), None], [0, 1]
+    )
+    assert video_cost(container) == 6
+    assert video_cost("not a video") == 1
+
+    f = VideoBioFile(
+        client_id=1,
+        path=path[: -len(".avi")],
+        file_id=1,
+        max_number_of_frames=5,
+        selection_style="spread",
+        crop=(0, 0, 100, 50),
+    )
+    assert video_cost(f) == 5 * 100 * 50
+
+    # delayed samples of csv databases are estimated without loading them
+    directory, name = os.path.split(path)
+    loader = FileSampleLoader(
+        functools.partial(
+            _UnloadableVideo,
+            selection_style="quality",
+            max_number_of_frames=5,
+            size=(32, 24),
+        ),
+        directory,
+        ".avi",
+    )
+    (sample,) = loader.transform([Sample(None, path=name[: -len(".avi")])])
+    assert video_cost(sample) == 5 * 32 * 24
+    loader.data_loader = _UnloadableVideo
+    (sample,) = loader.transform([Sample(None, path=name[: -len(".avi")])])
+    assert video_cost(sample) == estimate_cost(path)
+
+
+class _UnloadableVideo(bob.bio.video.VideoAsArray):
+    def __init__(self, path, **kwargs):
+        raise AssertionError(f"{path} must not be loaded")
+
+
+def test_balanced_dask_bag():
+    costs = [1, 30, 2, 7, 3, 8, 5, 4, 6, 10, 9]
+    bag = BalancedToDaskBag(npartitions=3, cost=_identity).transform(costs)
+    assert bag.npartitions == 3
+    loads = bag.map_partitions(lambda p: [sum(p)]).compute(
+        scheduler="single-threaded"
+    )
+    assert max(loads) == 30 and sum(loads) == sum(costs)
+
+    bag = BalancedToDaskBag(partition_size=4, cost=_identity).transform(costs)
+    assert bag.npartitions == 3
+
+    pipeline = wrap(
+        ["sample", "dask"], make_pipeline(FunctionTransformer(_identity))
+    )
+    balance_dask_pipeline(pipeline, cost=lambda s: s.data)
+    assert isinstance(pipeline.steps[0][1], BalancedToDaskBag)
+    samples = [Sample(c, key=str(i)) for i, c in enumerate(costs)]
+    outputs = pipeline.transform(samples).compute(scheduler="single-threaded")
+    assert sorted(s.data for s in outputs) == sorted(costs)
+
+    with pytest.raises(ValueError):
+        balance_dask_pipeline(make_pipeline(FunctionTransformer(_identity)))
@@ -0,0 +1,89 @@
+import numpy as np
+
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import make_pipeline
+
+from bob.bio.base.pipelines import PipelineSimple
+from bob.bio.video import VideoLikeContainer, video_wrap_skpipeline
+from bob.bio.video.algorithm import FrameScoring
+from bob.bio.video.planner import MultiProtocolPlan
+from bob.pipelines import Sample, SampleSet, wrap
+
+
+class CountingEstimator(TransformerMixin, BaseEstimator):
+    n_frames = 0
+
+    def transform(self, frames):
+        CountingEstimator.n_frames += len(frames)
+        return [np.asarray(f, dtype=float) for f in frames]
+
+    def _more_tags(self):
+        return {"requires_fit": False}
+
+
+def _video(i):
+    rng = np.random.default_rng(i)
+    return VideoLikeContainer(list(rng.normal(size=(3, 4))), range(3))
+
+
+class FoldDatabase:
+    """Folds which use overlapping videos as references and probes."""
+
+    def __init__(self, protocol):
+        self.fold = int(protocol[-1])
+
+    def _sample_set(self, i, **kwargs):
+        sample = Sample(_video(i), key=f"video{i}", subject_id=str(i))
+        return SampleSet(
+            [sample],
+            key=f"video{i}",
+            template_id=str(i),
+            subject_id=str(i),
+            **kwargs,
+        )
+
+    def references(self, group="dev"):
+        return [self._sample_set(i) for i in range(self.fold, self.fold + 3)]
+
+    def probes(self, group="dev"):
+        return [
+            self._sample_set(i, references=[str(i - 1)])
+            for i in range(self.fold + 1, self.fold + 4)
+        ]
+
+
+def _scores(score_sets):
+    return [[s.data for s in sset] for sset in score_sets]
+
+
+def test_multi_protocol_plan():
+    plan = MultiProtocolPlan.from_protocols(FoldDatabase, ["fold0", "fold1"])
+    # fold0 uses videos 0-3 and fold1 videos 1-4
+    assert len(plan.unique_samples) == 5
+    assert plan.n_samples == 12
+
+    pipeline = PipelineSimple(
+        video_wrap_skpipeline(
+            make_pipeline(wrap(["sample"], CountingEstimator()))
+        ),
+        FrameScoring(),
+    )
+    CountingEstimator.n_frames = 0
+    scores = plan.run(pipeline)
+    assert CountingEstimator.n_frames == 5 * 3
+    assert set(scores) == {("fold0", "dev"), ("fold1", "dev")}
+
+    # the scores are the same as running each protocol separately
+    for name in ("fold0", "fold1"):
+        database = FoldDatabase(name)
+        reference = pipeline(
+            [], database.references(), database.probes(), score_all_vs_all=True
+        )
+        np.testing.assert_allclose(
+            _scores(scores[(name, "dev")]), _scores(reference)
+        )
+        probe_keys = [sset.key for sset in scores[(name, "dev")]]
+        assert probe_keys == [sset.key for sset in database.probes()]
+
+    scores = plan.run(pipeline, score_all_vs_all=False)
+    assert all(len(sset) == 1 for sset in scores[("fold1", "dev")])
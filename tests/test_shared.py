@@ -0,0 +1,179 @@
+import json
+import multiprocessing
+import os
+import pickle
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from sklearn.base import BaseEstimator, TransformerMixin
+
+import bob.bio.video
+
+from bob.bio.video.shared import (
+    REFS_DIRECTORY,
+    SharedArray,
+    ShareFrames,
+    share_video,
+)
+from bob.bio.video.transformer import VideoWrapper
+from bob.io.base.testing_utils import datafile
+
+
+class RecordingEstimator(TransformerMixin, BaseEstimator):
+    def transform(self, frames):
+        self.frames_ = frames
+        return frames
+
+    def _more_tags(self):
+        return {"bob_video_ndarray_input": True}
+
+
+def _exists(name):
+    try:
+        bob.bio.video.shared._open_segment(name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _refs(name):
+    path = os.path.join(REFS_DIRECTORY, name)
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return json.load(f)["count"]
+
+
+def test_shared_array():
+    data = np.arange(12, dtype=np.float32).reshape(3, 4)
+    shared = SharedArray.from_array(data)
+    name = shared.name
+    assert _refs(name) == 1
+    np.testing.assert_equal(shared, data)
+    assert shared.shape == (3, 4) and shared.dtype == np.float32
+    payload = pickle.dumps(shared)
+    assert len(payload) < 200
+
+    copy = pickle.loads(payload)
+    assert _refs(name) == 2
+    copy.array[0, 0] = -1
+    assert shared[0, 0] == -1
+
+    shared.release()
+    shared.release()
+    assert _refs(name) == 1
+    with pytest.raises(ValueError):
+        shared.array
+    view = copy.array
+    del copy
+    # the last reference unlinks the segment but views stay valid
+    assert _refs(name) == 0
+    assert not _exists(name)
+    np.testing.assert_equal(view[1], data[1])
+
+    with SharedArray.empty((2, 2)) as shared:
+        name = shared.name
+    assert not _exists(name)
+
+
+def test_shared_array_hashing():
+    dask = pytest.importorskip("dask")
+    joblib = pytest.importorskip("joblib")
+    shared = SharedArray.from_array(np.arange(4))
+    name = shared.name
+    token = dask.base.tokenize(shared)
+    assert token == dask.base.tokenize(shared)
+    dask.base.tokenize([shared])
+    joblib.hash(shared)
+    assert joblib.hash(shared) != joblib.hash(SharedArray.from_array([1]))
+    # hashing takes no reference
+    assert _refs(name) == 1
+    shared.release()
+    assert not _exists(name)
+
+
+def test_shared_array_lease(monkeypatch):
+    shared = SharedArray.from_array(np.arange(4))
+    name = shared.name
+    monkeypatch.setattr(bob.bio.video.shared, "LEASE_SECONDS", 0.5)
+    payload = pickle.dumps(shared)
+    # the pickle keeps the segment alive after its sender released it
+    shared.release()
+    assert _exists(name)
+    copy = pickle.loads(payload)
+    assert _refs(name) == 1
+    np.testing.assert_equal(copy, np.arange(4))
+    del copy
+    assert not _exists(name)
+
+    # the leases of pickles that are never unpickled expire
+    shared = SharedArray.from_array(np.arange(4))
+    name = shared.name
+    pickle.dumps(shared)
+    shared.release()
+    assert _exists(name)
+    time.sleep(0.6)
+    monkeypatch.setattr(bob.bio.video.shared, "_last_sweep", [0.0])
+    bob.bio.video.shared._sweep()
+    assert not _exists(name)
+
+
+def _sum_frames(video):
+    return float(np.asarray(video, dtype=float).sum()), list(video)[1] is None
+
+
+def _share_in_worker(value):
+    container = bob.bio.video.VideoLikeContainer(
+        [np.full((2, 2), value), None], [0, 1]
+    )
+    return share_video(container)
+
+
+def test_share_video_from_workers():
+    # the workers drop their copies right after returning them
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(4, mp_context=context) as executor:
+        videos = list(executor.map(_share_in_worker, range(40)))
+    names = [video.data.name for video in videos]
+    for value, video in enumerate(videos):
+        assert video[1] is None
+        np.testing.assert_equal(video[0], np.full((2, 2), value))
+        assert _refs(video.data.name) == 1
+    del videos, video
+    assert not any(_exists(name) for name in names)
+
+
+def test_share_video():
+    context = multiprocessing.get_context("fork")
+    container = bob.bio.video.VideoLikeContainer(
+        [np.ones((2, 2)), None, np.full((2, 2), 2.0)], [0, 4, 8]
+    )
+    shared = share_video(container)
+    assert isinstance(shared, bob.bio.video.DenseVideoLikeContainer)
+    assert isinstance(shared.data, SharedArray)
+    assert shared == container
+    assert share_video(shared) is shared
+    name = shared.data.name
+
+    with ProcessPoolExecutor(1, mp_context=context) as executor:
+        assert executor.submit(_sum_frames, shared).result() == (12.0, True)
+    assert _refs(name) == 1
+    del shared
+    assert not _exists(name)
+
+    # videos are decoded straight into shared memory
+    path = datafile("testvideo.avi", __name__)
+    video = bob.bio.video.VideoAsArray(path, max_number_of_frames=3)
+    (shared,) = ShareFrames().transform([video])
+    assert isinstance(shared.data, SharedArray)
+    np.testing.assert_equal(shared.data, video[:, :, :, :])
+    np.testing.assert_equal(shared.indices, video.indices)
+
+    # and given without a copy to estimators that take arrays
+    estimator = RecordingEstimator()
+    VideoWrapper(estimator).transform([shared])
+    assert np.shares_memory(estimator.frames_, shared.data.array)
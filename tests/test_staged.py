@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+import pytest
+
+from sklearn.base import BaseEstimator, TransformerMixin
+
+import bob.bio.video
+
+from bob.bio.video.annotator import Base
+from bob.bio.video.staged import StagedRunner, decode_video
+from bob.bio.video.transformer import VideoWrapper
+from bob.io.base.testing_utils import datafile
+
+
+class MeanEstimator(TransformerMixin, BaseEstimator):
+    def transform(self, frames, annotations=None):
+        assert annotations is not None
+        return [
+            (float(np.mean(frame)), annot["index"])
+            for frame, annot in zip(frames, annotations)
+        ]
+
+
+class IndexAnnotator(Base):
+    def annotate(self, frames):
+        return {str(i): {"index": int(i)} for i in frames.indices}
+
+
+def test_staged_runner():
+    path = datafile("testvideo.avi", __name__)
+    videos = [
+        bob.bio.video.VideoAsArray(path, max_number_of_frames=n)
+        for n in (2, 3, 4)
+    ]
+    extractor = VideoWrapper(MeanEstimator())
+    runner = StagedRunner(extractor, annotator=IndexAnnotator())
+    features = runner.run(videos)
+
+    annotator = IndexAnnotator()
+    for video, feature in zip(videos, features):
+        decoded = decode_video(video)
+        assert isinstance(decoded.data, np.ndarray)
+        reference = extractor.transform(
+            [decoded], annotations=annotator.transform([decoded])
+        )[0]
+        assert list(feature) == list(reference)
+        np.testing.assert_equal(feature.indices, video.indices)
+    assert runner.stats["extract"]["items"] == 3
+
+
+def _sleep(value):
+    time.sleep(0.2)
+    return value
+
+
+class SleepingEstimator(TransformerMixin, BaseEstimator):
+    def transform(self, videos):
+        time.sleep(0.2)
+        if videos[0] is None:
+            raise ValueError("failed")
+        return [v * 2 for v in videos]
+
+
+def test_staged_runner_concurrency():
+    runner = StagedRunner(
+        SleepingEstimator(),
+        decode=_sleep,
+        decode_workers=4,
+        extract_workers=4,
+        queue_size=1,
+    )
+    start = time.perf_counter()
+    assert runner.run(range(8)) == [2 * i for i in range(8)]
+    # 8 videos take 16 * 0.2s when processed one after the other
+    assert time.perf_counter() - start < 1.6
+
+    with pytest.raises(ValueError):
+        runner.run([1, None, 2])
@@ -0,0 +1,19 @@
+import numpy as np
+
+import bob.bio.video
+
+from bob.bio.video.synthetic import synthetic_frames, write_synthetic_video
+
+
+def test_synthetic_video(tmp_path):
+    frames = list(synthetic_frames(3, size=(32, 24), seed=1))
+    assert frames[0].shape == (24, 32, 3) and frames[0].dtype == np.uint8
+    assert not np.array_equal(frames[0], frames[1])
+    np.testing.assert_equal(frames, list(synthetic_frames(3, (32, 24), 1)))
+
+    path = write_synthetic_video(
+        str(tmp_path / "video.mp4"), n_frames=30, size=(64, 48), gop_size=10
+    )
+    metadata = bob.bio.video.video_metadata(path)
+    assert metadata["count"] == 30 and metadata["size"] == (64, 48)
+    assert bob.bio.video.keyframe_indices(path) == [0, 10, 20]
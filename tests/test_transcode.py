@@ -0,0 +1,136 @@
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from click.testing import CliRunner
+
+import bob.bio.video
+
+from bob.bio.base.database import FileSampleLoader
+from bob.bio.video.database import sample_path, video_files
+from bob.bio.video.script.transcode import transcode
+from bob.bio.video.transcode import (
+    find_transcoded,
+    transcode_video,
+    transcoded_path,
+)
+from bob.io.base.testing_utils import datafile
+from bob.pipelines import Sample
+
+
+class VideoDatabase:
+    def __init__(self, paths):
+        self.paths = paths
+
+    def all_samples(self, groups=None):
+        return [
+            Sample(bob.bio.video.VideoAsArray(path, transcoded_directory=""))
+            for path in self.paths
+        ]
+
+
+class CSVVideoDatabase:
+    def __init__(self, paths, directory, extension, loader=True):
+        self.paths = paths
+        self.original_directory = directory
+        self.extension = extension
+        self.transformer = None
+        if loader:
+            self.transformer = FileSampleLoader(
+                _fail_loading, directory, extension
+            )
+
+    def all_samples(self, groups=None):
+        samples = [Sample(None, path=path) for path in self.paths]
+        if self.transformer is None:
+            return samples
+        return self.transformer.transform(samples)
+
+
+def _fail_loading(path):
+    raise AssertionError(f"{path} must not be loaded")
+
+
+def test_video_files():
+    path = datafile("testvideo.avi", __name__)
+    directory, name = os.path.split(path)
+    name = os.path.splitext(name)[0]
+
+    # the samples of csv databases are not loaded
+    for loader in (True, False):
+        database = CSVVideoDatabase([name, name], directory, ".avi", loader)
+        assert video_files(database) == [path]
+    assert sample_path(database.all_samples()[0]) is None
+    assert sample_path(database.all_samples()[0], database) == path
+
+    # frame images are not supported
+    database = CSVVideoDatabase(["person/0"], directory, ".jpg")
+    assert video_files(database) == []
+
+
+def test_transcode_video(tmp_path):
+    path = datafile("testvideo.avi", __name__)
+    directory = str(tmp_path)
+    original = bob.bio.video.VideoAsArray(
+        path, selection_style="all", transcoded_directory=""
+    )
+    assert original.path == path
+    frames = original[:, :, :, :]
+
+    with pytest.raises(ValueError):
+        transcode_video(path, directory, format="mp4")
+
+    intra = transcode_video(path, directory, format="intra")
+    assert intra == transcoded_path(path, directory, "intra")
+    assert intra.startswith(directory) and intra.endswith(".mkv")
+    # every frame of the copy is a keyframe
+    assert bob.bio.video.keyframe_indices(intra) == list(range(83))
+    video = bob.bio.video.VideoAsArray(
+        path, selection_style="all", transcoded_directory=directory
+    )
+    assert video.path == intra and video.source_path == path
+    np.testing.assert_equal(video[:, :, :, :], frames)
+
+    store = transcode_video(path, directory, format="hdf5")
+    with h5py.File(store, "r") as f:
+        assert f["frames"].chunks == (1, 480, 640, 3)
+    video = bob.bio.video.VideoAsArray(
+        path, max_number_of_frames=5, transcoded_directory=directory
+    )
+    assert video.path == store
+    np.testing.assert_equal(video[:, :, :, :], frames[video.indices])
+    np.testing.assert_equal(
+        video[2], frames[video.indices[2]], err_msg="random access"
+    )
+
+    # frame stores do not support the decode options
+    video = bob.bio.video.VideoAsArray(
+        path, size=(32, 24), transcoded_directory=directory
+    )
+    assert video.path == intra and video.shape[2:] == (24, 32)
+
+    # copies older than the original video are ignored
+    os.utime(path)
+    assert find_transcoded(path, directory) is None
+    os.utime(store, (os.path.getmtime(path) + 1,) * 2)
+    assert find_transcoded(path, directory) == store
+
+
+def test_transcode_command(tmp_path):
+    path = datafile("testvideo.avi", __name__)
+    database = VideoDatabase([path, path])
+    assert video_files(database) == [path]
+
+    directory = str(tmp_path / "transcoded")
+    result = CliRunner().invoke(
+        transcode,
+        ["--output-dir", directory, "--format", "hdf5"],
+        obj=None,
+        default_map={"database": database},
+    )
+    assert result.exit_code == 0, result.output
+    assert find_transcoded(path, directory) == transcoded_path(
+        path, directory, "hdf5"
+    )
@@ -1,7 +1,15 @@
+import numpy as np
+import pytest
+
 from sklearn.base import BaseEstimator, TransformerMixin
 
-from bob.bio.video import VideoLikeContainer
-from bob.bio.video.transformer import VideoWrapper
+from bob.bio.video import (
+    DenseVideoLikeContainer,
+    VideoAsArray,
+    VideoLikeContainer,
+)
+from bob.bio.video.transformer import FrameCache, TemporalPooling, VideoWrapper
+from bob.io.base.testing_utils import datafile
 
 
 class DummyEstimator(BaseEstimator, TransformerMixin):
@@ -16,6 +24,18 @@ class DummyEstimator(BaseEstimator, TransformerMixin):
         return list(video)
 
 
+class DummyArrayEstimator(BaseEstimator, TransformerMixin):
+    def transform(self, frames, annotations=None):
+        assert isinstance(frames, np.ndarray), frames
+        assert frames.flags.c_contiguous
+        if annotations is not None:
+            assert len(annotations) == len(frames)
+        return frames * 2
+
+    def _more_tags(self):
+        return {"bob_video_ndarray_input": True}
+
+
 def test_video_wrapper():
     indices = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
 
@@ -44,3 +64,232 @@ def test_video_wrapper():
         estimator = DummyEstimator(fail=fail)
         wrapper = VideoWrapper(estimator)
         assert wrapper.transform(inputs, **kw)[0] == oracle
+
+    # estimators that accept arrays get the stacked valid frames
+    wrapper = VideoWrapper(DummyArrayEstimator())
+    assert "bob_video_ndarray_input" not in wrapper._get_tags()
+    for inputs, oracle, kw in [
+        (video_container, [2, 4, 6, 8, 10, 12, 14, 16, 18, 20], dict()),
+        (
+            failed_container,
+            [None, 4, None, 8, None, 12, None, 16, None, 20],
+            dict(annotations=[{i: {"eye": i} for i in indices}]),
+        ),
+        (VideoLikeContainer([None] * 3, range(3)), [None] * 3, dict()),
+    ]:
+        output = wrapper.transform([inputs], **kw)[0]
+        assert list(output) == oracle, list(output)
+
+    # failed frames of array outputs are masked out
+    output = wrapper.transform([failed_container])[0]
+    assert isinstance(output, DenseVideoLikeContainer)
+    assert output.data.shape == (10,)
+    output = wrapper.transform([output])[0]
+    assert isinstance(output, DenseVideoLikeContainer)
+    assert list(output) == [None, 8, None, 16, None, 24, None, 32, None, 40]
+
+    dense = VideoLikeContainer(np.arange(6).reshape(3, 2), indices=range(3))
+    output = wrapper.transform([dense])[0]
+    assert isinstance(output.data, np.ndarray)
+    np.testing.assert_equal(output.data, dense.data * 2)
+
+    # the layout of the frames is carried through
+    video_container.layout = "HWC"
+    output = VideoWrapper(DummyEstimator()).transform([video_container])[0]
+    assert output.layout == "HWC"
+
+
+class DummyPartialFitEstimator(DummyArrayEstimator):
+    def __init__(self):
+        self.chunks = []
+
+    def partial_fit(self, frames, y=None):
+        self.chunks.append((frames.shape, y))
+        return self
+
+
+class DummyFitEstimator(DummyEstimator):
+    def fit(self, frames, y=None):
+        self.fitted_ = (list(frames), y)
+        return self
+
+
+def test_video_wrapper_fit():
+    videos = [
+        VideoLikeContainer([None, 1, 2, 3], range(4)),
+        VideoLikeContainer(np.arange(10, 16), range(6)),
+    ]
+
+    # stateless estimators are not fitted
+    wrapper = VideoWrapper(DummyEstimator())
+    assert wrapper.fit(videos) is wrapper
+
+    # frames are streamed in chunks to partial_fit
+    estimator = DummyPartialFitEstimator()
+    VideoWrapper(estimator, fit_chunk_size=4).fit(videos, y=["a", "b"])
+    assert estimator.chunks == [
+        ((4,), ["a", "a", "a", "b"]),
+        ((4,), ["b", "b", "b", "b"]),
+        ((1,), ["b"]),
+    ]
+
+    # with per-video subsampling
+    estimator = DummyPartialFitEstimator()
+    VideoWrapper(estimator, fit_frames_per_video=2).fit(videos)
+    assert estimator.chunks == [((4,), None)]
+
+    # estimators without partial_fit get a sample of the frames
+    estimator = DummyFitEstimator()
+    VideoWrapper(estimator).fit(videos, y=[0, 1])
+    assert estimator.fitted_ == (
+        [1, 2, 3, 10, 11, 12, 13, 14, 15],
+        [0] * 3 + [1] * 6,
+    )
+    estimator = DummyFitEstimator()
+    VideoWrapper(estimator, fit_max_frames=4, random_state=0).fit(videos)
+    frames, y = estimator.fitted_
+    assert len(frames) == 4 and y is None
+    assert {int(f) for f in frames} <= {1, 2, 3, 10, 11, 12, 13, 14, 15}
+    # the sample is also bounded in bytes
+    estimator = DummyFitEstimator()
+    VideoWrapper(estimator, fit_max_bytes=3 * 8, random_state=0).fit(videos)
+    frames, _ = estimator.fitted_
+    assert len(frames) == 3 and sum(np.array(f).nbytes for f in frames) == 24
+
+    with pytest.raises(ValueError):
+        VideoWrapper(DummyFitEstimator()).fit([VideoLikeContainer([None], [0])])
+
+
+def test_video_wrapper_fit_video():
+    from sklearn.decomposition import IncrementalPCA
+
+    path = datafile("testvideo.avi", __name__)
+    video = VideoAsArray(
+        path, max_number_of_frames=6, size=(8, 6), grayscale=True
+    )
+    frames = video[:, :, :].reshape(6, -1).astype(float)
+
+    class FlatFrames(IncrementalPCA):
+        def partial_fit(self, frames, y=None):
+            return super().partial_fit(frames.reshape(len(frames), -1), y)
+
+        def _more_tags(self):
+            return {"bob_video_ndarray_input": True}
+
+    estimator = FlatFrames(n_components=2)
+    VideoWrapper(estimator, fit_chunk_size=3).fit([video])
+    reference = IncrementalPCA(n_components=2, batch_size=3).fit(frames)
+    np.testing.assert_allclose(estimator.mean_, reference.mean_)
+    np.testing.assert_allclose(
+        np.abs(estimator.components_), np.abs(reference.components_), rtol=1e-5
+    )
+
+
+class DummyCountingEstimator(DummyArrayEstimator):
+    def __init__(self, factor=2):
+        self.factor = factor
+        self.n_frames = 0
+
+    def transform(self, frames, annotations=None):
+        self.n_frames += len(frames)
+        return frames * self.factor
+
+
+class DummyLazyEstimator(DummyCountingEstimator):
+    def transform(self, frames, annotations=None):
+        # like extractors which load their model on first use
+        if not hasattr(self, "model"):
+            self.model = np.random.default_rng().normal(size=100)
+        return super().transform(frames, annotations)
+
+
+def test_video_wrapper_cache(tmp_path):
+    frames = np.array([[1, 2], [3, 4], [1, 2], [1, 2]])
+    videos = [
+        VideoLikeContainer(frames, range(4)),
+        VideoLikeContainer([None, frames[1], frames[0]], range(3)),
+    ]
+    estimator = DummyCountingEstimator()
+    cache = FrameCache(max_items=10)
+    wrapper = VideoWrapper(estimator, cache=cache)
+    output = wrapper.transform(videos)
+    # only 2 distinct frames were transformed
+    assert estimator.n_frames == 2
+    np.testing.assert_equal(output[0].data, frames * 2)
+    assert list(output[1])[0] is None
+    np.testing.assert_equal(output[1][2], [2, 4])
+    assert cache.stats() == {"hits": 4, "misses": 2, "dedup_ratio": 4 / 6}
+    assert len(cache) == 2
+
+    # annotations and estimator parameters are part of the key
+    annotations = [{0: {"eye": 0}, 1: {"eye": 1}, 2: {"eye": 1}, 3: {"eye": 0}}]
+    wrapper.transform(videos[:1], annotations=annotations)
+    # 3 distinct pairs of frame and annotations
+    assert estimator.n_frames == 5
+    estimator = DummyCountingEstimator(factor=3)
+    output = VideoWrapper(estimator, cache=cache).transform(videos[:1])
+    np.testing.assert_equal(output[0].data, frames * 3)
+    assert estimator.n_frames == 2
+
+    # state set up by the estimator itself is not part of the key
+    estimator = DummyLazyEstimator()
+    wrapper = VideoWrapper(estimator, cache=FrameCache())
+    wrapper.transform(videos[:1])
+    wrapper.transform(videos[:1])
+    assert estimator.n_frames == 2 and wrapper.cache.misses == 2
+
+    # directory caches need a fingerprint that identifies the estimator
+    estimator = DummyCountingEstimator(factor=lambda x: x)
+    with pytest.raises(ValueError):
+        VideoWrapper(
+            estimator, cache=FrameCache(directory=str(tmp_path / "strict"))
+        ).transform(videos)
+    wrapper = VideoWrapper(
+        DummyCountingEstimator(),
+        cache=FrameCache(directory=str(tmp_path / "strict")),
+        cache_key="model-v1",
+    )
+    np.testing.assert_equal(wrapper.transform(videos)[0].data, frames * 2)
+
+    # the memory cache is bounded
+    cache = FrameCache(max_items=1)
+    VideoWrapper(DummyCountingEstimator(), cache=cache).transform(videos)
+    assert len(cache) == 1
+
+    # outputs are shared through the cache directory
+    cache = FrameCache(directory=str(tmp_path))
+    VideoWrapper(DummyCountingEstimator(), cache=cache).transform(videos)
+    estimator = DummyCountingEstimator()
+    cache = FrameCache(directory=str(tmp_path))
+    output = VideoWrapper(estimator, cache=cache).transform(videos)
+    assert estimator.n_frames == 0
+    np.testing.assert_equal(output[0].data, frames * 2)
+    assert cache.dedup_ratio == 1
+
+
+def test_temporal_pooling():
+    video = VideoLikeContainer(
+        [np.array([3.0, 4.0]), None, np.array([1.0, 0.0])], indices=[0, 1, 2]
+    )
+    failed = VideoLikeContainer([None, None], indices=[0, 1])
+
+    pooled = TemporalPooling("mean").transform([video, failed])
+    np.testing.assert_allclose(pooled[0], [2.0, 2.0])
+    assert pooled[1] is None
+
+    pooled = TemporalPooling("normalized_mean").transform([video])[0]
+    np.testing.assert_allclose(
+        pooled, np.array([1.6, 0.8]) / np.hypot(1.6, 0.8)
+    )
+
+    # defaults to the norm of the features as weights
+    pooled = TemporalPooling("weighted_mean").transform([video])[0]
+    np.testing.assert_allclose(pooled, [16 / 6, 20 / 6])
+
+    pooled = TemporalPooling("weighted_mean").transform(
+        [video], weights=[[1, 100, 0]]
+    )[0]
+    np.testing.assert_allclose(pooled, [3.0, 4.0])
+
+    with pytest.raises(ValueError):
+        TemporalPooling("max")
@@ -1,13 +1,23 @@
+import os
 import pickle
 import tempfile
 import time
 
+from concurrent.futures import ThreadPoolExecutor
+
 import imageio
 import numpy as np
+import pytest
 
 import bob.bio.video
 
-from bob.bio.video.utils import is_library_available
+from bob.bio.video.database import VideoBioFile
+from bob.bio.video.utils import (
+    READER_POOL,
+    BufferPool,
+    ReaderPool,
+    is_library_available,
+)
 from bob.io.base.testing_utils import datafile
 from bob.io.image import to_bob
 
@@ -109,3 +119,305 @@ def test_video_like_container():
         np.testing.assert_equal(loaded.indices, frame_container.indices)
         np.testing.assert_equal(loaded.data, frame_container.data)
         assert loaded == frame_container
+
+
+def test_select_frames_distinct():
+    frames = np.zeros((6, 4, 4), dtype=np.float32)
+    frames[2:4] = 10
+    frames[5] = 0.5
+    indices = bob.bio.video.select_frames(
+        6, selection_style="distinct", frames=frames
+    )
+    assert indices == [0, 2, 4], indices
+
+    indices = bob.bio.video.select_frames(
+        6, max_number_of_frames=2, selection_style="distinct", frames=frames
+    )
+    assert indices == [0, 2], indices
+
+    with pytest.raises(ValueError):
+        bob.bio.video.select_frames(6, selection_style="distinct")
+
+    path = datafile("testvideo.avi", __name__)
+    video = bob.bio.video.VideoAsArray(
+        path,
+        selection_style="distinct",
+        max_number_of_frames=100,
+        difference_threshold=5.0,
+    )
+    # the last frames of the test video are static
+    assert 0 < len(video) < 83, len(video)
+    assert video.indices[0] == 0, video.indices
+    assert 82 not in video.indices, video.indices
+    assert video[-1].shape == (3, 480, 640), video[-1].shape
+
+
+def test_select_frames_quality():
+    rng = np.random.default_rng(0)
+    frames = np.full((5, 16, 16), 127.5, dtype=np.float32)
+    # frames 1 and 3 are textured, frame 3 has more contrast
+    frames[1] += rng.uniform(-20, 20, (16, 16))
+    frames[3] += rng.uniform(-60, 60, (16, 16))
+    quality = bob.bio.video.frame_quality(frames)
+    assert quality.shape == (5,), quality.shape
+    assert quality.argmax() == 3, quality
+    assert quality[0] == 0, quality
+
+    indices = bob.bio.video.select_frames(
+        5, max_number_of_frames=2, selection_style="quality", frames=frames
+    )
+    assert indices == [1, 3], indices
+
+    path = datafile("testvideo.avi", __name__)
+    video = VideoBioFile(
+        client_id=1,
+        path="testvideo",
+        file_id=1,
+        original_directory=os.path.dirname(path),
+        selection_style="quality",
+        max_number_of_frames=4,
+    ).load()
+    assert len(video) == 4, len(video)
+    assert list(video.indices) == sorted(video.indices), video.indices
+    assert video.shape == (4, 3, 480, 640), video.shape
+
+
+def test_keyframe_indices():
+    path = datafile("testvideo.avi", __name__)
+    assert bob.bio.video.keyframe_indices(path) == list(range(0, 83, 12))
+
+
+@is_library_available("dask")
+def test_video_as_array_to_dask():
+    path = datafile("testvideo.avi", __name__)
+    reference = to_bob(np.array(list((imageio.get_reader(path).iter_data()))))
+
+    video = bob.bio.video.VideoAsArray(path, selection_style="all")
+    dask_video = video.to_dask()
+    # one chunk per group of pictures
+    assert dask_video.chunks[0] == (12,) * 6 + (11,), dask_video.chunks
+    np.testing.assert_equal(dask_video.compute(scheduler="threads"), reference)
+
+    video = bob.bio.video.VideoAsArray(
+        path,
+        selection_style="step",
+        step_size=10,
+        transform=lambda x: x[..., ::-1],
+    )
+    dask_video = video.to_dask(frames_per_chunk=3)
+    assert dask_video.shape == video.shape
+    # chunks never split a group of pictures
+    assert dask_video.chunks[0] == (4, 3, 1), dask_video.chunks
+    np.testing.assert_equal(
+        dask_video.compute(scheduler="threads"),
+        reference[list(video.indices)][..., ::-1],
+    )
+
+
+def test_video_as_array_lazy_reader():
+    path = datafile("testvideo.avi", __name__)
+    assert bob.bio.video.video_metadata(path) == {
+        "count": 83,
+        "size": (640, 480),
+        "fps": 25.0,
+    }
+
+    # the metadata is cached and no reader is opened until pixels are read
+    READER_POOL.clear()
+    hits = bob.bio.video.utils._video_metadata.cache_info().hits
+    video = bob.bio.video.VideoAsArray(path, max_number_of_frames=3)
+    assert bob.bio.video.utils._video_metadata.cache_info().hits == hits + 1
+    assert len(READER_POOL) == 0
+    assert video.shape == (3, 3, 480, 640), video.shape
+
+    state = pickle.dumps(video)
+    assert len(state) < 1024, len(state)
+    loaded = pickle.loads(state)
+    assert len(READER_POOL) == 0
+    assert loaded.indices == video.indices
+    np.testing.assert_equal(loaded[0], video[0])
+    # the reader is reused across calls
+    assert len(READER_POOL) == 1
+
+
+def test_reader_pool_threads():
+    path = datafile("testvideo.avi", __name__)
+    video = bob.bio.video.VideoAsArray(path, selection_style="all")
+    reference = video[:, :, :, :]
+
+    pool = ReaderPool(max_readers=3)
+    with pool.reader(path) as reader:
+        pass
+    with pool.reader(path) as reader2:
+        assert reader2 is reader
+    assert len(pool) == 1
+
+    # the pool of VideoAsArray is capped while many threads read frames
+    READER_POOL.clear()
+    READER_POOL.max_readers, max_readers = 3, READER_POOL.max_readers
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            frames = list(executor.map(video.__getitem__, range(83)[::-1]))
+            slices = list(
+                executor.map(
+                    lambda i: video[i : i + 10, :, :, :], range(0, 83, 10)
+                )
+            )
+        assert len(READER_POOL) <= 3
+    finally:
+        READER_POOL.max_readers = max_readers
+    np.testing.assert_equal(np.stack(frames[::-1]), reference)
+    np.testing.assert_equal(np.concatenate(slices), reference)
+
+
+def test_video_as_array_decode_options():
+    path = datafile("testvideo.avi", __name__)
+    reference = bob.bio.video.VideoAsArray(path, max_number_of_frames=3)[
+        :, :, :, :
+    ]
+
+    video = bob.bio.video.VideoAsArray(
+        path, max_number_of_frames=3, crop=(10, 20, 200, 100)
+    )
+    assert video.shape == (3, 3, 100, 200), video.shape
+    np.testing.assert_allclose(
+        video[:, :, :, :], reference[:, :, 20:120, 10:210], atol=1
+    )
+
+    video = bob.bio.video.VideoAsArray(
+        path, max_number_of_frames=3, size=(112, 112), grayscale=True
+    )
+    assert video.shape == (3, 112, 112), video.shape
+    assert video.ndim == 3
+    assert video[1].shape == (112, 112), video[1].shape
+    frames = video[:, :, :]
+    assert frames.shape == (3, 112, 112), frames.shape
+    np.testing.assert_equal(frames[1], video[1])
+    # gray levels follow the luma of the frames
+    assert abs(frames.mean() - reference.mean()) < 5
+
+
+def test_video_as_array_layout(tmp_path):
+    path = datafile("testvideo.avi", __name__)
+    chw = bob.bio.video.VideoAsArray(path, max_number_of_frames=3)
+    hwc = bob.bio.video.VideoAsArray(path, max_number_of_frames=3, layout="HWC")
+    assert hwc.shape == (3, 480, 640, 3), hwc.shape
+    assert hwc[0].flags.c_contiguous
+    frames = hwc[:, :, :, :]
+    assert frames.shape == hwc.shape
+    np.testing.assert_equal(frames.transpose(0, 3, 1, 2), chw[:, :, :, :])
+    np.testing.assert_equal(hwc.to_dask().compute(), frames)
+
+    with pytest.raises(ValueError):
+        bob.bio.video.VideoAsArray(path, layout="CWH")
+
+    container = bob.bio.video.VideoLikeContainer(
+        frames, hwc.indices, layout=hwc.layout
+    )
+    # hdf5 and pickle files
+    for i, data in enumerate((frames, [None, 1, 2])):
+        container.data = data
+        container.save(tmp_path / f"container{i}")
+        loaded = bob.bio.video.VideoLikeContainer.load(
+            tmp_path / f"container{i}"
+        )
+        assert loaded.layout == "HWC"
+
+
+def test_dense_video_like_container(tmp_path):
+    frames = [None, np.ones((2, 3)), None, np.full((2, 3), 2.0)]
+    container = bob.bio.video.VideoLikeContainer(frames, [0, 5, 10, 15])
+    dense = bob.bio.video.DenseVideoLikeContainer.from_container(container)
+    assert dense.data.shape == (4, 2, 3)
+    np.testing.assert_equal(dense.mask, [False, True, False, True])
+    assert dense.indices.dtype == np.int64
+    assert len(dense) == 4
+    assert dense[0] is None and dense[-2] is None
+    np.testing.assert_equal(dense[1], frames[1])
+    assert list(dense)[2] is None
+    assert dense[1:3][1] is None
+    with pytest.raises(IndexError):
+        dense[4]
+    np.testing.assert_equal(dense.valid_data, np.stack(frames[1::2]))
+    # failed frames are not returned as zero-filled frames
+    np.testing.assert_equal(np.asarray(dense), np.stack(frames[1::2]))
+    assert dense.shape == np.asarray(dense).shape == (2, 2, 3)
+    assert dense.ndim == np.asarray(dense).ndim
+    np.testing.assert_equal(
+        np.vstack([dense]).mean(axis=0), np.full((2, 3), 1.5)
+    )
+    assert dense == container
+    converted = dense.to_container()
+    assert type(converted) is bob.bio.video.VideoLikeContainer
+    assert converted.data[0] is None
+    assert dense == converted
+
+    # masked containers are saved in hdf5 and loaded as dense containers
+    dense.save(tmp_path / "dense.hdf5")
+    loaded = bob.bio.video.VideoLikeContainer.load(tmp_path / "dense.hdf5")
+    assert isinstance(loaded, bob.bio.video.DenseVideoLikeContainer)
+    assert loaded == dense
+    container.save(tmp_path / "container.pkl")
+    loaded = bob.bio.video.DenseVideoLikeContainer.load(
+        tmp_path / "container.pkl"
+    )
+    assert isinstance(loaded, bob.bio.video.DenseVideoLikeContainer)
+    assert loaded == dense
+
+    # dense data is used without a copy
+    data = np.arange(6).reshape(3, 2)
+    dense = bob.bio.video.DenseVideoLikeContainer.from_container(
+        bob.bio.video.VideoLikeContainer(data, range(3))
+    )
+    assert dense.data is data and dense.mask.all()
+    assert dense.valid_data is data
+    assert np.shares_memory(np.asarray(dense), data)
+
+    with pytest.raises(ValueError):
+        bob.bio.video.DenseVideoLikeContainer(data, range(2))
+
+
+def test_video_like_container_load_subclass(tmp_path):
+    class MyContainer(bob.bio.video.VideoLikeContainer):
+        pass
+
+    container = bob.bio.video.VideoLikeContainer(np.ones((2, 3)), [0, 1])
+    container.save(tmp_path / "container.hdf5")
+    loaded = MyContainer.load(tmp_path / "container.hdf5")
+    assert type(loaded) is MyContainer
+    assert loaded == container
+
+
+def test_video_as_array_read_into():
+    path = datafile("testvideo.avi", __name__)
+    video = bob.bio.video.VideoAsArray(path, max_number_of_frames=5)
+    reference = video[:, :, :, :]
+
+    pool = BufferPool()
+    with pool.buffer((3,) + video.shape[1:]) as out:
+        frames = video.read_into(out, slice(1, 4))
+        assert np.shares_memory(frames, out)
+        np.testing.assert_equal(frames, reference[1:4])
+        frames = video.read_into(out, [4, 0])
+        np.testing.assert_equal(frames, reference[[4, 0]])
+        assert len(frames) == 2
+    # the buffer is reused
+    assert pool.nbytes == out.nbytes
+    assert pool.get(out.shape) is out
+    assert pool.nbytes == 0
+
+    out = np.empty(video.shape[1:], dtype=np.uint8)
+    np.testing.assert_equal(video.read_into(out, -1), reference[-1])
+
+    with pytest.raises(ValueError):
+        video.read_into(np.empty((2,) + video.shape[1:], dtype=np.uint8))
+    with pytest.raises(ValueError):
+        video.read_into(np.empty(video.shape, dtype=float))
+
+    # HWC frames and transforms
+    video = bob.bio.video.VideoAsArray(
+        path, max_number_of_frames=5, layout="HWC", transform=lambda x: 255 - x
+    )
+    out = np.empty(video.shape, dtype=np.uint8)
+    frames = video.read_into(out)
+    np.testing.assert_equal(frames, 255 - reference.transpose(0, 2, 3, 1))